@@ -7,14 +7,14 @@ from pathlib import Path
 # sys.path.append(str(PROJECT_ROOT)) 
 
 # --- Importing the RAG function ---
-# This will implicitly trigger the loading in chatbot_app.py
+# Importing is cheap: chatbot_app loads its models lazily through a shared ModelRegistry
+# With RAG_BACKEND_URL set, answers come from a shared serve_api.py backend instead and no models are loaded here
+RAG_BACKEND_URL, stream_remote = None, None # Bound up front so the UI below still runs if an import fails
 try:
-    from chatbot_app import get_rag_response # Import only the function
+    from rag_client import RAG_BACKEND_URL, stream_remote
+    from chatbot_app import stream_rag_response, models # Streaming RAG function + the shared model registry
+    from rag_tracing import start_metrics_server
     models_loaded = True
-
-
-    print("Attempting to import RAG function (models load on import)...")
-
 except ImportError as e:
      st.error(f"Error importing chatbot_app: {e}. Make sure chatbot_app.py is in the project root.")
      models_loaded = False
@@ -23,10 +23,28 @@ except Exception as e:
      st.info("Please check the terminal logs for more details from chatbot_app.py.")
      models_loaded = False
 
+
+@st.cache_resource
+def start_model_warmup():
+    """Runs once per server process: starts loading the KB and GGUF model in the background."""
+    print("Starting background model warm-up...")
+    start_metrics_server() # Only when RAG_TRACING=1 and RAG_METRICS_PORT are set
+    return models.warm_up(background=True)
+
+
+if models_loaded and not RAG_BACKEND_URL:
+    start_model_warmup()
+
 # --- Streamlit App UI ---
 
 st.title("🍽️ Restaurant Menu RAG Chatbot")
 st.caption("Ask questions about menus from Punjab Grill, Oakaz, Dominos, Subway, and McDonalds.")
+if RAG_BACKEND_URL:
+    st.caption(f"Answers are served by the RAG backend at {RAG_BACKEND_URL}.")
+elif models_loaded and models.status == "failed":
+    st.error(models.error or "Chatbot components failed to load. Check the terminal logs.")
+elif models_loaded and not models.is_ready():
+    st.info("Models are loading in the background; your first question will wait for them to finish.")
 
 # Initializing chat history in session state
 if "messages" not in st.session_state:
@@ -48,14 +66,21 @@ if prompt:
 
     # Generating and display bot response
     if models_loaded:
-        with st.spinner("Thinking..."):
-            # Calling the RAG function
-            response = get_rag_response(prompt, top_k=5)
-
-            with st.chat_message("assistant"):
-                st.markdown(response)
-            # Adding bot response to history
-            st.session_state.messages.append({"role": "assistant", "content": response})
+        # Streaming the answer token by token so the user sees output as soon as the first token is ready
+        with st.chat_message("assistant"):
+            if not RAG_BACKEND_URL and not models.is_ready():
+                with st.spinner("Loading models..."):
+                    models.load() # Blocks until the background warm-up has finished
+            generation_stats = {}
+            if RAG_BACKEND_URL: stream = stream_remote(prompt, top_k=10, stats=generation_stats)
+            else: stream = stream_rag_response(prompt, top_k=10, stats=generation_stats)
+            response = st.write_stream(stream)
+            if generation_stats.get("time_to_first_token_s") is not None:
+                tps = generation_stats.get("tokens_per_sec")
+                st.caption(f"First token in {generation_stats['time_to_first_token_s']:.2f}s"
+                           + (f" · {tps:.1f} tokens/sec" if tps else ""))
+        # Adding bot response to history
+        st.session_state.messages.append({"role": "assistant", "content": response})
     else:
          # If import failed
          with st.chat_message("assistant"):
@@ -0,0 +1,250 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+# --- Retrieval and end-to-end benchmark over the golden query set ---
+# Usage (from the project root):
+#   python benchmark/run_benchmark.py                      # retrieval + end-to-end with the stub LLM
+#   python benchmark/run_benchmark.py --llm gguf           # end-to-end with the configured GGUF model
+#   python benchmark/run_benchmark.py --compare benchmark/results/<previous>.json
+BENCHMARK_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCHMARK_DIR.parent
+GOLDEN_PATH = BENCHMARK_DIR / 'golden_queries.json'
+RESULTS_DIR = BENCHMARK_DIR / 'results'
+K_VALUES = (1, 3, 5, 10)
+RESULTS_FORMAT_VERSION = 1
+
+sys.path.append(str(PROJECT_ROOT))
+import chatbot_app
+
+
+class StubLLM:
+    """Stands in for llama_cpp.Llama: answers with the first item line of the context, instantly.
+
+    Lets the pipeline (retrieval, prompt building, post-processing) be timed on a plain CPU box. Context lines are
+    the packed "- name | restaurant | ..." lines from context_packer (or a raw document where metadata was missing).
+    """
+
+    def __call__(self, prompt, stream=False, **kwargs):
+        context = prompt.split("**CONTEXT:**", 1)[-1].split("**USER QUESTION:**", 1)[0]
+        item = next((line.strip().removeprefix("- ") for line in context.splitlines() if line.strip()), "The information is not available in the menu.")
+        text = " " + item[:300]
+        if stream: return ({"choices": [{"text": " " + word, "index": 0, "finish_reason": None}]} for word in text.split())
+        return {"choices": [{"text": text, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split())}}
+
+
+def git_revision():
+    """Returns (commit, dirty) for the working tree, or (None, None) outside a git checkout."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except Exception:
+        return None, None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is unavailable, e.g. Windows)."""
+    try: import resource
+    except ImportError: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # Bytes on macOS, KB on Linux
+
+
+def latency_summary(seconds):
+    if not seconds: return None
+    ms = np.asarray(seconds) * 1000
+    return {"n": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)), "p99_ms": float(np.percentile(ms, 99))}
+
+
+def retrieval_scores(retrieved_ids, expected_ids, k_values):
+    """recall@k (capped at k, since an item listed under several categories has several IDs) and reciprocal rank."""
+    expected = set(expected_ids)
+    scores = {f"recall@{k}": len(expected & set(retrieved_ids[:k])) / min(len(expected), k) for k in k_values}
+    first_hit = next((rank for rank, doc_id in enumerate(retrieved_ids, 1) if doc_id in expected), None)
+    scores["rr"] = 1.0 / first_hit if first_hit else 0.0
+    return scores
+
+
+def run_retrieval(queries, k_values, repeat):
+    rows, stage_times = [], {"embed": [], "search": [], "rerank": []}
+    depth = max(k_values)
+    for q in queries:
+        for n in range(repeat):
+            timings = {}
+            retrieval, error = chatbot_app._retrieve_context(q["query"], depth, timings)
+            for stage in stage_times: stage_times[stage].append(timings.get(f"{stage}_s"))
+        retrieved = retrieval["ids"] if retrieval else []
+        row = {"id": q["id"], "query": q["query"], "kind": q.get("kind"), "retrieved_ids": retrieved, "error": error}
+        row.update(retrieval_scores(retrieved, q["expected_ids"], k_values))
+        rows.append(row)
+    metrics = {key: float(np.mean([r[key] for r in rows])) for key in rows[0] if key.startswith("recall@")}
+    metrics["mrr"] = float(np.mean([r["rr"] for r in rows]))
+    by_kind = {}
+    for r in rows: by_kind.setdefault(r["kind"], []).append(r["rr"])
+    metrics["mrr_by_kind"] = {kind: float(np.mean(v)) for kind, v in by_kind.items()}
+    sequential_s = sum(t for times in stage_times.values() for t in times if t is not None)
+    metrics["sequential_queries_per_sec"] = len(queries) * repeat / sequential_s if sequential_s else None
+    batch_timings = {} # Same queries through the batched path: one embedding pass, one Chroma call per filter
+    chatbot_app.search_many([q["query"] for q in queries], depth, timings=batch_timings)
+    metrics["batched_queries_per_sec"] = batch_timings.get("queries_per_sec")
+    return rows, metrics, {stage: [t for t in times if t is not None] for stage, times in stage_times.items()}
+
+
+def run_end_to_end(queries, top_k, repeat):
+    rows, stage_times = [], {"embed": [], "search": [], "generate": [], "prefix_restore": [], "prompt_eval": [], "total": []}
+    reused = []
+    total_tokens, total_generate = 0, 0.0
+    for q in queries:
+        for n in range(repeat):
+            timings = {}
+            start = time.perf_counter()
+            answer = chatbot_app.get_rag_response(q["query"], top_k=top_k, timings=timings)
+            stage_times["total"].append(time.perf_counter() - start)
+            for stage in ("embed", "search", "generate", "prefix_restore", "prompt_eval"):
+                if timings.get(f"{stage}_s") is not None: stage_times[stage].append(timings[f"{stage}_s"])
+            if timings.get("prefix_tokens_reused") is not None: reused.append(timings["prefix_tokens_reused"])
+            if timings.get("completion_tokens") and timings.get("generate_s"):
+                total_tokens += timings["completion_tokens"]; total_generate += timings["generate_s"]
+        rows.append({"id": q["id"], "query": q["query"], "answer": answer, "completion_tokens": timings.get("completion_tokens")})
+    metrics = {"tokens_per_sec": total_tokens / total_generate if total_generate > 0 else None, "completion_tokens": total_tokens,
+               "prefix_tokens_reused_mean": float(np.mean(reused)) if reused else None}
+    return rows, metrics, stage_times
+
+
+def print_report(results):
+    print("\n==================== Benchmark Results ====================")
+    print(f"Commit: {results['commit']}{' (dirty)' if results['dirty'] else ''}   Golden set v{results['golden_version']} ({results['config']['num_queries']} queries)")
+    retrieval = results["metrics"].get("retrieval")
+    if retrieval:
+        print("Retrieval: " + "  ".join(f"{k}={v:.3f}" for k, v in retrieval.items() if k.startswith("recall@")) + f"  MRR={retrieval['mrr']:.3f}")
+        for kind, mrr in retrieval["mrr_by_kind"].items(): print(f"  MRR [{kind}] = {mrr:.3f}")
+        if retrieval.get("sequential_queries_per_sec") and retrieval.get("batched_queries_per_sec"):
+            print(f"Retrieval throughput: {retrieval['sequential_queries_per_sec']:.1f} queries/sec one by one, {retrieval['batched_queries_per_sec']:.1f} queries/sec batched (search_many)")
+    for stage, summary in results["metrics"]["latency"].items():
+        if summary: print(f"  {stage:<9} p50 {summary['p50_ms']:8.1f} ms   p95 {summary['p95_ms']:8.1f} ms   p99 {summary['p99_ms']:8.1f} ms   (n={summary['n']})")
+    e2e = results["metrics"].get("end_to_end")
+    if e2e and e2e["tokens_per_sec"]: print(f"Generation: {e2e['tokens_per_sec']:.1f} tokens/sec ({e2e['completion_tokens']} tokens)")
+    if e2e and e2e.get("prefix_tokens_reused_mean") is not None: print(f"Prompt tokens already in the KV cache: {e2e['prefix_tokens_reused_mean']:.0f} per request (mean)")
+    index = results["config"].get("vector_index")
+    if isinstance(index, dict):
+        print(f"Vector index: {index['count']} x {index['dim']} {index['dtype']} ({index['float_mb']:.1f} MB)"
+              + (f", int8 first pass ({index['int8_mb']:.1f} MB)" if index["quantized"] else ""))
+    if results["metrics"]["peak_rss_mb"] is not None: print(f"Peak RSS: {results['metrics']['peak_rss_mb']:.0f} MB")
+    print("===========================================================")
+
+
+def flatten_metrics(metrics, prefix=""):
+    flat = {}
+    for key, value in (metrics or {}).items():
+        if isinstance(value, dict): flat.update(flatten_metrics(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool): flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(results, previous_path):
+    """Prints metric deltas against an earlier results file."""
+    with open(previous_path, 'r', encoding='utf-8') as f: previous = json.load(f)
+    if previous.get("golden_version") != results["golden_version"]:
+        print(f"Warning: golden set version differs ({previous.get('golden_version')} vs {results['golden_version']}); quality numbers are not comparable.")
+    old, new = flatten_metrics(previous.get("metrics")), flatten_metrics(results["metrics"])
+    print(f"\nChange vs {previous.get('commit')} ({previous_path}):")
+    for key in sorted(new):
+        if key in old and key.split(".")[-1] != "n":
+            delta = new[key] - old[key]
+            pct = f" ({delta / old[key] * 100:+.1f}%)" if old[key] else ""
+            print(f"  {key:<40} {old[key]:12.4f} -> {new[key]:12.4f}{pct}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and RAG latency on the golden query set.")
+    parser.add_argument("--golden", default=str(GOLDEN_PATH), help="Golden query file (default: benchmark/golden_queries.json)")
+    parser.add_argument("--mode", choices=["retrieval", "e2e", "both"], default="both")
+    parser.add_argument("--top-k", type=int, default=5, help="top_k passed to get_rag_response in the end-to-end run")
+    parser.add_argument("--llm", choices=["stub", "gguf"], default="stub", help="stub: instant fake LLM; gguf: load a GGUF model via llama-cpp-python")
+    parser.add_argument("--model-path", help="GGUF file to use with --llm gguf (default: chatbot_app.MODEL_PATH), e.g. a small quantized model")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per query (latency percentiles use every run)")
+    parser.add_argument("--no-hybrid", action="store_true", help="Disable BM25 fusion (vector retrieval only)")
+    parser.add_argument("--backend", choices=["numpy", "numpy-int8", "chroma"], help="Vector backend (default: chatbot_app.VECTOR_BACKEND); "
+                        "compare numpy-int8 against numpy to measure the recall cost of quantization")
+    parser.add_argument("--rerank", action="store_true", help="Enable the cross-encoder rerank stage (chatbot_app.RERANK_*)")
+    parser.add_argument("--no-prefix-cache", action="store_true", help="Clear the KV cache before every generation (full prompt eval); "
+                        "compare against a default --llm gguf run to measure the prompt-prefix cache")
+    parser.add_argument("--output", help="Results JSON path (default: benchmark/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to print metric deltas against")
+    args = parser.parse_args()
+
+    with open(args.golden, 'r', encoding='utf-8') as f: golden = json.load(f)
+    queries = golden["queries"]
+    print(f"Loaded golden set v{golden['version']} with {len(queries)} queries from {args.golden}")
+
+    # Benchmark the retrieval/generation path itself: no router shortcuts, no cached answers
+    chatbot_app.ROUTER_ENABLED = False
+    chatbot_app.answer_cache = None
+    if args.rerank and chatbot_app.reranker is None:
+        chatbot_app.reranker = chatbot_app.CrossEncoderReranker(chatbot_app.RERANK_MODEL_NAME, chatbot_app.RERANK_BUDGET_S, chatbot_app.RERANK_CACHE_ENTRIES)
+    if args.model_path: chatbot_app.MODEL_PATH = args.model_path
+    if args.no_prefix_cache: chatbot_app.PROMPT_PREFIX_CACHE_ENABLED = False
+    if args.backend:
+        chatbot_app.VECTOR_BACKEND = "chroma" if args.backend == "chroma" else "numpy"
+        chatbot_app.VECTOR_QUANTIZED = args.backend == "numpy-int8"
+    load_start = time.perf_counter()
+    chatbot_app.models.load(llm=StubLLM() if args.llm == "stub" else None)
+    load_s = time.perf_counter() - load_start
+    if not chatbot_app.models.is_ready():
+        print(f"Models failed to load: {chatbot_app.models.error}"); sys.exit(1)
+    if args.no_hybrid: chatbot_app.models.bm25 = None
+
+    known = set(chatbot_app.models.collection.get(ids=[i for q in queries for i in q["expected_ids"]], include=[])["ids"])
+    missing = [q["id"] for q in queries if not set(q["expected_ids"]) & known]
+    if missing: print(f"Warning: {len(missing)} queries have no expected IDs in the current KB (re-run create_kb.py or refresh the golden set): {missing}")
+
+    chatbot_app._retrieve_context(queries[0]["query"], 1) # Warm-up: first encode pays one-off initialisation costs
+
+    latencies, metrics, per_query = {}, {}, {}
+    if args.mode in ("retrieval", "both"):
+        rows, metrics["retrieval"], times = run_retrieval(queries, K_VALUES, args.repeat)
+        per_query["retrieval"] = rows
+        latencies.update(times)
+    if args.mode in ("e2e", "both"):
+        rows, metrics["end_to_end"], times = run_end_to_end(queries, args.top_k, args.repeat)
+        per_query["end_to_end"] = rows
+        latencies["generate"] = times["generate"]; latencies["e2e_total"] = times["total"]
+        if times["prompt_eval"]: latencies["prefix_restore"], latencies["prompt_eval"] = times["prefix_restore"], times["prompt_eval"]
+        if "embed" not in latencies: latencies["embed"], latencies["search"] = times["embed"], times["search"]
+    metrics["latency"] = {stage: latency_summary(t) for stage, t in latencies.items()}
+    metrics["model_load_s"] = load_s
+    metrics["peak_rss_mb"] = peak_rss_mb()
+
+    commit, dirty = git_revision()
+    results = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "golden_version": golden["version"],
+        "commit": commit, "dirty": dirty,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"mode": args.mode, "top_k": args.top_k, "k_values": list(K_VALUES), "llm": args.llm,
+                   "model_path": chatbot_app.MODEL_PATH if args.llm == "gguf" else None, "repeat": args.repeat,
+                   "prefix_cache": chatbot_app.PROMPT_PREFIX_CACHE_ENABLED, "hybrid": chatbot_app.models.bm25 is not None, "rerank": chatbot_app.reranker is not None, "embedding_model": chatbot_app.EMBEDDING_MODEL_NAME,
+                   "vector_index": chatbot_app.models.collection.stats() if hasattr(chatbot_app.models.collection, "stats") else "chroma",
+                   "num_queries": len(queries)},
+        "metrics": metrics,
+        "queries": per_query,
+    }
+    print_report(results)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f: json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {output}")
+    if args.compare: compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
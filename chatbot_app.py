@@ -2,12 +2,20 @@ import time
 import json
 from pathlib import Path
 import re
-import chromadb
-from chromadb.utils import embedding_functions
-# --- Using LlamaCPP ---
-from llama_cpp import Llama
+# chromadb and llama_cpp are imported inside ModelRegistry so that importing this module stays cheap
 import sys
 import traceback
+import threading
+from collections import OrderedDict
+import numpy as np
+from menu_router import route_query, parse_constraints # Structured lookups answered without the LLM + query constraint parsing
+from knowledge_base.bm25_index import load_index as load_bm25_index, BM25_INDEX_PATH
+from knowledge_base.vector_index import load_vector_index, VECTOR_INDEX_PATH # Exact NumPy search over the exported embeddings
+from knowledge_base.embedding_cache import EmbeddingCache, CachedEmbeddingFunction, EMBEDDING_CACHE_PATH
+from context_packer import pack_context # Dedupes retrieved items and packs them as compact lines under a token budget
+from llm_scheduler import LocalLLMGate, LLMScheduler, LLMBusyError, LLMTimeoutError # Serialized / multi-process access to the model
+from rag_tracing import tracer, NOOP_TRACE # Per-stage spans + metrics; no-ops unless RAG_TRACING=1
+from reranker import CrossEncoderReranker # Optional cross-encoder pass over a wider candidate set
 
 # --- Configuration ---
 CURRENT_DIR = Path(__file__).resolve().parent # Assumes chatbot_app.py is in project root
@@ -15,77 +23,556 @@ KB_DIR = CURRENT_DIR / 'knowledge_base'
 CHROMA_DB_PATH = str(KB_DIR / 'chroma_db_menu')
 COLLECTION_NAME = "restaurant_menus"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# "numpy": exact brute-force search over the memory-mapped matrix create_kb.py exports (fastest for a few
+# thousand menu items); "chroma": the ChromaDB collection's ANN index, for corpora too large to scan per query.
+# Both expose the same query/get/count calls, so retrieval code doesn't care which one is loaded.
+VECTOR_BACKEND = "numpy"
+VECTOR_QUANTIZED = False    # numpy backend: scan the int8 codes (~4x less memory) and rerank a shortlist with the float rows
+QUANTIZED_RERANK_FACTOR = 4 # Shortlist size = factor x n_results
+EMBEDDING_CACHE_ENABLED = True # Reuse query embeddings (SQLite, shared with create_kb.py) instead of re-encoding repeated questions
 
 # --- GGUF Model Configuration ---
 MODEL_DIR = CURRENT_DIR / 'models'
 
 GGUF_MODEL_FILENAME = "capybarahermes-2.5-mistral-7b.Q4_K_M.gguf" 
 MODEL_PATH = str(MODEL_DIR / GGUF_MODEL_FILENAME)
+LLM_N_CTX = 2048 # Context window the GGUF model is loaded with
+PROMPT_PREFIX_CACHE_ENABLED = True # Evaluate the fixed instruction header once and restore its KV state per request; False clears the KV cache per request (full prompt eval, the benchmark baseline)
 
+# --- LLM Request Scheduling ---
+LLM_WORKERS = 0              # 0: one in-process model behind a lock; N: N worker processes, each loading its own copy of the GGUF
+LLM_QUEUE_SIZE = 8           # Requests allowed to wait for a model; beyond that new ones are turned away immediately
+LLM_REQUEST_TIMEOUT_S = 120  # Max time a request may wait for and use a model
+LLM_BUSY_MESSAGE = "The assistant is busy answering other questions right now. Please try again in a moment."
+LLM_TIMEOUT_MESSAGE = "Sorry, generating the answer took too long. Please try again."
 
+# --- Structured Query Router ---
+ROUTER_ENABLED = True # Answer "cheapest item at X" / "veg items under 200" / "how many desserts" from the column index
+METADATA_FILTERS_ENABLED = True # Restrict vector search by restaurant / veg / price range found in the question
 
-# --- Loading Existing Knowledge Base (ChromaDB) ---
+# --- Hybrid Retrieval (BM25 + vector, reciprocal-rank fusion) ---
+HYBRID_RETRIEVAL_ENABLED = True # Fuse exact-name BM25 matches ("McAloo Tikki", "B.M.T") with the vector results
+HYBRID_CANDIDATES = 20          # Candidates taken from each retriever before fusion
+RRF_K = 60                      # Reciprocal-rank fusion constant: score = sum(1 / (RRF_K + rank))
 
-print("Loading Knowledge Base from ChromaDB...")
-collection = None # Initialize
-llm = None # Initialize
-try:
-    chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    hf_ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
-    collection = chroma_client.get_collection(name=COLLECTION_NAME, embedding_function=hf_ef)
-    print(f"Loaded ChromaDB collection '{COLLECTION_NAME}' with {collection.count()} items.")
-except Exception as e:
-    print(f"Error loading ChromaDB collection: {e}")
-    print(f"Please ensure 'create_kb.py' ran successfully and the database exists at {CHROMA_DB_PATH}.")
+# --- Cross-Encoder Reranking ---
+RERANK_ENABLED = False          # Downloads the cross-encoder on first use (~90MB)
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 50          # Candidates retrieved (and fused) before reranking down to top_k
+RERANK_BUDGET_S = 0.3           # Predicted scoring time allowed per request; over budget the retrieval order is kept
+RERANK_CACHE_ENTRIES = 20000    # LRU bound on cached (query, item) scores
 
+# --- Semantic Answer Cache Configuration ---
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIMILARITY = 0.92   # Min cosine similarity between query embeddings for a cache hit
+ANSWER_CACHE_MAX_ENTRIES = 1000  # LRU bound (each entry ~1.5KB embedding + answer text)
+ANSWER_CACHE_TTL_S = 6 * 3600    # Entries older than this are dropped
+ANSWER_CACHE_PATH = None         # e.g. KB_DIR / 'answer_cache.json' to persist the cache across restarts
 
+# --- Context Packing Configuration ---
+CONTEXT_PACKING_ENABLED = True  # False: inline the raw chunk texts joined by blank lines, as before
+CONTEXT_TOKEN_BUDGET = None     # Max context tokens; None = whatever n_ctx leaves after the prompt template and max_tokens
+CONTEXT_SAFETY_TOKENS = 32      # Headroom kept free when the budget is derived from n_ctx
 
 
-# --- Loading GGUF Language Model using llama-cpp-python ---
 
-print(f"Loading GGUF Model: {MODEL_PATH}...")
-if collection is not None: # Only load LLM if KB loaded
-    if not Path(MODEL_PATH).is_file():
-        print(f"ERROR: Model file not found at {MODEL_PATH}")
-        print(f"Please download the '{GGUF_MODEL_FILENAME}' GGUF model and place it in the '{MODEL_DIR}' folder.")
-    else:
+# --- Lazy Model Registry ---
+class ModelRegistry:
+    """Process-wide, thread-safe holder for the vector index, embedding function and GGUF model.
+
+    Nothing is loaded at import time. The first call to `load()` (or a background `warm_up()`) loads
+    everything once; concurrent callers block on the lock until loading has finished, so a query can
+    never see a half-loaded model.
+    """
+
+    def __init__(self):
+        self.collection = None # ChromaDB collection or NumpyVectorIndex, depending on VECTOR_BACKEND
+        self.embedding_function = None
+        self.llm = None
+        self.gate = None      # LocalLLMGate or LLMScheduler; every generation goes through it
+        self.tokenizer = None # Anything with Llama.tokenize (the model itself, or a vocab-only Llama next to worker processes)
+        self.bm25 = None # Optional; retrieval is vector-only without it
+        self.prefix_tokens = []  # Tokens of PROMPT_PREFIX held in the saved KV state
+        self.prefix_state = None # llama_cpp.LlamaState right after evaluating PROMPT_PREFIX
+        self.error = None
+        self._loaded = False
+        self._loading = False
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+
+    @property
+    def status(self):
+        if self._loading: return "loading"
+        if not self._loaded: return "not loaded"
+        return "ready" if self.gate is not None and self.collection is not None else "failed"
+
+    def is_ready(self):
+        return self.status == "ready"
+
+    def load(self, llm=None):
+        """Loads all components on first use; later calls return immediately.
+
+        `llm` may be any callable with the llama_cpp.Llama call interface (e.g. a stub for benchmarks);
+        it is used instead of loading the GGUF model.
+        """
+        if self._loaded: return self
+        with self._lock:
+            if self._loaded: return self # Another thread finished loading while we waited
+            self._loading = True
+            try:
+                self._load_knowledge_base()
+                if self.collection is not None: # Only load LLM if KB loaded
+                    if llm is not None: self.llm = llm
+                    elif LLM_WORKERS > 0: self._start_scheduler()
+                    else: self._load_llm()
+                    if self.llm is not None and self.gate is None:
+                        self.gate = LocalLLMGate(self.llm, max_queue=LLM_QUEUE_SIZE, timeout_s=LLM_REQUEST_TIMEOUT_S,
+                                                 before_generate=self.restore_prompt_prefix)
+                        self.tokenizer = self.llm
+            finally:
+                self._loading = False
+                self._loaded = True
+        return self
+
+    def load_llm(self):
+        """Loads only the GGUF model (used by LLM worker processes, which don't need the KB)."""
+        with self._lock:
+            if self.llm is None: self._load_llm()
+        return self
+
+    def generate(self, prompt, stream=False, **kwargs):
+        """Runs one completion through the request gate; same return shapes as calling llama_cpp.Llama.
+
+        Pass `stats={}` to get the prefix-restore / prompt-eval numbers (see llm_scheduler). Raises LLMBusyError
+        when too many requests are queued and LLMTimeoutError after LLM_REQUEST_TIMEOUT_S.
+        """
+        return self.gate.complete(prompt, stream=stream, **kwargs)
+
+    def _start_scheduler(self):
+        scheduler = LLMScheduler(LLM_WORKERS, MODEL_PATH, max_queue=LLM_QUEUE_SIZE, timeout_s=LLM_REQUEST_TIMEOUT_S)
+        if not scheduler.start():
+            self.error = f"Error starting LLM workers: {scheduler.error}"; return
+        self.gate = scheduler
+        try:
+            from llama_cpp import Llama
+            self.tokenizer = Llama(model_path=MODEL_PATH, vocab_only=True, verbose=False) # Token counting for context packing
+        except Exception as e: print(f"Warning: Could not load the tokenizer, estimating token counts: {e}")
+
+    def warm_up(self, background=True):
+        """Starts loading in a daemon thread (at most once) so the UI can render before the models are ready."""
+        if not background: return self.load()
+        with self._lock:
+            if self._loaded or self._warmup_thread is not None: return self
+            self._warmup_thread = threading.Thread(target=self.load, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self
+
+    # --- Loading Existing Knowledge Base (NumPy index or ChromaDB) ---
+    def _load_knowledge_base(self):
+        print(f"Loading Knowledge Base ({VECTOR_BACKEND} backend)...")
         try:
-            llm = Llama(
+            from chromadb.utils import embedding_functions
+            self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
+            chroma_embedding_function = self.embedding_function
+            if EMBEDDING_CACHE_ENABLED:
+                try: self.embedding_function = CachedEmbeddingFunction(self.embedding_function, EmbeddingCache(EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_PATH))
+                except Exception as e: print(f"Warning: Could not open the embedding cache at {EMBEDDING_CACHE_PATH}, encoding every query: {e}")
+            if VECTOR_BACKEND == "numpy":
+                self.collection = load_vector_index(VECTOR_INDEX_PATH, quantized=VECTOR_QUANTIZED, rerank_factor=QUANTIZED_RERANK_FACTOR)
+                if self.collection is not None: print(f"Memory-mapped NumPy vector index with {self.collection.count()} items ({'int8 + float rerank' if self.collection.codes is not None else self.collection.embeddings.dtype}).")
+                else: print(f"Warning: No NumPy vector index at {VECTOR_INDEX_PATH}; re-run 'create_kb.py'. Falling back to ChromaDB.")
+            if self.collection is None:
+                import chromadb
+                chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+                self.collection = chroma_client.get_collection(name=COLLECTION_NAME, embedding_function=chroma_embedding_function)
+                print(f"Loaded ChromaDB collection '{COLLECTION_NAME}' with {self.collection.count()} items.")
+        except Exception as e:
+            self.error = f"Error loading the knowledge base: {e}"
+            print(self.error)
+            print(f"Please ensure 'create_kb.py' ran successfully and the database exists at {CHROMA_DB_PATH}.")
+            return
+        if not HYBRID_RETRIEVAL_ENABLED: return
+        try:
+            self.bm25 = load_bm25_index(BM25_INDEX_PATH)
+            if self.bm25 is not None: print(f"Memory-mapped BM25 index with {self.bm25.n_docs} documents.")
+            else: print(f"Warning: No BM25 index at {BM25_INDEX_PATH}; re-run 'create_kb.py' for hybrid retrieval. Using vector search only.")
+        except Exception as e: print(f"Warning: Could not load BM25 index, using vector search only: {e}")
+
+    # --- Loading GGUF Language Model using llama-cpp-python ---
+    def _load_llm(self):
+        print(f"Loading GGUF Model: {MODEL_PATH}...")
+        if not Path(MODEL_PATH).is_file():
+            self.error = f"ERROR: Model file not found at {MODEL_PATH}"
+            print(self.error)
+            print(f"Please download the '{GGUF_MODEL_FILENAME}' GGUF model and place it in the '{MODEL_DIR}' folder.")
+            return
+        try:
+            from llama_cpp import Llama
+            self.llm = Llama(
                 model_path=MODEL_PATH,
-                n_ctx=2048, n_threads=None, n_gpu_layers=0, verbose=False
+                n_ctx=LLM_N_CTX, n_threads=None, n_gpu_layers=0, verbose=False
             )
             print("GGUF Language Model loaded successfully.")
         except Exception as e:
-            print(f"Error loading GGUF Language Model: {e}")
+            self.error = f"Error loading GGUF Language Model: {e}"
+            print(self.error)
             print("Ensure 'llama-cpp-python' is installed correctly and the model path is correct.")
             traceback.print_exc()
+            return
+        self._prime_prompt_prefix()
+
+    # --- Prompt-prefix KV cache ---
+    def _prime_prompt_prefix(self):
+        """Evaluates the static instruction header once and saves the resulting KV state."""
+        if not PROMPT_PREFIX_CACHE_ENABLED or not hasattr(self.llm, "save_state"): return
+        try:
+            start = time.perf_counter()
+            tokens = self.llm.tokenize(PROMPT_PREFIX.encode("utf-8"), special=True) # Same call create_completion makes (adds BOS)
+            probe = self.llm.tokenize((PROMPT_PREFIX + "- Item").encode("utf-8"), special=True)
+            n = 0 # Keep only the tokens that come out identically once the context is appended
+            while n < min(len(tokens), len(probe)) and tokens[n] == probe[n]: n += 1
+            self.llm.reset()
+            self.llm.eval(tokens[:n])
+            self.prefix_tokens = list(tokens[:n])
+            self.prefix_state = self.llm.save_state()
+            print(f"Cached KV state for the {n}-token prompt prefix in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            print(f"Warning: Could not cache the prompt prefix KV state, prompts will be evaluated in full: {e}")
+            self.prefix_tokens, self.prefix_state = [], None
+
+    def restore_prompt_prefix(self, prompt):
+        """Prepares the KV cache for generating from `prompt`; returns how many of its leading tokens are already cached.
+
+        llama.cpp skips re-evaluating the longest common token prefix between its KV cache and a new prompt. After
+        an ordinary RAG generation the header is therefore still in place; the saved state is loaded only when the
+        cache does not start with it (the first request after loading, or after anything else used the model).
+        With PROMPT_PREFIX_CACHE_ENABLED off the cache is cleared, so the whole prompt is evaluated every time.
+        """
+        if not hasattr(self.llm, "input_ids"): return None # Not a llama_cpp.Llama (e.g. the benchmark stub)
+        if not PROMPT_PREFIX_CACHE_ENABLED: self.llm.reset(); return 0
+        n = len(self.prefix_tokens)
+        if self.prefix_state is not None and (self.llm.n_tokens < n or list(self.llm.input_ids[:n]) != self.prefix_tokens):
+            self.llm.load_state(self.prefix_state)
+        tokens, cached = self.llm.tokenize(prompt.encode("utf-8"), special=True), self.llm.input_ids[:self.llm.n_tokens]
+        reused = 0
+        while reused < min(len(tokens), len(cached)) and tokens[reused] == cached[reused]: reused += 1
+        return reused
+
+
+models = ModelRegistry() # Shared by every caller (and every Streamlit session) in this process
+
 
 
+# --- Semantic Answer Cache ---
+class SemanticAnswerCache:
+    """Caches generated answers keyed by (query embedding, retrieved document IDs).
+
+    A new query hits the cache when it retrieved the same set of documents as a stored query and
+    their embeddings have cosine similarity >= `similarity_threshold`, so rephrasings like
+    "veg pizzas at dominos" / "dominos veg pizza list" skip the LLM entirely.
+    """
+
+    def __init__(self, similarity_threshold=0.92, max_entries=1000, ttl_seconds=6 * 3600, persist_path=None):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # entry_id -> {"query", "embedding", "doc_ids", "answer", "created_at"}; LRU order
+        self._by_doc_ids = {}         # doc_ids key -> set of entry_ids, so lookups only compare embeddings that retrieved the same docs
+        self._next_id = 0
+        self._lock = threading.Lock()
+        if self.persist_path and self.persist_path.is_file(): self._load()
+
+    @staticmethod
+    def _doc_key(doc_ids):
+        return tuple(sorted(doc_ids))
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._by_doc_ids.get(entry["doc_ids"])
+        if bucket is not None:
+            bucket.discard(entry_id)
+            if not bucket: del self._by_doc_ids[entry["doc_ids"]]
+
+    def _evict(self):
+        now = time.time()
+        if self.ttl_seconds:
+            # Oldest-created entries are not necessarily at the LRU front, so scan all (the cache is small and bounded)
+            for entry_id in [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl_seconds]: self._remove(entry_id)
+        while len(self._entries) > self.max_entries: self._remove(next(iter(self._entries)))
+
+    def lookup(self, embedding, doc_ids):
+        """Returns the cached answer for a near-duplicate query, or None."""
+        query_vec = self._normalize(embedding)
+        with self._lock:
+            self._evict()
+            candidates = list(self._by_doc_ids.get(self._doc_key(doc_ids), ()))
+            if candidates:
+                sims = np.stack([self._entries[c]["embedding"] for c in candidates]) @ query_vec
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity_threshold:
+                    self._entries.move_to_end(candidates[best])
+                    self.hits += 1
+                    return self._entries[candidates[best]]["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, query, embedding, doc_ids, answer):
+        with self._lock:
+            entry_id = self._next_id; self._next_id += 1
+            doc_key = self._doc_key(doc_ids)
+            self._entries[entry_id] = {"query": query, "embedding": self._normalize(embedding), "doc_ids": doc_key, "answer": answer, "created_at": time.time()}
+            self._by_doc_ids.setdefault(doc_key, set()).add(entry_id)
+            self._evict()
+            if self.persist_path: self._save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0, "entries": len(self._entries)}
+
+    def _save(self):
+        payload = [{"query": e["query"], "embedding": e["embedding"].tolist(), "doc_ids": list(e["doc_ids"]), "answer": e["answer"], "created_at": e["created_at"]} for e in self._entries.values()]
+        tmp_path = self.persist_path.with_suffix(self.persist_path.suffix + ".tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(payload, f, ensure_ascii=False)
+            tmp_path.replace(self.persist_path)
+        except Exception as e: print(f"  Warning: Could not persist answer cache to {self.persist_path}: {e}")
+
+    def _load(self):
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f: payload = json.load(f)
+            for e in payload:
+                entry_id = self._next_id; self._next_id += 1
+                doc_key = self._doc_key(e["doc_ids"])
+                self._entries[entry_id] = {"query": e["query"], "embedding": self._normalize(e["embedding"]), "doc_ids": doc_key, "answer": e["answer"], "created_at": e["created_at"]}
+                self._by_doc_ids.setdefault(doc_key, set()).add(entry_id)
+            self._evict()
+            print(f"Loaded {len(self._entries)} cached answers from {self.persist_path}")
+        except Exception as e: print(f"Warning: Could not load answer cache from {self.persist_path}: {e}")
+
+
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_S, ANSWER_CACHE_PATH) if ANSWER_CACHE_ENABLED else None
+reranker = CrossEncoderReranker(RERANK_MODEL_NAME, RERANK_BUDGET_S, RERANK_CACHE_ENTRIES) if RERANK_ENABLED else None
+
 
 # --- RAG Core Function ---
-def get_rag_response(query, top_k=5):
-    """Performs RAG using LlamaCPP model."""
-    # Checking if models loaded correctly before proceeding
-    if llm is None or collection is None:
-         return "Error: Chatbot components (LLM or KB) not loaded properly."
+GENERATION_KWARGS = dict(max_tokens=250, stop=["</s>", "[INST]", "User Question:", "\n\n"], temperature=0.7, top_p=0.9, echo=False)
+ANSWER_PREFIXES = ("[/INST]", "ANSWER:")
+
+# Stats of the most recent streamed generation (time-to-first-token, tokens/sec)
+last_generation_stats = {}
+
+
+def _build_where(query):
+    """Turns restaurant / veg / price constraints in the question into a Chroma `where` filter (or None)."""
+    if not METADATA_FILTERS_ENABLED: return None
+    c = parse_constraints(query)
+    clauses = []
+    if c["restaurant"]: clauses.append({"restaurant_name": c["restaurant"]})
+    if c["veg"] is True: clauses.append({"is_veg": True})
+    elif c["veg"] is False: clauses.append({"is_non_veg": True})
+    if c["min_price"] is not None: clauses.append({"price_value": {"$gte": c["min_price"]}})
+    if c["max_price"] is not None: clauses.append({"price_value": {"$lte": c["max_price"]}})
+    if not clauses: return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
-    print(f"\nProcessing query: {query}")
 
-    # 1. Retrieval
+def _rrf_fuse(rankings, k=RRF_K):
+    """Reciprocal-rank fusion of several best-first ID lists; returns IDs best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True) # Stable sort keeps first-seen (vector) order on ties
+
+
+def _fuse_with_bm25(query, ids, documents, metadatas, where, top_k):
+    """Merges BM25 hits into the vector results; returns the fused (ids, documents, metadatas), at most top_k."""
+    lexical_ids = [doc_id for doc_id, _ in models.bm25.search(query, HYBRID_CANDIDATES)]
+    fused = _rrf_fuse([ids, lexical_ids])
+    by_id = {doc_id: (doc, meta) for doc_id, doc, meta in zip(ids, documents, metadatas)}
+    missing = [doc_id for doc_id in fused if doc_id not in by_id]
+    if missing:
+        # Lexical-only hits still have to pass the metadata filter, so fetch them from the vector index with the same `where`
+        fetched = models.collection.get(ids=missing, where=where, include=['documents', 'metadatas']) if where else models.collection.get(ids=missing, include=['documents', 'metadatas'])
+        by_id.update({doc_id: (doc, meta) for doc_id, doc, meta in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])})
+    fused = [doc_id for doc_id in fused if doc_id in by_id][:top_k]
+    print(f"  Hybrid retrieval: {len(ids)} vector + {len(lexical_ids)} BM25 candidates -> {len(fused)} fused ({sum(1 for d in fused if d not in ids)} lexical-only)")
+    return fused, [by_id[doc_id][0] for doc_id in fused], [by_id[doc_id][1] for doc_id in fused]
+
+
+def _retrieve_context(query, top_k, timings=None, trace=NOOP_TRACE):
+    """Returns (retrieval, error_message); exactly one of the two is None.
+
+    `retrieval` holds the query embedding and the retrieved document IDs, texts and metadatas (best first).
+    If a `timings` dict is passed, the embed, search (and rerank) stage durations are stored in it.
+    """
     print(f"  Retrieving top {top_k} relevant documents...")
+    where = _build_where(query)
+    hybrid = models.bm25 is not None
+    depth = max(top_k, RERANK_CANDIDATES) if reranker is not None else top_k # Candidates kept for the rerank stage
+    n_results = max(depth, HYBRID_CANDIDATES) if hybrid else depth
+    trace.set(where=where, hybrid=hybrid)
     try:
-        results = collection.query(query_texts=[query], n_results=top_k, include=['documents'])
-    except Exception as e: print(f"  Error querying ChromaDB: {e}"); return "Sorry, error retrieving info."
+        # Embedding explicitly (instead of query_texts) so the semantic answer cache can reuse the vector
+        stage_start = time.perf_counter()
+        with trace.span("embed"): query_embedding = models.embedding_function([query])[0]
+        if timings is not None: timings["embed_s"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        with trace.span("vector_search"):
+            results = None
+            if where is not None:
+                print(f"  Applying metadata filter: {where}")
+                results = models.collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where, include=['documents', 'metadatas', 'distances'])
+                if not results or not results.get('documents') or not results['documents'][0]:
+                    print("  No documents matched the metadata filter; retrying without it.")
+                    results, where = None, None
+                    trace.set(filter_fallback=True)
+            if results is None:
+                results = models.collection.query(query_embeddings=[query_embedding], n_results=n_results, include=['documents', 'metadatas', 'distances'])
+    except Exception as e: print(f"  Error querying the vector index: {e}"); return None, "Sorry, error retrieving info."
 
     if not results or not results.get('documents') or not results['documents'][0]:
-        print("  No relevant documents found."); return "I couldn't find specific info in the menus."
+        print("  No relevant documents found."); return None, "I couldn't find specific info in the menus."
+
+    ids, context_list, metadatas = results['ids'][0], results['documents'][0], (results.get('metadatas') or [[]])[0]
+    trace.set(vector_ids=ids, vector_distances=[round(float(d), 4) for d in (results.get('distances') or [[]])[0]])
+    if hybrid:
+        with trace.span("bm25_fusion"):
+            try: ids, context_list, metadatas = _fuse_with_bm25(query, ids, context_list, metadatas, where, depth)
+            except Exception as e:
+                print(f"  Warning: BM25 fusion failed, using vector results only: {e}")
+                ids, context_list, metadatas = ids[:depth], context_list[:depth], metadatas[:depth]
+    if timings is not None: timings["search_s"] = time.perf_counter() - stage_start
+    ids, context_list, metadatas = _rerank_candidates(query, ids, context_list, metadatas, top_k, trace, timings)
+    trace.set(retrieved_ids=ids)
+    return {"embedding": query_embedding, "ids": ids, "documents": context_list, "metadatas": metadatas}, None
 
-    context_list = results['documents'][0]
-    context = "\n\n".join(context_list)
-    # print(f"  Context:\n{context}\n--------------------") # Debug Context
 
-    # 2. Prompt Construction 
-    prompt = f"""[INST] **CRITICAL INSTRUCTIONS:**
+def _rerank_candidates(query, ids, documents, metadatas, top_k, trace=NOOP_TRACE, timings=None):
+    """Last retrieval stage, shared by _retrieve_context and search_many: the cross-encoder rerank when enabled,
+    then the cut to `top_k`."""
+    if reranker is None: return ids[:top_k], documents[:top_k], metadatas[:top_k]
+    stage_start = time.perf_counter()
+    rerank_stats = {}
+    with trace.span("rerank"):
+        try: ids, documents, metadatas = reranker.rerank(query, ids, documents, metadatas, top_k, rerank_stats)
+        except Exception as e:
+            print(f"  Warning: Reranking failed, keeping the retrieval order: {e}")
+            rerank_stats["outcome"] = "error"
+    print(f"  Rerank: {rerank_stats}")
+    trace.set(rerank=rerank_stats)
+    if timings is not None: timings["rerank_s"] = timings.get("rerank_s", 0.0) + time.perf_counter() - stage_start
+    return ids[:top_k], documents[:top_k], metadatas[:top_k]
+
+
+def search_many(queries, top_k=5, filters=None, timings=None):
+    """Batched retrieval for evaluation, cache warming and the HTTP backend.
+
+    All queries are embedded in one SentenceTransformer batch and searched with one multi-query index call
+    per distinct filter (a single call when they share one). `filters` is None (each query's filter is derived
+    from its wording, as in get_rag_response), one where-dict for every query, or a list with one where-dict
+    (or None) per query. Returns one retrieval dict per query, shaped like _retrieve_context's (None where
+    nothing matched), after the same rerank stage. If a `timings` dict is passed, embed_s, search_s,
+    rerank_s (when reranking) and queries_per_sec are stored in it.
+    """
+    queries = list(queries)
+    if not queries: return []
+    models.load()
+    start = time.perf_counter()
+    if filters is None: wheres = [_build_where(q) for q in queries]
+    elif isinstance(filters, dict): wheres = [filters] * len(queries)
+    else: wheres = list(filters)
+    hybrid = models.bm25 is not None
+    depth = max(top_k, RERANK_CANDIDATES) if reranker is not None else top_k # Same candidate depth as _retrieve_context
+    n_results = max(depth, HYBRID_CANDIDATES) if hybrid else depth
+    include = ['documents', 'metadatas', 'distances']
+
+    embeddings = models.embedding_function(queries)
+    embed_s = time.perf_counter() - start
+
+    def query_group(positions, where):
+        kwargs = dict(query_embeddings=[embeddings[i] for i in positions], n_results=n_results, include=include)
+        if where is not None: kwargs["where"] = where
+        return models.collection.query(**kwargs)
+
+    groups = {} # Filter -> positions of the queries using it
+    for i, where in enumerate(wheres): groups.setdefault(json.dumps(where, sort_keys=True), []).append(i)
+    raw, used_where, unmatched = [None] * len(queries), list(wheres), []
+    for positions in groups.values():
+        results = query_group(positions, wheres[positions[0]])
+        for n, i in enumerate(positions):
+            if results['ids'][n]: raw[i] = (results['ids'][n], results['documents'][n], results['metadatas'][n])
+            elif wheres[i] is not None: unmatched.append(i)
+    if unmatched: # Filters that matched nothing fall back to an unfiltered search, in one call for all of them
+        results = query_group(unmatched, None)
+        for n, i in enumerate(unmatched):
+            used_where[i] = None
+            if results['ids'][n]: raw[i] = (results['ids'][n], results['documents'][n], results['metadatas'][n])
+
+    by_id = {} # (filter, id) -> (document, metadata) for every candidate seen
+    fused_ids = [None] * len(queries)
+    for i, hit in enumerate(raw):
+        if hit is None: continue
+        key = json.dumps(used_where[i], sort_keys=True)
+        by_id.update({(key, doc_id): (doc, meta) for doc_id, doc, meta in zip(*hit)})
+        fused_ids[i] = _rrf_fuse([hit[0], [doc_id for doc_id, _ in models.bm25.search(queries[i], HYBRID_CANDIDATES)]]) if hybrid else hit[0]
+    if hybrid: # Lexical-only hits: one get per filter, checked against the same filter as their query
+        missing = {}
+        for i, ids in enumerate(fused_ids):
+            if ids is None: continue
+            key = json.dumps(used_where[i], sort_keys=True)
+            missing.setdefault(key, (used_where[i], set()))[1].update(d for d in ids if (key, d) not in by_id)
+        for key, (where, ids) in missing.items():
+            if not ids: continue
+            fetched = models.collection.get(ids=sorted(ids), where=where, include=['documents', 'metadatas']) if where else models.collection.get(ids=sorted(ids), include=['documents', 'metadatas'])
+            by_id.update({(key, doc_id): (doc, meta) for doc_id, doc, meta in zip(fetched['ids'], fetched['documents'], fetched['metadatas'])})
+
+    search_s = time.perf_counter() - start - embed_s
+    retrievals, rerank_timings = [], {}
+    for i, ids in enumerate(fused_ids):
+        if ids is None: retrievals.append(None); continue
+        key = json.dumps(used_where[i], sort_keys=True)
+        ids = [doc_id for doc_id in ids if (key, doc_id) in by_id][:depth]
+        ids, documents, metadatas = _rerank_candidates(queries[i], ids, [by_id[(key, d)][0] for d in ids], [by_id[(key, d)][1] for d in ids],
+                                                       top_k, timings=rerank_timings)
+        retrievals.append({"embedding": embeddings[i], "ids": ids, "documents": documents, "metadatas": metadatas})
+    total = time.perf_counter() - start
+    print(f"  search_many: {len(queries)} queries in {total:.3f}s ({len(queries) / total:,.1f} queries/sec), "
+          f"embedding {embed_s:.3f}s, {len(groups) + bool(unmatched)} vector queries")
+    if timings is not None: timings.update(embed_s=embed_s, search_s=search_s, queries_per_sec=len(queries) / total, **rerank_timings)
+    return retrievals
+
+
+def _route_structured(query):
+    """Returns a direct answer for structured lookups, or None to continue with RAG."""
+    if not ROUTER_ENABLED: return None
+    try: return route_query(query)
+    except Exception as e: print(f"  Warning: Query router failed, falling back to RAG: {e}"); return None
+
+
+def _cached_answer(retrieval):
+    if answer_cache is None: return None
+    answer = answer_cache.lookup(retrieval["embedding"], retrieval["ids"])
+    stats = answer_cache.stats()
+    print(f"  Answer cache {'HIT' if answer is not None else 'miss'} (hits={stats['hits']}, misses={stats['misses']}, entries={stats['entries']})")
+    return answer
+
+
+def _store_answer(query, retrieval, answer):
+    if answer_cache is not None and answer: answer_cache.store(query, retrieval["embedding"], retrieval["ids"], answer)
+
+
+# The instruction header is identical for every request, so its KV state is computed once (see ModelRegistry._prime_prompt_prefix)
+PROMPT_PREFIX = """[INST] **CRITICAL INSTRUCTIONS:**
 1. Your task is to answer the user's question about restaurant menus.
 2. Base your answer **STRICTLY AND ONLY** on the information present in the 'CONTEXT' section below.
 3. **DO NOT** use any outside knowledge or make assumptions.
@@ -93,30 +580,205 @@ def get_rag_response(query, top_k=5):
 5. Be concise and directly answer the question using details from the context if available.
 
 **CONTEXT:**
-{context}
+"""
+
+
+def _build_prompt(context, query):
+    return PROMPT_PREFIX + f"""{context}
 
 **USER QUESTION:** {query} [/INST]
 **ANSWER:**"""
 
-    # 3. Generation using llama-cpp-python
-    print("  Generating response...")
-    response = "Sorry, I encountered an error generating a response."
-    try:
-        output = llm(prompt, max_tokens=250, stop=["</s>", "[INST]", "User Question:", "\n\n"], temperature=0.7, top_p=0.9, echo=False)
-        if output and 'choices' in output and len(output['choices']) > 0 and 'text' in output['choices'][0]:
-             response = output['choices'][0]['text'].strip()
-             if response.startswith("[/INST]"): response = response[len("[/INST]"):].strip()
-             if response.startswith("ANSWER:"): response = response[len("ANSWER:"):].strip()
-#              print(f"  Raw LLM Output: {response}")
-        else: print(f"  Warning: Unexpected output format from llama_cpp: {output}")
-    except Exception as e: print(f"  Error during response generation: {e}"); traceback.print_exc()
 
-    return response
+def _count_tokens(text):
+    """Tokens per the loaded model's tokenizer; a chars/4 estimate when the LLM has none (e.g. a benchmark stub)."""
+    tokenize = getattr(models.tokenizer, "tokenize", None)
+    if tokenize is None: return len(text) // 4 + 1
+    return len(tokenize(text.encode("utf-8"), add_bos=False))
+
+
+def _build_context(retrieval, query, trace=NOOP_TRACE):
+    """Packs the retrieved items into the CONTEXT section, within the token budget left by the prompt template."""
+    if not CONTEXT_PACKING_ENABLED: return "\n\n".join(retrieval["documents"])
+    budget = CONTEXT_TOKEN_BUDGET
+    if budget is None:
+        budget = LLM_N_CTX - GENERATION_KWARGS["max_tokens"] - _count_tokens(_build_prompt("", query)) - CONTEXT_SAFETY_TOKENS
+    context, stats = pack_context(retrieval["documents"], retrieval["metadatas"], budget, _count_tokens)
+    print(f"  Packed {stats['packed']}/{stats['candidates']} items into {stats['tokens']}/{budget} context tokens ({stats['duplicates']} duplicates merged, {stats['skipped']} skipped)")
+    trace.set(context_packing=stats)
+    return context
+
+
+def _strip_answer_prefixes(text):
+    text = text.strip()
+    for prefix in ANSWER_PREFIXES:
+        if text.startswith(prefix): text = text[len(prefix):].strip()
+    return text
+
+
+def _could_be_answer_prefix(text):
+    """True while streamed leading text may still turn into an "[/INST]"/"ANSWER:" prefix."""
+    rest = _strip_answer_prefixes(text)
+    return any(p.startswith(rest) for p in ANSWER_PREFIXES)
+
+
+def _record_prompt_eval(trace, gate_stats, timings=None):
+    """Prefix-restore and prompt-eval numbers from the LLM gate -> `prefix_restore` / `prompt_eval` spans (and `timings`)."""
+    for stage in ("prefix_restore", "prompt_eval"):
+        seconds = gate_stats.get(f"{stage}_s")
+        if seconds is None: continue
+        trace.record(stage, seconds)
+        if timings is not None: timings[f"{stage}_s"] = seconds
+    trace.set(prefix_tokens_reused=gate_stats.get("prefix_tokens_reused"))
+    if timings is not None: timings["prefix_tokens_reused"] = gate_stats.get("prefix_tokens_reused")
+
+
+def _record_generation_stats(start_time, first_token_time, n_tokens, stats_out=None):
+    end_time = time.perf_counter()
+    ttft = (first_token_time - start_time) if first_token_time is not None else None
+    decode_time = (end_time - first_token_time) if first_token_time is not None else 0.0
+    stats = {
+        "time_to_first_token_s": ttft,
+        "total_time_s": end_time - start_time,
+        "completion_tokens": n_tokens,
+        "tokens_per_sec": (n_tokens - 1) / decode_time if n_tokens > 1 and decode_time > 0 else None,
+    }
+    last_generation_stats.clear(); last_generation_stats.update(stats)
+    if stats_out is not None: stats_out.update(stats)
+    ttft_str = f"{ttft:.2f}s" if ttft is not None else "n/a"
+    tps_str = f"{stats['tokens_per_sec']:.1f}" if stats['tokens_per_sec'] else "n/a"
+    print(f"  Generation stats: TTFT {ttft_str}, {n_tokens} tokens, {tps_str} tokens/sec, total {stats['total_time_s']:.2f}s")
+    return stats
+
+
+def get_rag_response(query, top_k=5, timings=None):
+    """Performs RAG using LlamaCPP model.
+
+    If a `timings` dict is passed, per-stage durations (embed_s, search_s, generate_s) and the
+    completion token count are stored in it, e.g. for benchmark/run_benchmark.py.
+    """
+    with tracer.trace("get_rag_response", query=query, top_k=top_k) as trace:
+        # 0. Structured lookups skip retrieval and generation entirely (and don't need the models loaded)
+        with trace.span("route"): routed = _route_structured(query)
+        if routed is not None: trace.set(outcome="routed"); return routed
+
+        # Checking if models loaded correctly before proceeding
+        with trace.span("model_load"): ready = models.load().is_ready()
+        if not ready:
+            trace.set(outcome="not_ready")
+            return "Error: Chatbot components (LLM or KB) not loaded properly."
+
+        print(f"\nProcessing query: {query}")
+
+        # 1. Retrieval
+        retrieval, error = _retrieve_context(query, top_k, timings, trace)
+        if error: trace.set(outcome="no_results"); return error
+        # print(f"  Retrieved:\n{retrieval['documents']}\n--------------------") # Debug Context
+
+        with trace.span("cache_lookup"): cached = _cached_answer(retrieval)
+        trace.set(cache_hit=cached is not None)
+        if cached is not None: trace.set(outcome="cache_hit"); return cached
+
+        # 2. Prompt Construction 
+        with trace.span("prompt_build"): prompt = _build_prompt(_build_context(retrieval, query, trace), query)
+
+        # 3. Generation using llama-cpp-python
+        print("  Generating response...")
+        response = "Sorry, I encountered an error generating a response."
+        try:
+            generate_start = time.perf_counter()
+            gate_stats = {}
+            with trace.span("generate"): output = models.generate(prompt, stats=gate_stats, **GENERATION_KWARGS)
+            _record_prompt_eval(trace, gate_stats, timings)
+            usage = (output or {}).get("usage", {})
+            trace.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+            if timings is not None:
+                timings["generate_s"] = time.perf_counter() - generate_start
+                timings["completion_tokens"] = usage.get("completion_tokens")
+            if output and 'choices' in output and len(output['choices']) > 0 and 'text' in output['choices'][0]:
+                 response = _strip_answer_prefixes(output['choices'][0]['text'])
+                 _store_answer(query, retrieval, response)
+#                  print(f"  Raw LLM Output: {response}")
+            else: print(f"  Warning: Unexpected output format from llama_cpp: {output}"); trace.set(outcome="bad_output")
+        except LLMBusyError as e: print(f"  Rejected, LLM queue full: {e}"); response = LLM_BUSY_MESSAGE; trace.set(outcome="busy")
+        except LLMTimeoutError as e: print(f"  Generation timed out: {e}"); response = LLM_TIMEOUT_MESSAGE; trace.set(outcome="timeout")
+        except Exception as e: print(f"  Error during response generation: {e}"); traceback.print_exc(); trace.set(outcome="error", error=repr(e))
+
+        return response
+
+
+def stream_rag_response(query, top_k=5, stats=None):
+    """Streaming variant of get_rag_response: yields the answer piece by piece as llama.cpp produces tokens.
+
+    Time-to-first-token and tokens/sec are printed and stored in `last_generation_stats`
+    (and in `stats`, if a dict is passed, so concurrent sessions each see their own numbers).
+    """
+    with tracer.trace("stream_rag_response", query=query, top_k=top_k) as trace:
+        with trace.span("route"): routed = _route_structured(query)
+        if routed is not None: trace.set(outcome="routed"); yield routed; return
+
+        with trace.span("model_load"): ready = models.load().is_ready()
+        if not ready:
+             trace.set(outcome="not_ready")
+             yield "Error: Chatbot components (LLM or KB) not loaded properly."; return
+
+        print(f"\nProcessing query (streaming): {query}")
+        start_time = time.perf_counter()
+
+        retrieval, error = _retrieve_context(query, top_k, trace=trace)
+        if error: trace.set(outcome="no_results"); yield error; return
+        with trace.span("cache_lookup"): cached = _cached_answer(retrieval)
+        trace.set(cache_hit=cached is not None)
+        if cached is not None: trace.set(outcome="cache_hit"); yield cached; return
+        with trace.span("prompt_build"): prompt = _build_prompt(_build_context(retrieval, query, trace), query)
+
+        print("  Generating response (streaming)...")
+        first_token_time = None
+        n_tokens = 0
+        pending = ""       # Leading text held back until we know it is not an "[/INST]"/"ANSWER:" prefix
+        emitted = False
+        answer_parts = []
+        gate_stats = {}
+        generation_span = trace.span("generate")
+        generation_span.__enter__() # Closed in `finally`, also when the consumer stops iterating early
+        try:
+            for chunk in models.generate(prompt, stream=True, stats=gate_stats, **GENERATION_KWARGS):
+                piece = chunk['choices'][0].get('text', '') if chunk.get('choices') else ''
+                if not piece: continue
+                n_tokens += 1
+                if first_token_time is None: first_token_time = time.perf_counter()
+                if emitted: answer_parts.append(piece); yield piece; continue
+                pending += piece
+                if _could_be_answer_prefix(pending): continue
+                pending = _strip_answer_prefixes(pending)
+                if pending:
+                    emitted = True
+                    answer_parts.append(pending); yield pending
+                pending = ""
+            if not emitted:
+                leftover = _strip_answer_prefixes(pending)
+                if leftover: answer_parts.append(leftover); yield leftover
+                elif n_tokens == 0: yield "Sorry, I encountered an error generating a response."
+            _store_answer(query, retrieval, "".join(answer_parts).strip())
+        except (LLMBusyError, LLMTimeoutError) as e:
+            busy = isinstance(e, LLMBusyError)
+            print(f"  {'Rejected, LLM queue full' if busy else 'Generation timed out'}: {e}")
+            trace.set(outcome="busy" if busy else "timeout")
+            yield ("\n\n" if emitted else "") + (LLM_BUSY_MESSAGE if busy else LLM_TIMEOUT_MESSAGE)
+        except Exception as e:
+            print(f"  Error during streaming generation: {e}"); traceback.print_exc()
+            trace.set(outcome="error", error=repr(e))
+            yield "Sorry, I encountered an error generating a response."
+        finally:
+            generation_span.__exit__(None, None, None)
+            _record_prompt_eval(trace, gate_stats, stats)
+            generation = _record_generation_stats(start_time, first_token_time, n_tokens, stats)
+            trace.set(completion_tokens=n_tokens, time_to_first_token_s=generation["time_to_first_token_s"], tokens_per_sec=generation["tokens_per_sec"])
 
 # --- Interaction Loop 
 # if __name__ == "__main__":
 #     print("\nRestaurant Menu Chatbot Initialized (using LlamaCPP). Type 'quit' to exit.")
-#     if llm is None or collection is None:
+#     if not models.load().is_ready():
 #          print("Cannot start interaction loop: LLM or KB failed to load.")
 #     else:
 #          while True:
@@ -0,0 +1,62 @@
+import re
+
+# --- Token-budget-aware context packing for the RAG prompt ---
+DESCRIPTION_MAX_CHARS = 160 # Longer descriptions are cut at a word boundary
+LINE_SEPARATOR = "\n"
+
+
+def _normalize_name(name):
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+
+
+def _dedupe_key(metadata):
+    """Same restaurant + item name + price = the same dish, whichever category it was scraped under."""
+    return (metadata.get("restaurant_name"), _normalize_name(metadata.get("item_name", "")), str(metadata.get("price", "")))
+
+
+def _shorten(text, limit=DESCRIPTION_MAX_CHARS):
+    text = " ".join(str(text).split())
+    if len(text) <= limit: return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(",;:.") + "..."
+
+
+def compact_line(metadata, categories):
+    """One item as a single field line, e.g.
+    "- McAloo Tikki Burger | McDonalds | Burgers & Wraps / Value Meals | Price: 69.0 | Tags: Vegetarian | <description>"."""
+    fields = [f"- {metadata.get('item_name', 'Unknown item')}", metadata.get("restaurant_name", ""), " / ".join(c for c in categories if c)]
+    fields.append(f"Price: {metadata['price']}" if metadata.get("price") not in (None, "") else "Price: N/A")
+    if metadata.get("special_tags"): fields.append(f"Tags: {metadata['special_tags']}")
+    if metadata.get("description"): fields.append(_shorten(metadata["description"]))
+    return " | ".join(f for f in fields if f)
+
+
+def pack_context(documents, metadatas, budget, count_tokens):
+    """Greedily fills `budget` tokens with retrieved items, most relevant first.
+
+    `documents`/`metadatas` are in relevance order; an item without usable metadata falls back to its raw
+    document text. Duplicates (the same dish under several categories) are merged into the first, most
+    relevant occurrence. Items that don't fit are skipped so smaller ones further down can still be used;
+    the top item is always included. Returns (context, stats).
+    """
+    groups, order = {}, [] # dedupe key -> [metadata, categories, document]
+    duplicates = 0
+    metadatas = list(metadatas or []) + [None] * (len(documents) - len(metadatas or []))
+    for n, (document, metadata) in enumerate(zip(documents, metadatas)):
+        key = _dedupe_key(metadata) if metadata and metadata.get("item_name") else ("raw", n)
+        if key in groups:
+            duplicates += 1
+            if metadata.get("category") not in groups[key][1]: groups[key][1].append(metadata.get("category"))
+            continue
+        groups[key] = [metadata, [metadata.get("category")] if metadata else [], document]
+        order.append(key)
+
+    separator_tokens = count_tokens(LINE_SEPARATOR)
+    lines, used_tokens, skipped = [], 0, 0
+    for key in order:
+        metadata, categories, document = groups[key]
+        line = compact_line(metadata, categories) if key[0] != "raw" else document
+        cost = count_tokens(line) + (separator_tokens if lines else 0)
+        if lines and used_tokens + cost > budget: skipped += 1; continue
+        lines.append(line); used_tokens += cost
+    stats = {"candidates": len(documents), "duplicates": duplicates, "packed": len(lines), "skipped": skipped, "tokens": used_tokens, "budget": budget}
+    return LINE_SEPARATOR.join(lines), stats
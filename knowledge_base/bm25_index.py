@@ -0,0 +1,111 @@
+import json
+import re
+import time
+from pathlib import Path
+import numpy as np
+
+# --- Compact BM25 lexical index over the KB chunk texts ---
+# Stored next to chroma_db_menu as plain .npy arrays (CSR-style postings) so it can be memory-mapped at startup.
+KB_DIR = Path(__file__).resolve().parent
+BM25_INDEX_PATH = KB_DIR / 'bm25_menu'
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens. Dotted acronyms are joined ("B.M.T" -> "bmt"), other dotted runs split ("193.0" -> "193", "0")."""
+    tokens = []
+    for token in _TOKEN_RE.findall(str(text).lower()):
+        if "." not in token: tokens.append(token); continue
+        parts = token.split(".")
+        if all(p.isalpha() and len(p) <= 2 for p in parts): tokens.append("".join(parts))
+        else: tokens.extend(p for p in parts if p)
+    return tokens
+
+
+def build_index(ids, documents, path=BM25_INDEX_PATH, k1=K1, b=B):
+    """Builds the inverted index for `documents` (aligned with `ids`) and writes it to `path`."""
+    start = time.perf_counter()
+    vocab = {}
+    doc_terms = []   # Per document: (term_ids, term_frequencies)
+    doc_len = np.zeros(len(documents), dtype=np.int32)
+    for d, text in enumerate(documents):
+        tokens = tokenize(text)
+        doc_len[d] = len(tokens)
+        counts = {}
+        for token in tokens:
+            term_id = vocab.setdefault(token, len(vocab))
+            counts[term_id] = counts.get(term_id, 0) + 1
+        doc_terms.append(counts)
+
+    # CSR layout: postings for term t live at [term_offsets[t], term_offsets[t + 1]) in the docs/tf arrays
+    df = np.zeros(len(vocab), dtype=np.int64)
+    for counts in doc_terms:
+        for term_id in counts: df[term_id] += 1
+    term_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=term_offsets[1:])
+    postings_docs = np.empty(term_offsets[-1], dtype=np.int32)
+    postings_tf = np.empty(term_offsets[-1], dtype=np.uint16)
+    cursor = term_offsets[:-1].copy()
+    for d, counts in enumerate(doc_terms): # Documents are visited in order, so each posting list comes out sorted
+        for term_id, tf in counts.items():
+            postings_docs[cursor[term_id]] = d
+            postings_tf[cursor[term_id]] = min(tf, np.iinfo(np.uint16).max)
+            cursor[term_id] += 1
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / 'term_offsets.npy', term_offsets)
+    np.save(path / 'postings_docs.npy', postings_docs)
+    np.save(path / 'postings_tf.npy', postings_tf)
+    np.save(path / 'doc_len.npy', doc_len)
+    meta = {"ids": list(ids), "vocab": vocab, "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0, "k1": k1, "b": b}
+    with open(path / 'meta.json', 'w', encoding='utf-8') as f: json.dump(meta, f, ensure_ascii=False)
+    size = sum(p.stat().st_size for p in path.iterdir())
+    print(f"Built BM25 index: {len(documents)} docs, {len(vocab)} terms, {len(postings_docs)} postings, {size / 1024:.0f} KB in {time.perf_counter() - start:.2f}s")
+
+
+class BM25Index:
+    """Read side of the BM25 index; the arrays are memory-mapped, so loading costs little more than reading meta.json."""
+
+    def __init__(self, path=BM25_INDEX_PATH):
+        path = Path(path)
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f: meta = json.load(f)
+        self.ids = meta["ids"]
+        self.vocab = meta["vocab"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.k1, self.b = meta["k1"], meta["b"]
+        self.term_offsets = np.load(path / 'term_offsets.npy', mmap_mode='r')
+        self.postings_docs = np.load(path / 'postings_docs.npy', mmap_mode='r')
+        self.postings_tf = np.load(path / 'postings_tf.npy', mmap_mode='r')
+        self.doc_len = np.load(path / 'doc_len.npy', mmap_mode='r')
+        self.n_docs = len(self.ids)
+        self._length_norm = None
+
+    def search(self, query, top_k=20):
+        """Returns [(id, score)] for the top_k BM25 matches, best first."""
+        if self._length_norm is None: # k1 * (1 - b + b * dl / avgdl), computed once per process
+            self._length_norm = (self.k1 * (1 - self.b + self.b * np.asarray(self.doc_len, dtype=np.float32) / self.avgdl)).astype(np.float32)
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None: continue
+            lo, hi = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[lo:hi]
+            tf = self.postings_tf[lo:hi].astype(np.float32)
+            df = hi - lo
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs]) # Posting lists hold unique docs, so fancy-index += is safe
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0: return []
+        if len(hits) > top_k: hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self.ids[d], float(scores[d])) for d in hits]
+
+
+def load_index(path=BM25_INDEX_PATH):
+    """Returns a BM25Index, or None if no index has been built yet."""
+    if not (Path(path) / 'meta.json').is_file(): return None
+    return BM25Index(path)
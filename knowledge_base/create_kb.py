@@ -3,6 +3,8 @@ from pathlib import Path
 import re
 import sys # For traceback
 import traceback
+import hashlib
+import argparse
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.utils import embedding_functions
@@ -17,6 +19,19 @@ DATA_DIR = PROJECT_ROOT / 'data'
 KB_DIR = PROJECT_ROOT / 'knowledge_base' 
 CHROMA_DB_PATH = str(KB_DIR / 'chroma_db_menu') # Path to store ChromaDB files as string
 CONSOLIDATED_JSON_PATH = DATA_DIR / 'consolidated_menu_items.json' # Path to input file
+MANIFEST_PATH = KB_DIR / 'kb_manifest.json' # Per-item content hashes of what is currently indexed
+COLLECTION_NAME = "restaurant_menus"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# --- Adding project root to sys.path so shared knowledge_base modules import the same way as from chatbot_app.py ---
+sys.path.append(str(PROJECT_ROOT))
+from knowledge_base.embed_pipeline import embed_and_upsert
+from knowledge_base.embedding_cache import EmbeddingCache, EMBEDDING_CACHE_PATH
+from knowledge_base.bm25_index import build_index, BM25_INDEX_PATH
+from knowledge_base.vector_index import build_vector_index, VECTOR_INDEX_PATH
+from knowledge_base.menu_store import write_menu_store, MENU_STORE_PATH
+from knowledge_base.normalize import clean_prices, standardize_tags_batch
+from knowledge_base.menu_parsers import FORMATS, detect_format, iter_menu_items, select_valid_items, ingest_files, read_batches
 
 # Defining the input JSON files for the 5 specified restaurants
 INPUT_FILES = {
@@ -26,8 +41,19 @@ INPUT_FILES = {
     "Subway": DATA_DIR / "subway_menu_unofficial_cleaned.json", 
     "McDonalds": DATA_DIR / "macd.json" 
 }
+# Parser (knowledge_base/menu_parsers.FORMATS) per restaurant; restaurants not listed are auto-detected
+INPUT_FORMATS = {
+    "Punjab Grill": "details_category_list",
+    "Oakaz": "flat_menu",
+    "Dominos": "category_filter",
+    "Subway": "veg_split",
+    "McDonalds": "details_category_filter",
+}
 
 # --- Helper Functions (clean_price, standardize_tags) ---
+# Per-item reference implementations; the build uses the batch versions in knowledge_base/normalize.py,
+# which must give identical results. `create_kb.py --check-normalize` verifies that over data/; it is a CLI check,
+# not a test (there is no test suite), so run it after changing either side.
 
 def clean_price(price_str):
     if price_str is None: return None
@@ -70,204 +96,227 @@ def standardize_tags(item_data, restaurant_name, category_name):
 
 
 
-# STEP 1: Loading and Consolidating Data
-
-all_menu_items_raw = []
-print("Starting Knowledge Base Creation...")
-for restaurant_name, filepath in INPUT_FILES.items():
-    print(f"\nProcessing file: {filepath.name} for Restaurant: {restaurant_name}")
-    if not filepath.is_file(): print(f"  ERROR: File not found: {filepath}. Skipping."); continue
-    items_to_process = []; structure_found = False
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f: data = json.load(f)
-        menu_content_list = data.get("menu")
-        if isinstance(menu_content_list, list):
-             if menu_content_list and isinstance(menu_content_list[0], dict) and ("item_name" in menu_content_list[0] or "name" in menu_content_list[0]):
-                 print("  Detected structure: Flat 'menu' list.")
-                 for item in menu_content_list:
-                      if isinstance(item, dict): item['category'] = item.get('category', 'Unknown'); items_to_process.append(item)
-                 structure_found = True
-        elif "menu_by_category_filter" in data and isinstance(data["menu_by_category_filter"], dict):
-             print("  Detected structure: 'menu_by_category_filter' nested dict (Dominos).")
-             menu_content = data["menu_by_category_filter"]
-             for category, filter_dict in menu_content.items():
-                 if isinstance(filter_dict, dict):
-                     for filter_mode, item_list in filter_dict.items():
-                         if isinstance(item_list, list):
-                             for item in item_list:
-                                 if isinstance(item, dict): item['category'] = item.get('category', category); item['filter_mode'] = item.get('filter_mode', filter_mode); items_to_process.append(item)
-             structure_found = True
-        elif "menu_details" in data and isinstance(data.get("menu_details"), dict):
-             menu_content = data["menu_details"]; first_cat_value = next(iter(menu_content.values()), None)
-             if isinstance(first_cat_value, dict) and any(k in ["Veg Only", "Non Veg Only", "desserts and bevrages"] for k in first_cat_value.keys()):
-                  print("  Detected structure: 'menu_details' > Category > Filter dict (McD/Oakaz).")
-                  for category, filter_dict in menu_content.items():
-                      if isinstance(filter_dict, dict):
-                          for filter_mode, item_list in filter_dict.items():
-                              if isinstance(item_list, list):
-                                  for item in item_list:
-                                      if isinstance(item, dict): item['category'] = item.get('category', category); item['filter_mode'] = item.get('filter_mode', filter_mode); items_to_process.append(item)
-                  structure_found = True
-             elif isinstance(first_cat_value, list):
-                  print("  Detected structure: 'menu_details' > Category > List [Items] (Punjab Grill).")
-                  for category, item_list in menu_content.items():
-                      if isinstance(item_list, list):
-                           for item in item_list:
-                                if isinstance(item, dict): item['category'] = category; items_to_process.append(item)
-                  structure_found = True
-             elif isinstance(first_cat_value, dict):
-                  print("  Detected structure: 'menu_details' > Category > ItemName dict (Subway Int).")
-                  for category, items_dict in menu_content.items():
-                      if isinstance(items_dict, dict):
-                           for item_name, item_info in items_dict.items():
-                               if isinstance(item_info, dict): item_info['item_name'] = item_name; item_info['category'] = category; items_to_process.append(item_info)
-                  structure_found = True
-        elif "menu" in data and isinstance(data["menu"], dict) and ("Veg" in data["menu"] or "Non-Veg" in data["menu"]):
-             print("  Detected structure: Cleaned Subway ('menu' > V/NV > ItemName).")
-             menu_content = data["menu"]
-             for veg_nonveg_key, items_dict in menu_content.items():
-                 if isinstance(items_dict, dict):
-                     for item_name, item_info in items_dict.items():
-                         if isinstance(item_info, dict):
-                             item_info['item_name'] = item_name; item_info['category'] = item_info.get('original_category', 'Unknown')
-                             if veg_nonveg_key == "Veg": item_info['is_vegetarian'] = True
-                             elif veg_nonveg_key == "Non-Veg": item_info['is_vegetarian'] = False
-                             items_to_process.append(item_info)
-             structure_found = True
-        if not structure_found: print(f"  ERROR: Could not find recognizable menu structure in {filepath.name}"); continue
-        items_added = 0
-        for item in items_to_process:
-            item_name = item.get("item_name") or item.get("name"); category = item.get("category") or "Unknown"
-            if not item_name or category == item_name: continue
-            price_raw = item.get("price"); price_clean = clean_price(price_raw)
-            description = item.get("description", "")
-            if isinstance(description, str):
-                if price_raw and description.strip() == str(price_raw).strip(): description = ""
-                if description.startswith("Image from Swiggy"): description = ""
-            category = str(category) if category is not None else "Unknown"
-            tags = standardize_tags(item, restaurant_name, category)
-            standardized_item = {"restaurant_name": restaurant_name, "category": category, "item_name": item_name.strip(), "description": description.strip(), "price": price_clean, "special_tags": tags }
-            all_menu_items_raw.append(standardized_item); items_added += 1 # Appending to raw list first
-        if items_added > 0: print(f"  Successfully processed and standardized {items_added} items.")
-        elif structure_found: print(f"  Structure found, but 0 valid items were processed/standardized.")
-    except json.JSONDecodeError: print(f"  ERROR: Invalid JSON file: {filepath}. Skipping.")
-    except Exception as e: print(f"  ERROR: An unexpected error occurred processing {filepath.name}: {e}"); traceback.print_exc()
-
-# --- Final Duplicate Check ---
-print(f"\n--------------------------------------------------")
-final_unique_items = []
-seen_keys = set()
-duplicates_skipped = 0
-for item in all_menu_items_raw: # Processing the raw combined list
-     key = (item.get('restaurant_name'), str(item.get('category','Unknown')).strip().lower(), str(item.get('item_name','')).strip().lower(), item.get('price'), tuple(sorted(item.get('special_tags',[]))) )
-     if key not in seen_keys: final_unique_items.append(item); seen_keys.add(key)
-     else: duplicates_skipped += 1
-print(f"Consolidated {len(final_unique_items)} unique menu items (removed {duplicates_skipped} duplicates).")
-if not final_unique_items:
-    print("ERROR: No items were consolidated. Cannot proceed with embedding.")
-    sys.exit(1) # Exit if no data
-
-# --- Save the consolidated list ---
-consolidated_output_path = DATA_DIR / 'consolidated_menu_items.json'
-print(f"Saving consolidated items to {consolidated_output_path}")
-try:
-    with open(consolidated_output_path, 'w', encoding='utf-8') as f:
-        json.dump(final_unique_items, f, indent=2, ensure_ascii=False)
-    print("Consolidated data saved.")
-except Exception as e: print(f"Error saving consolidated data: {e}")
-
-
-
-
-# STEP 2: Chunking (One item per chunk)
-
-print("\nCreating text chunks for embedding...")
-documents = [] # List of text strings to be embedded
-metadatas = [] # List of metadata dictionaries corresponding to documents
-ids = []       # List of unique IDs for each document
-
-for i, item in enumerate(tqdm(final_unique_items, desc="Chunking Items")):
-    # Creating a readable string representation of the item
-    price_str = f"Price: {item['price']}" if item['price'] is not None else "Price: N/A"
-    tags_str = f"Tags: {', '.join(item['special_tags'])}" if item['special_tags'] else "Tags: None"
-    desc_str = f"Description: {item['description']}" if item['description'] else ""
-
-    chunk_text = (
-        f"Restaurant: {item['restaurant_name']}. "
-        f"Category: {item['category']}. "
-        f"Item: {item['item_name']}. "
-        f"{price_str}. "
-        f"{tags_str}. "
-        f"{desc_str}"
-    )
-    documents.append(chunk_text)
-
-    # Storing original structured data as metadata
-    # Ensure all metadata values are basic types (str, int, float, bool)
-    metadata = item.copy() # Start with a copy
-    # Convert tags list to a string for ChromaDB compatibility if needed, or keep as list if supported
-    metadata['special_tags'] = ", ".join(metadata.get('special_tags', [])) # Example: comma-separated string
-    # Ensure price is string or None (ChromaDB metadata prefers simple types)
-    metadata['price'] = str(metadata['price']) if metadata['price'] is not None else ""
-
-    metadatas.append(metadata)
-    # Creating a unique ID for each item chunk
-    ids.append(f"item_{i}_{item['restaurant_name'].replace(' ','_')}_{item['item_name'][:20].replace(' ','_')}")
+def make_item_id(item):
+    """Stable, content-derived ID: the same item keeps its ID no matter where it sits in the consolidated list."""
+    key = "|".join([item['restaurant_name'], str(item.get('category', 'Unknown')).strip().lower(), str(item.get('item_name', '')).strip().lower(),
+                    repr(item.get('price')), ",".join(sorted(item.get('special_tags', [])))])
+    return "item_" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
 
-print(f"Created {len(documents)} text chunks.")
-# STEP 3 & 4: Embedding & Indexing (Using ChromaDB)
-print("\nInitializing ChromaDB and Embedding Model...")
-# Using a HuggingFace embedding function through ChromaDB's utility
 
-hf_ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+def content_hash(document, metadata):
+    """Hash of everything that ends up in the index for one item; a change means it must be re-embedded."""
+    payload = json.dumps({"document": document, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
 
-# This will create files in the 'chroma_db_menu' folder
-chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-
-collection_name = "restaurant_menus"
-print(f"Getting or creating Chroma collection: {collection_name}")
+def load_manifest():
+    if not MANIFEST_PATH.is_file(): return None
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f: return json.load(f)
+    except Exception as e: print(f"Warning: Could not read manifest {MANIFEST_PATH} ({e}); doing a full re-index."); return None
+
+
+def main():
+    """Builds (or incrementally updates) the consolidated menu JSON and the ChromaDB knowledge base."""
+    parser = argparse.ArgumentParser(description="Build or incrementally update the restaurant menu knowledge base.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed every item.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for parsing and encoding large inputs (default: all CPU cores).")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="Re-encode every changed item instead of reusing cached embeddings.")
+    parser.add_argument("--check-normalize", action="store_true", help="Compare the batch normalization against clean_price/standardize_tags on every item, then exit.")
+    parser.add_argument("--vector-dtype", choices=["float32", "float16"], default="float32", help="Storage type of the NumPy search matrix (float16 halves its size).")
+    args = parser.parse_args()
+
+
+    # STEP 1: Loading and Consolidating Data
+
+    final_unique_items = []
+    seen_keys = set()
+    duplicates_skipped = 0
+    print("Starting Knowledge Base Creation...")
+    tasks = [(restaurant_name, filepath, INPUT_FORMATS.get(restaurant_name)) for restaurant_name, filepath in INPUT_FILES.items()]
+    if args.check_normalize:
+        parity_checked = parity_mismatches = 0
+        for restaurant_name, filepath, format_name in tasks:
+            print(f"\nChecking file: {filepath.name} for Restaurant: {restaurant_name}")
+            fmt = FORMATS.get(format_name) if format_name else detect_format(filepath)
+            if fmt is None: print(f"  ERROR: Could not find recognizable menu structure in {filepath.name}"); continue
+            items, _, categories = select_valid_items(iter_menu_items(filepath, fmt))
+            prices, tag_lists = clean_prices([item.get("price") for item in items]), standardize_tags_batch(items, categories)
+            for item, category, price, tags in zip(items, categories, prices, tag_lists):
+                expected_price, expected_tags = clean_price(item.get("price")), standardize_tags(item, restaurant_name, category)
+                parity_checked += 1
+                if price != expected_price or tags != expected_tags:
+                    parity_mismatches += 1
+                    print(f"  MISMATCH {item.get('item_name') or item.get('name')!r}: price {price!r} vs {expected_price!r}, tags {tags} vs {expected_tags}")
+        print(f"\nNormalization parity: {parity_checked - parity_mismatches}/{parity_checked} items identical, {parity_mismatches} mismatches.")
+        sys.exit(1 if parity_mismatches else 0)
+
+    # Files are streamed through their registered parser (knowledge_base/menu_parsers.py), in parallel for large inputs
+    for result in ingest_files(tasks, max_workers=args.workers):
+        print(f"\nProcessed file: {Path(result['path']).name} for Restaurant: {result['restaurant_name']}")
+        if result["error"]: print(f"  ERROR: {result['error']}. Skipping."); continue
+        print(f"  Structure: {result['description']} [{result['format']}]")
+        # Duplicate check as the batches come in, so duplicates are never held
+        for batch in read_batches(result):
+            for item in batch:
+                key = (item.get('restaurant_name'), str(item.get('category','Unknown')).strip().lower(), str(item.get('item_name','')).strip().lower(), item.get('price'), tuple(sorted(item.get('special_tags',[]))) )
+                if key not in seen_keys: final_unique_items.append(item); seen_keys.add(key)
+                else: duplicates_skipped += 1
+        if result["count"]: print(f"  Successfully processed and standardized {result['count']} items.")
+        else: print(f"  Structure found, but 0 valid items were processed/standardized.")
+
+    # --- Final Duplicate Check ---
+    print(f"\n--------------------------------------------------")
+    print(f"Consolidated {len(final_unique_items)} unique menu items (removed {duplicates_skipped} duplicates).")
+    if not final_unique_items:
+        print("ERROR: No items were consolidated. Cannot proceed with embedding.")
+        sys.exit(1) # Exit if no data
+
+    # --- Save the consolidated list ---
+    consolidated_output_path = CONSOLIDATED_JSON_PATH
+    consolidated_json = json.dumps(final_unique_items, indent=2, ensure_ascii=False)
+    try:
+        existing_json = consolidated_output_path.read_text(encoding='utf-8') if consolidated_output_path.is_file() else None
+        if existing_json == consolidated_json:
+            print(f"Consolidated items unchanged; not rewriting {consolidated_output_path}")
+        else:
+            print(f"Saving consolidated items to {consolidated_output_path}")
+            consolidated_output_path.write_text(consolidated_json, encoding='utf-8')
+            print("Consolidated data saved.")
+    except Exception as e: print(f"Error saving consolidated data: {e}")
+    try: write_menu_store(final_unique_items, MENU_STORE_PATH, source_path=consolidated_output_path) # Columnar copy read by the router
+    except Exception as e: print(f"Error writing menu store to {MENU_STORE_PATH}: {e}")
+
+
+
+
+    # STEP 2: Chunking (One item per chunk)
+
+    print("\nCreating text chunks for embedding...")
+    documents = [] # List of text strings to be embedded
+    metadatas = [] # List of metadata dictionaries corresponding to documents
+    ids = []       # List of unique IDs for each document
+    hashes = []    # Content hash per document, compared against the manifest
+
+    for i, item in enumerate(tqdm(final_unique_items, desc="Chunking Items")):
+        # Creating a readable string representation of the item
+        price_str = f"Price: {item['price']}" if item['price'] is not None else "Price: N/A"
+        tags_str = f"Tags: {', '.join(item['special_tags'])}" if item['special_tags'] else "Tags: None"
+        desc_str = f"Description: {item['description']}" if item['description'] else ""
+
+        chunk_text = (
+            f"Restaurant: {item['restaurant_name']}. "
+            f"Category: {item['category']}. "
+            f"Item: {item['item_name']}. "
+            f"{price_str}. "
+            f"{tags_str}. "
+            f"{desc_str}"
+        )
+        documents.append(chunk_text)
+
+        # Storing original structured data as metadata
+        # Ensure all metadata values are basic types (str, int, float, bool)
+        metadata = item.copy() # Start with a copy
+        # Convert tags list to a string for ChromaDB compatibility if needed, or keep as list if supported
+        metadata['special_tags'] = ", ".join(metadata.get('special_tags', [])) # Example: comma-separated string
+        # Ensure price is string or None (ChromaDB metadata prefers simple types)
+        metadata['price'] = str(metadata['price']) if metadata['price'] is not None else ""
+        # Typed copies for Chroma `where` filters (numeric range on price, boolean veg flags)
+        if item['price'] is not None: metadata['price_value'] = float(item['price'])
+        metadata['is_veg'] = any(t in ["Vegetarian", "Vegetarian (Inferred)"] for t in item['special_tags'])
+        metadata['is_non_veg'] = any(t in ["Non-Vegetarian", "Non-Vegetarian (Inferred)"] for t in item['special_tags'])
+
+        metadatas.append(metadata)
+        # Creating a stable, content-derived ID for each item chunk
+        ids.append(make_item_id(item))
+        hashes.append(content_hash(chunk_text, metadata))
+
+    print(f"Created {len(documents)} text chunks.")
+    # STEP 3 & 4: Embedding & Indexing (Using ChromaDB)
+    print("\nInitializing ChromaDB and Embedding Model...")
+    # Using a HuggingFace embedding function through ChromaDB's utility
+
+    hf_ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBEDDING_MODEL_NAME)
+
+
+    # This will create files in the 'chroma_db_menu' folder
+    chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+
+    collection_name = COLLECTION_NAME
+    print(f"Getting or creating Chroma collection: {collection_name}")
+
+    collection = chroma_client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=hf_ef 
+
+        )
+
+    # --- Diffing against the manifest: only new/changed items are embedded, removed ones are deleted ---
+    manifest = None if args.full else load_manifest()
+    if manifest is not None and manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        print(f"Embedding model changed ({manifest.get('embedding_model')} -> {EMBEDDING_MODEL_NAME}); doing a full re-index.")
+        manifest = None
+    indexed_hashes = manifest.get("items", {}) if manifest else {}
+    existing_ids = set(collection.get(include=[])['ids']) # Also catches legacy positional IDs / items missing from the manifest
+
+    current = dict(zip(ids, hashes))
+    stale_ids = sorted(existing_ids - set(current))
+    changed_positions = [i for i, (item_id, h) in enumerate(zip(ids, hashes)) if item_id not in existing_ids or indexed_hashes.get(item_id) != h]
+    print(f"{len(ids)} items: {len(ids) - len(changed_positions)} unchanged, {len(changed_positions)} new/changed, {len(stale_ids)} to delete.")
+
+    batch_size = 100 # Process 100 items at a time
+    for i in tqdm(range(0, len(stale_ids), batch_size), desc="Deleting Removed Items", disable=not stale_ids):
+        try: collection.delete(ids=stale_ids[i : i + batch_size])
+        except Exception as chroma_error: print(f"\nError deleting stale items from ChromaDB: {chroma_error}")
+
+    # --- Embed and upsert new/changed documents to ChromaDB ---
+    # Encoding runs in large length-sorted batches (multi-process for big rebuilds) and overlaps with Chroma writes;
+    # precomputed embeddings are passed to upsert so Chroma's embedding function is not called per batch.
+    num_items = len(changed_positions)
+    print(f"Embedding and upserting {num_items} items to ChromaDB...")
+    failed_ids = embed_and_upsert(
+        collection,
+        ids=[ids[j] for j in changed_positions],
+        documents=[documents[j] for j in changed_positions],
+        metadatas=[metadatas[j] for j in changed_positions],
+        model_name=EMBEDDING_MODEL_NAME,
+        num_processes=args.workers,
+        cache=None if args.no_embedding_cache else EmbeddingCache(EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_PATH),
+    )
 
-collection = chroma_client.get_or_create_collection(
-    name=collection_name,
-    embedding_function=hf_ef 
+    # --- Save the manifest (failed items are left out so the next run retries them) ---
+    new_manifest = {
+        "collection": collection_name,
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "items": {item_id: h for item_id, h in current.items() if item_id not in failed_ids},
+    }
+    try:
+        with open(MANIFEST_PATH, 'w', encoding='utf-8') as f: json.dump(new_manifest, f, indent=1)
+    except Exception as e: print(f"Error saving manifest to {MANIFEST_PATH}: {e}")
 
-    )
+    # --- Rebuild the BM25 lexical index over the same chunk texts (cheap, so always rebuilt in full) ---
+    try:
+        indexed = [j for j in range(len(ids)) if ids[j] not in failed_ids]
+        build_index([ids[j] for j in indexed], [documents[j] for j in indexed], BM25_INDEX_PATH)
+    except Exception as e: print(f"Error building BM25 index at {BM25_INDEX_PATH}: {e}")
 
-# --- Add documents to ChromaDB ---
+    # --- Export the collection as a memory-mapped NumPy matrix for the exact-search backend (VECTOR_BACKEND="numpy") ---
+    try:
+        exported = collection.get(include=["embeddings", "documents", "metadatas"])
+        build_vector_index(exported["ids"], exported["embeddings"], exported["documents"], exported["metadatas"], VECTOR_INDEX_PATH,
+                           dtype=args.vector_dtype, embedding_model=EMBEDDING_MODEL_NAME)
+    except Exception as e: print(f"Error building NumPy vector index at {VECTOR_INDEX_PATH}: {e}")
 
 
-batch_size = 100 # Process 100 items at a time
-num_items = len(documents)
-print(f"Adding {num_items} items to ChromaDB in batches of {batch_size}...")
+    print(f"\n--------------------------------------------------")
+    print(f"Knowledge Base Creation Complete!")
+    print(f"Indexed {collection.count()} items in ChromaDB collection '{collection_name}'.")
+    print(f"Database stored at: {CHROMA_DB_PATH}")
+    print(f"BM25 index stored at: {BM25_INDEX_PATH}")
+    print(f"NumPy vector index stored at: {VECTOR_INDEX_PATH}")
+    print("--------------------------------------------------")
 
-for i in tqdm(range(0, num_items, batch_size), desc="Indexing Batches"):
-    batch_ids = ids[i : i + batch_size]
-    batch_documents = documents[i : i + batch_size]
-    batch_metadatas = metadatas[i : i + batch_size]
 
-    try:
-         # Add batch to the collection
-         collection.add(
-             ids=batch_ids,
-             documents=batch_documents,
-             metadatas=batch_metadatas
-         )
-    except Exception as chroma_error:
-         print(f"\nError adding batch {i//batch_size + 1} to ChromaDB: {chroma_error}")
-
-         # print("Attempting to add items individually...")
-         # for j in range(len(batch_ids)):
-         #      try:
-         #           collection.add(ids=[batch_ids[j]], documents=[batch_documents[j]], metadatas=[batch_metadatas[j]])
-         #      except Exception as item_error:
-         #           print(f"  Failed to add item ID: {batch_ids[j]}, Error: {item_error}")
-         #           print(f"  Item Data: {batch_documents[j]}")
-         #           print(f"  Item Metadata: {batch_metadatas[j]}")
-
-
-print(f"\n--------------------------------------------------")
-print(f"Knowledge Base Creation Complete!")
-print(f"Indexed {collection.count()} items in ChromaDB collection '{collection_name}'.")
-print(f"Database stored at: {CHROMA_DB_PATH}")
-print("--------------------------------------------------")
\ No newline at end of file
+# Guarded so that the multi-process encoding pool (which spawns workers that re-import this module) doesn't re-run the build
+if __name__ == "__main__":
+    main()
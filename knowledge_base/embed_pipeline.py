@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# --- Pipeline Configuration ---
+ENCODE_BATCH_SIZE = 256      # Sentences per forward pass (large batches amortize per-call overhead)
+WRITE_BATCH_SIZE = 512       # Items per Chroma upsert; also the unit handed from the encoder to the writer
+QUEUE_SIZE = 4               # Encoded batches allowed to wait for the writer before the encoder blocks
+MULTIPROCESS_MIN_ITEMS = 5000 # Below this, one process (torch already uses all cores) beats pool start-up cost
+
+
+class StageTimer:
+    """Accumulates busy time and item counts for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.items = 0
+        self.waiting = 0.0 # Time spent blocked on the queue (i.e. waiting for the other stage)
+
+    def report(self):
+        rate = self.items / self.seconds if self.seconds > 0 else float('inf')
+        return f"  {self.name:<8} {self.items:>8} items in {self.seconds:7.2f}s busy ({rate:,.0f} items/s), {self.waiting:6.2f}s blocked on queue"
+
+
+def embed_and_upsert(collection, ids, documents, metadatas, model_name, num_processes=None,
+                     encode_batch_size=ENCODE_BATCH_SIZE, write_batch_size=WRITE_BATCH_SIZE, queue_size=QUEUE_SIZE, cache=None):
+    """Encodes `documents` with SentenceTransformer and upserts them with precomputed `embeddings=`.
+
+    Documents are sorted by length so each batch pads to a similar size. An encoder thread feeds
+    a bounded queue that the writer (this thread) drains into Chroma, so encoding overlaps with
+    HNSW insertion. Large inputs are encoded on a multi-process pool across all CPU cores.
+    With an EmbeddingCache as `cache`, cached texts are not re-encoded (the model isn't even loaded
+    if every text is cached) and new vectors are added to it.
+    Returns the set of IDs whose upsert failed.
+    """
+    if not ids: return set()
+    num_processes = num_processes or os.cpu_count() or 1
+    order = sorted(range(len(documents)), key=lambda i: len(documents[i]))
+    chunks = [order[i : i + write_batch_size] for i in range(0, len(order), write_batch_size)]
+    cached = cache.get_many(documents) if cache is not None else [None] * len(documents)
+    to_encode = sum(v is None for v in cached)
+    if cache is not None: print(f"  Embedding cache: {len(documents) - to_encode} of {len(documents)} documents already encoded")
+
+    model = pool = None
+    if to_encode:
+        load_start = time.perf_counter()
+        model = SentenceTransformer(model_name, device="cpu")
+        print(f"  Loaded embedding model '{model_name}' in {time.perf_counter() - load_start:.2f}s")
+    if to_encode >= MULTIPROCESS_MIN_ITEMS and num_processes > 1:
+        print(f"  Starting multi-process encoding pool with {num_processes} workers...")
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * num_processes)
+
+    encode_stage, write_stage = StageTimer("encode"), StageTimer("write")
+    handoff = queue.Queue(maxsize=queue_size)
+    _DONE = object()
+
+    def encoder():
+        try:
+            for chunk in chunks:
+                missing = [i for i in chunk if cached[i] is None]
+                texts = [documents[i] for i in missing]
+                start = time.perf_counter()
+                if not texts: encoded = []
+                elif pool is not None: encoded = model.encode_multi_process(texts, pool, batch_size=encode_batch_size)
+                else: encoded = model.encode(texts, batch_size=encode_batch_size, convert_to_numpy=True, show_progress_bar=False)
+                if cache is not None and texts: cache.put_many(texts, encoded)
+                fresh = dict(zip(missing, encoded))
+                vectors = np.stack([fresh[i] if cached[i] is None else cached[i] for i in chunk])
+                encode_stage.seconds += time.perf_counter() - start; encode_stage.items += len(missing)
+                start = time.perf_counter()
+                handoff.put((chunk, vectors))
+                encode_stage.waiting += time.perf_counter() - start
+            handoff.put(_DONE)
+        except Exception as e:
+            handoff.put(e)
+
+    failed_ids = set()
+    total_start = time.perf_counter()
+    encoder_thread = threading.Thread(target=encoder, name="kb-encoder", daemon=True)
+    encoder_thread.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            batch = handoff.get()
+            write_stage.waiting += time.perf_counter() - start
+            if batch is _DONE: break
+            if isinstance(batch, Exception): raise batch
+            chunk, vectors = batch
+            batch_ids = [ids[i] for i in chunk]
+            start = time.perf_counter()
+            try:
+                collection.upsert(ids=batch_ids, embeddings=vectors.tolist(),
+                                  documents=[documents[i] for i in chunk], metadatas=[metadatas[i] for i in chunk])
+            except Exception as chroma_error:
+                print(f"\n  Error upserting batch of {len(chunk)} items to ChromaDB: {chroma_error}")
+                failed_ids.update(batch_ids)
+            write_stage.seconds += time.perf_counter() - start; write_stage.items += len(chunk)
+            print(f"  Indexed {write_stage.items}/{len(ids)} items", end="\r")
+        encoder_thread.join()
+    finally:
+        if pool is not None: model.stop_multi_process_pool(pool)
+
+    total = time.perf_counter() - total_start
+    print(f"\n  Embedding pipeline finished {len(ids)} items in {total:.2f}s ({len(ids) / total:,.0f} items/s end-to-end)")
+    print(encode_stage.report())
+    print(write_stage.report())
+    return failed_ids
@@ -0,0 +1,92 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+import numpy as np
+
+# --- Persistent embedding cache keyed by (model name, normalized text hash) ---
+# Shared by the KB build (embed_pipeline) and the query path (chatbot_app), so unchanged menu items and repeated
+# questions skip the transformer forward pass. One SQLite file; vectors are stored as raw float32 bytes.
+KB_DIR = Path(__file__).resolve().parent
+EMBEDDING_CACHE_PATH = KB_DIR / 'embedding_cache.sqlite'
+MAX_ENTRIES = 200000 # Oldest entries beyond this are pruned when the cache is opened (~1.5KB each for 384-d)
+LOOKUP_CHUNK = 500   # Hashes per SELECT ... IN (...), below SQLite's bound-parameter limit
+
+
+def normalize_text(text):
+    """Unicode NFC + collapsed whitespace: texts that differ only in spacing share one entry."""
+    return " ".join(unicodedata.normalize("NFC", str(text)).split())
+
+
+def text_hash(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, path=EMBEDDING_CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.model_name = model_name
+        self.path = Path(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL, "
+                           "vector BLOB NOT NULL, created REAL NOT NULL, PRIMARY KEY (model, text_hash)) WITHOUT ROWID")
+        self._prune(max_entries)
+
+    def _prune(self, max_entries):
+        with self._lock, self._conn:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > max_entries:
+                self._conn.execute("DELETE FROM embeddings WHERE (model, text_hash) IN (SELECT model, text_hash FROM embeddings ORDER BY created LIMIT ?)",
+                                   (count - max_entries,))
+                print(f"Pruned {count - max_entries} old entries from the embedding cache {self.path}")
+
+    def get_many(self, texts):
+        """Returns one float32 vector per text, or None where the text has not been embedded with this model."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), LOOKUP_CHUNK):
+                chunk = unique[i : i + LOOKUP_CHUNK]
+                rows = self._conn.execute(f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                                          [self.model_name, *chunk])
+                found.update((h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows)
+        vectors = [found.get(h) for h in hashes]
+        hits = sum(v is not None for v in vectors)
+        with self._lock: self.hits += hits; self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = [(self.model_name, text_hash(t), int(np.size(v)), np.asarray(v, dtype=np.float32).tobytes(), now) for t, v in zip(texts, vectors)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+
+    def embed(self, texts, encode):
+        """Vectors for `texts`, calling `encode(list_of_texts)` only for the ones not cached yet."""
+        vectors = self.get_many(texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            encoded = encode([texts[i] for i in missing])
+            self.put_many([texts[i] for i in missing], encoded)
+            for i, v in zip(missing, encoded): vectors[i] = np.asarray(v, dtype=np.float32)
+        return vectors
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class CachedEmbeddingFunction:
+    """Wraps a Chroma-style embedding function (list of texts -> list of vectors) with an EmbeddingCache."""
+
+    def __init__(self, embedding_function, cache):
+        self.embedding_function = embedding_function
+        self.cache = cache
+
+    def __call__(self, input):
+        return self.cache.embed(list(input), self.embedding_function)
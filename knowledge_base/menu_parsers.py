@@ -0,0 +1,277 @@
+import json
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from knowledge_base.normalize import clean_prices, standardize_tags_batch
+try:
+    import ijson # Optional: streams items out of the file instead of json.load-ing all of it
+except ImportError:
+    ijson = None
+
+# --- Registry of scraper output formats and streaming item extraction for create_kb.py ---
+# Each format declares its schema: the top-level key holding the menu and what every nesting level below it means
+# (a dict keyed by category / filter mode / veg split / item name, or "[]" for a list). One generic walker streams
+# the JSON (ijson events, so memory stays flat however big the file is) and yields every dict found at the schema's
+# depth together with the keys on its path; the format's `annotate` folds those keys into the item, exactly as the
+# old per-structure branches in create_kb.py did. New scraper layouts are added by registering another MenuFormat.
+# Standardized items are spooled to a temporary file batch by batch, so neither a worker nor the result it sends
+# back holds a whole file's items; create_kb.py reads the batches back with read_batches.
+STANDARDIZE_BATCH_SIZE = 5000         # Raw items normalized per batch while streaming a file
+DETECT_MAX_EVENTS = 200000            # JSON events read from the start of a file to auto-detect its format
+MULTIPROCESS_MIN_BYTES = 32 * 2**20   # Below this total input size, parsing in-process beats process pool start-up
+LIST = "[]"
+DETAILS_FILTER_KEYS = ("Veg Only", "Non Veg Only", "desserts and bevrages")
+
+
+class MenuFormat:
+    def __init__(self, name, root, levels, annotate, detect=None, description=""):
+        self.name = name
+        self.root = root             # Top-level key holding the menu
+        self.levels = tuple(levels)  # Per nesting level below `root`: the meaning of its dict keys, or LIST
+        self.annotate = annotate     # (item, keys) -> None; `keys` maps level names to the keys on the item's path
+        self.detect = detect         # Optional (item, keys) -> bool, checked on the first item during auto-detection
+        self.description = description
+
+    @property
+    def depth(self):
+        return 1 + len(self.levels)
+
+    def match(self, path, value):
+        """The level keys for a value found at `depth`, or None if its path doesn't follow this schema."""
+        if not isinstance(value, dict) or path[0] != ("map", self.root): return None
+        keys = {}
+        for (kind, key), level in zip(path[1:], self.levels):
+            if kind != ("array" if level == LIST else "map"): return None
+            if level != LIST: keys[level] = key
+        return keys
+
+
+def _flat(item, keys): item['category'] = item.get('category', 'Unknown')
+def _category_filter(item, keys): item['category'] = item.get('category', keys['category']); item['filter_mode'] = item.get('filter_mode', keys['filter_mode'])
+def _category_list(item, keys): item['category'] = keys['category']
+def _category_items(item, keys): item['item_name'] = keys['item_name']; item['category'] = keys['category']
+
+
+def _veg_split(item, keys):
+    item['item_name'] = keys['item_name']; item['category'] = item.get('original_category', 'Unknown')
+    if keys['veg'] == "Veg": item['is_vegetarian'] = True
+    elif keys['veg'] == "Non-Veg": item['is_vegetarian'] = False
+
+
+# Auto-detection tries these in order (same precedence as the original if/elif chain)
+FORMATS = {fmt.name: fmt for fmt in [
+    MenuFormat("flat_menu", "menu", [LIST], _flat, detect=lambda item, keys: "item_name" in item or "name" in item,
+               description="Flat 'menu' list (Oakaz)"),
+    MenuFormat("category_filter", "menu_by_category_filter", ["category", "filter_mode", LIST], _category_filter,
+               description="'menu_by_category_filter' > Category > Filter > [Items] (Dominos)"),
+    MenuFormat("details_category_filter", "menu_details", ["category", "filter_mode", LIST], _category_filter,
+               detect=lambda item, keys: keys["filter_mode"] in DETAILS_FILTER_KEYS, description="'menu_details' > Category > Filter > [Items] (McD)"),
+    MenuFormat("details_category_list", "menu_details", ["category", LIST], _category_list,
+               description="'menu_details' > Category > [Items] (Punjab Grill)"),
+    MenuFormat("details_category_items", "menu_details", ["category", "item_name"], _category_items,
+               description="'menu_details' > Category > ItemName > {info} (Subway unofficial)"),
+    MenuFormat("veg_split", "menu", ["veg", "item_name"], _veg_split, detect=lambda item, keys: keys["veg"] in ("Veg", "Non-Veg"),
+               description="'menu' > Veg/Non-Veg > ItemName > {info} (cleaned Subway)"),
+]}
+
+
+def register_format(fmt, before=None):
+    """Adds a scraper layout; `before` names an existing format it should be tried ahead of during detection."""
+    items = [(name, f) for name, f in FORMATS.items() if name != fmt.name]
+    position = next((i for i, (name, _) in enumerate(items) if name == before), len(items))
+    FORMATS.clear(); FORMATS.update(items[:position] + [(fmt.name, fmt)] + items[position:])
+
+
+# --- JSON walkers: (path, value) for every value `depth` containers below the document root ---
+# `path` holds one ("map", key) or ("array", index) pair per enclosing container, outermost first.
+def _build_value(event, value, events):
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    if event in ("start_map", "start_array"):
+        open_containers = 1
+        for event, value in events:
+            builder.event(event, value)
+            if event in ("start_map", "start_array"): open_containers += 1
+            elif event in ("end_map", "end_array"):
+                open_containers -= 1
+                if open_containers == 0: break
+    return builder.value
+
+
+def _walk_stream(f, depth):
+    path = [] # [kind, key] per open container
+    def advance():
+        if path and path[-1][0] == "array": path[-1][1] += 1
+    events = ijson.basic_parse(f, use_float=True)
+    for event, value in events:
+        if event == "map_key": path[-1][1] = value; continue
+        if event in ("end_map", "end_array"): path.pop(); advance(); continue
+        if len(path) == depth:
+            yield tuple((kind, key) for kind, key in path), _build_value(event, value, events) # Only this value is ever in memory
+            advance()
+        elif event == "start_map": path.append(["map", None])
+        elif event == "start_array": path.append(["array", 0])
+        else: advance() # Scalar above the target depth
+
+
+def _walk_loaded(node, depth, path=()):
+    if len(path) == depth: yield path, node; return
+    if isinstance(node, dict):
+        for key, value in node.items(): yield from _walk_loaded(value, depth, path + (("map", key),))
+    elif isinstance(node, list):
+        for index, value in enumerate(node): yield from _walk_loaded(value, depth, path + (("array", index),))
+
+
+def iter_menu_items(path, fmt):
+    """Lazily yields the raw items of a `fmt`-shaped file, annotated with category / filter mode / name from their path."""
+    with open(path, 'rb') as f:
+        walk = _walk_stream(f, fmt.depth) if ijson is not None else _walk_loaded(json.load(f), fmt.depth)
+        for value_path, value in walk:
+            keys = fmt.match(value_path, value)
+            if keys is None: continue
+            fmt.annotate(value, keys)
+            yield value
+
+
+def _first_fit(formats, verdicts):
+    """Format chosen once all formats ahead of it are decided: the fitting one, None if all failed, False if still open."""
+    for fmt, verdict in zip(formats, verdicts):
+        if verdict is None: return False
+        if verdict: return fmt
+    return None
+
+
+def detect_format(path):
+    """First registered format whose schema (and `detect` check) fits the file's first item; None if none does.
+
+    With ijson this is one pass over the start of the file that checks every format at once and stops as soon as
+    the answer is known; a format with no item in the first DETECT_MAX_EVENTS events counts as not fitting.
+    """
+    formats = list(FORMATS.values())
+    if ijson is None:
+        with open(path, 'rb') as f: data = json.load(f)
+        for fmt in formats:
+            for value_path, value in _walk_loaded(data, fmt.depth):
+                keys = fmt.match(value_path, value)
+                if keys is None: continue
+                if fmt.detect is None or fmt.detect(value, keys): return fmt
+                break
+        return None
+
+    verdicts = [None] * len(formats) # True / False once the format's first item has been checked
+    building = {} # format index -> [ObjectBuilder, keys, open containers] while its first item is being read
+    stack = [] # [kind, key] per open container, as in _walk_stream
+    def advance():
+        if stack and stack[-1][0] == "array": stack[-1][1] += 1
+    with open(path, 'rb') as f:
+        for event, value in islice(ijson.basic_parse(f, use_float=True), DETECT_MAX_EVENTS):
+            for i, state in list(building.items()):
+                state[0].event(event, value)
+                if event in ("start_map", "start_array"): state[2] += 1
+                elif event in ("end_map", "end_array"): state[2] -= 1
+                if state[2] == 0:
+                    del building[i]
+                    verdicts[i] = formats[i].detect(state[0].value, state[1])
+            if event == "start_map": # Only dicts are items: see whether this one is the first item of a format
+                value_path = tuple((kind, key) for kind, key in stack)
+                for i, fmt in enumerate(formats):
+                    if verdicts[i] is not None or i in building or fmt.depth != len(stack): continue
+                    keys = fmt.match(value_path, {})
+                    if keys is None: continue
+                    if fmt.detect is None: verdicts[i] = True; continue
+                    builder = ijson.ObjectBuilder(); builder.event(event, value)
+                    building[i] = [builder, keys, 1]
+            fit = _first_fit(formats, verdicts)
+            if fit is not False: return fit
+
+            if event == "map_key": stack[-1][1] = value
+            elif event in ("end_map", "end_array"): stack.pop(); advance()
+            elif event == "start_map": stack.append(["map", None])
+            elif event == "start_array": stack.append(["array", 0])
+            else: advance()
+    return _first_fit(formats, [bool(v) for v in verdicts])
+
+
+# --- Standardization (create_kb's item cleanup on top of the batch price/tag normalization) ---
+def select_valid_items(raw_items):
+    """Drops nameless items and category headers; returns (items, names, categories)."""
+    items, names, categories = [], [], []
+    for item in raw_items:
+        item_name = item.get("item_name") or item.get("name"); category = item.get("category") or "Unknown"
+        if not item_name or category == item_name: continue
+        items.append(item); names.append(item_name); categories.append(str(category) if category is not None else "Unknown")
+    return items, names, categories
+
+
+def standardize_items(restaurant_name, raw_items):
+    items, names, categories = select_valid_items(raw_items)
+    prices = clean_prices([item.get("price") for item in items])
+    tag_lists = standardize_tags_batch(items, categories)
+    standardized = []
+    for item, item_name, category, price_clean, tags in zip(items, names, categories, prices, tag_lists):
+        price_raw = item.get("price")
+        description = item.get("description", "")
+        if isinstance(description, str):
+            if price_raw and description.strip() == str(price_raw).strip(): description = ""
+            if description.startswith("Image from Swiggy"): description = ""
+        standardized.append({"restaurant_name": restaurant_name, "category": category, "item_name": item_name.strip(), "description": description.strip(), "price": price_clean, "special_tags": tags })
+    return standardized
+
+
+def ingest_file(restaurant_name, path, format_name=None):
+    """Streams one scraper file into standardized items, spooled in batches to a temporary file.
+
+    Returns a dict with the format used, the item count, the spool file (read it with read_batches) and any error.
+    """
+    result = {"restaurant_name": restaurant_name, "path": str(path), "format": format_name, "count": 0, "spool": None, "error": None}
+    if not os.path.isfile(path): result["error"] = f"File not found: {path}"; return result
+    if format_name and format_name not in FORMATS:
+        result["error"] = f"Unknown menu format {format_name!r} (registered: {', '.join(FORMATS)})"; return result
+    try:
+        fmt = FORMATS[format_name] if format_name else detect_format(path)
+        if fmt is None: result["error"] = f"Could not find recognizable menu structure in {os.path.basename(path)}"; return result
+        result["format"], result["description"] = fmt.name, fmt.description
+        raw_items = iter_menu_items(path, fmt)
+        with tempfile.NamedTemporaryFile(prefix="menu_items_", suffix=".pkl", delete=False) as spool:
+            result["spool"] = spool.name
+            while True:
+                batch = list(islice(raw_items, STANDARDIZE_BATCH_SIZE))
+                if not batch: break
+                items = standardize_items(restaurant_name, batch)
+                pickle.dump(items, spool, protocol=pickle.HIGHEST_PROTOCOL); result["count"] += len(items)
+    except json.JSONDecodeError: result["error"] = f"Invalid JSON file: {path}"
+    except Exception as e:
+        if ijson is not None and isinstance(e, ijson.JSONError): result["error"] = f"Invalid JSON file: {path} ({e})"
+        else: result["error"] = f"An unexpected error occurred processing {os.path.basename(path)}: {e!r}"
+    if result["error"] and result["spool"]: os.remove(result["spool"]); result["spool"] = None
+    return result
+
+
+def read_batches(result):
+    """Yields the standardized item batches an ingest_file result spooled, deleting the spool file afterwards."""
+    if not result["spool"]: return
+    try:
+        with open(result["spool"], 'rb') as f:
+            while True:
+                try: yield pickle.load(f)
+                except EOFError: break
+    finally:
+        os.remove(result["spool"]); result["spool"] = None
+
+
+def ingest_files(tasks, max_workers=None):
+    """Runs ingest_file for every (restaurant_name, path, format_name) task; results come back in task order.
+
+    Files are spread over a process pool once their total size makes that worthwhile. Workers only send back the
+    small result dicts; the items stay in their spool files until read_batches.
+    """
+    tasks = list(tasks)
+    total_bytes = sum(os.path.getsize(path) for _, path, _ in tasks if os.path.isfile(path))
+    workers = min(len(tasks), max_workers or os.cpu_count() or 1)
+    if workers <= 1 or total_bytes < MULTIPROCESS_MIN_BYTES:
+        return [ingest_file(*task) for task in tasks]
+    print(f"Parsing {len(tasks)} files ({total_bytes / 2**20:.0f} MB) on {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(ingest_file, *zip(*tasks)))
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+
+# --- Columnar, memory-mapped copy of data/consolidated_menu_items.json ---
+# Written by create_kb.py next to the JSON (MenuStore.from_items builds the same columns in memory when it is
+# missing). Every column is a .npy file loaded with mmap_mode='r', so opening
+# the store costs a few milliseconds regardless of menu size and scans only touch the columns they read:
+#   restaurant / category  -> int16 / int32 codes into sorted dictionaries (meta.json)
+#   price                  -> float64 (NaN = no price) + a price-sorted row permutation for range scans
+#   special_tags           -> uint32 bitset per item (filters) + ragged int8 codes (original tag order)
+#   item_name / description -> one UTF-8 byte blob per column + int64 offsets, decoded per row on demand
+KB_DIR = Path(__file__).resolve().parent
+DATA_DIR = KB_DIR.parent / 'data'
+MENU_STORE_PATH = DATA_DIR / 'menu_store'
+STORE_FORMAT_VERSION = 1
+TEXT_COLUMNS = ("item_name", "description")
+
+
+def _source_stamp(source_path):
+    """Size + mtime of the JSON the store was built from, used to detect a stale store."""
+    if source_path is None or not Path(source_path).is_file(): return None
+    stat = os.stat(source_path)
+    return {"path": str(source_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_columns(items):
+    """Encodes `items` (dicts with the fields create_kb.py consolidates) into the store's columns and meta dict."""
+    restaurants = sorted({str(item.get("restaurant_name", "")) for item in items})
+    categories = sorted({str(item.get("category", "Unknown")) for item in items})
+    tags = sorted({t for item in items for t in item.get("special_tags", [])})
+    if len(tags) > 32: raise ValueError(f"Too many distinct tags ({len(tags)}) for a uint32 bitset")
+    restaurant_code = {name: i for i, name in enumerate(restaurants)}
+    category_code = {name: i for i, name in enumerate(categories)}
+    tag_code = {tag: i for i, tag in enumerate(tags)}
+
+    columns = {
+        "restaurant_codes": np.array([restaurant_code[str(item.get("restaurant_name", ""))] for item in items], dtype=np.int16),
+        "category_codes": np.array([category_code[str(item.get("category", "Unknown"))] for item in items], dtype=np.int32),
+        "prices": np.array([item["price"] if item.get("price") is not None else np.nan for item in items], dtype=np.float64),
+    }
+    item_tags = [[tag_code[t] for t in item.get("special_tags", [])] for item in items]
+    columns["tag_bits"] = np.array([sum(1 << c for c in set(codes)) for codes in item_tags], dtype=np.uint32)
+    columns["tag_codes"] = np.array([c for codes in item_tags for c in codes], dtype=np.int8)
+    columns["tag_offsets"] = np.concatenate([[0], np.cumsum([len(codes) for codes in item_tags])]).astype(np.int64)
+    priced = np.flatnonzero(~np.isnan(columns["prices"]))
+    columns["price_order"] = priced[np.argsort(columns["prices"][priced], kind="stable")].astype(np.int64)
+    columns["sorted_prices"] = columns["prices"][columns["price_order"]]
+    for field in TEXT_COLUMNS:
+        encoded = [str(item.get(field) or "").encode("utf-8") for item in items]
+        columns[f"{field}_bytes"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        columns[f"{field}_offsets"] = np.concatenate([[0], np.cumsum([len(b) for b in encoded])]).astype(np.int64)
+    meta = {"format_version": STORE_FORMAT_VERSION, "count": len(items), "restaurants": restaurants, "categories": categories, "tags": tags}
+    return columns, meta
+
+
+def write_menu_store(items, path=MENU_STORE_PATH, source_path=None):
+    """Writes `items` as a columnar store in `path`."""
+    start = time.perf_counter()
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    columns, meta = build_columns(items)
+    for name, array in columns.items(): np.save(path / f"{name}.npy", array)
+    meta["source"] = _source_stamp(source_path)
+    with open(path / 'meta.json', 'w', encoding='utf-8') as f: json.dump(meta, f, indent=1, ensure_ascii=False)
+    size = sum(a.nbytes for a in columns.values())
+    print(f"Wrote columnar menu store ({len(items)} items, {size / 1024:.0f} KB) to {path} in {time.perf_counter() - start:.2f}s")
+
+
+class MenuStore:
+    """Read side of the store: memory-mapped columns plus row access shaped like the consolidated JSON items."""
+
+    def __init__(self, path=MENU_STORE_PATH):
+        path = Path(path)
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f: meta = json.load(f)
+        if meta.get("format_version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Menu store format {meta.get('format_version')} != {STORE_FORMAT_VERSION}; re-run create_kb.py")
+        self._attach(meta, lambda name: np.load(path / f"{name}.npy", mmap_mode='r'))
+
+    @classmethod
+    def from_items(cls, items):
+        """Same columns as a written store, built in memory (nothing touches disk)."""
+        store = cls.__new__(cls)
+        columns, meta = build_columns(items)
+        store._attach(meta, columns.__getitem__)
+        return store
+
+    def _attach(self, meta, load):
+        self.meta = meta
+        self.restaurants, self.categories, self.tags = meta["restaurants"], meta["categories"], meta["tags"]
+        self.restaurant_codes, self.category_codes, self.prices = load("restaurant_codes"), load("category_codes"), load("prices")
+        self.tag_bits, self.tag_codes, self.tag_offsets = load("tag_bits"), load("tag_codes"), load("tag_offsets")
+        self.price_order, self.sorted_prices = load("price_order"), load("sorted_prices")
+        self._text = {field: (load(f"{field}_bytes"), load(f"{field}_offsets")) for field in TEXT_COLUMNS}
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def is_current(self, source_path):
+        """False if `source_path` (the consolidated JSON) changed after the store was written."""
+        return self.meta.get("source") is None or _source_stamp(source_path) == self.meta["source"]
+
+    def text(self, field, row):
+        blob, offsets = self._text[field]
+        return bytes(blob[offsets[row] : offsets[row + 1]]).decode("utf-8")
+
+    def text_column(self, field):
+        """Whole text column as a list of str (one decode of the blob)."""
+        blob, offsets = self._text[field]
+        data = bytes(blob)
+        return [data[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+    # --- Vectorized scans ---
+    def tag_mask(self, tag_names):
+        """Boolean mask of rows carrying any of `tag_names`."""
+        bits = np.uint32(sum(1 << i for i, tag in enumerate(self.tags) if tag in tag_names))
+        return (self.tag_bits & bits) != 0
+
+    def price_range(self, min_price=None, max_price=None):
+        """Rows priced within [min_price, max_price], in ascending price order (binary search on the sorted column)."""
+        lo = 0 if min_price is None else np.searchsorted(self.sorted_prices, min_price, side="left")
+        hi = len(self.sorted_prices) if max_price is None else np.searchsorted(self.sorted_prices, max_price, side="right")
+        return np.asarray(self.price_order[lo:hi])
+
+    def item(self, row):
+        price = float(self.prices[row])
+        tags = self.tag_codes[self.tag_offsets[row] : self.tag_offsets[row + 1]]
+        return {"restaurant_name": self.restaurants[self.restaurant_codes[row]], "category": self.categories[self.category_codes[row]],
+                "item_name": self.text("item_name", row), "description": self.text("description", row),
+                "price": None if np.isnan(price) else price, "special_tags": [self.tags[c] for c in tags]}
+
+    def items(self):
+        return [self.item(row) for row in range(len(self))]
+
+
+def load_menu_store(path=MENU_STORE_PATH, source_path=None):
+    """Returns a MenuStore, or None if none has been written or it is older than `source_path`."""
+    if not (Path(path) / 'meta.json').is_file(): return None
+    store = MenuStore(path)
+    if source_path is not None and not store.is_current(source_path):
+        print(f"Menu store at {path} is older than {source_path}; re-run create_kb.py to refresh it.")
+        return None
+    return store
@@ -0,0 +1,108 @@
+import re
+
+# --- Batch normalization of scraped items (column-wise equivalents of create_kb.clean_price / standardize_tags) ---
+# Results are identical to the per-item functions, which stay in create_kb.py as the reference
+# (`create_kb.py --check-normalize` compares both over the data/ files). The speed comes from doing work once per
+# distinct value instead of once per item: price strings, category names and whole tag-relevant field combinations
+# repeat heavily across outlets, so each distinct one is parsed / classified once and looked up afterwards.
+# Keyword lists are compiled into one alternation regex each, which scans a string in a single pass (same result
+# as `any(kw in s)`).
+PRICE_RE = re.compile(r'(\d[\d,]*\.?\d*)')
+DROPPED_SOURCE_TAGS = frozenset(['Veg Only', 'Non Veg Only', 'Veg', 'Non-Veg', 'desserts and bevrages'])
+FOOD_TAGS = frozenset(["Vegetarian", "Non-Vegetarian"])
+OTHER_TAGS = frozenset(["Beverage", "Dessert", "Side", "Pasta", "Combo/Meal", "Wrap/Roll"])
+FILTER_MODE_TAGS = {'Veg': "Vegetarian", 'Veg Only': "Vegetarian", 'Non-Veg': "Non-Vegetarian", 'Non Veg Only': "Non-Vegetarian"}
+
+
+def _keywords_re(keywords):
+    return re.compile("|".join(re.escape(kw) for kw in keywords))
+
+
+# First matching rule wins, in this order (mirrors the elif chain in standardize_tags)
+CATEGORY_RULES = [(tag, _keywords_re(keywords)) for tag, keywords in [
+    ("Beverage", ["bev", "drink"]),
+    ("Dessert", ["dessert", "cake", "cookie"]),
+    ("Side", ["side", "bread", "dip", "more", "fries"]),
+    ("Pasta", ["pasta"]),
+    ("Combo/Meal", ["combo", "meal", "feast"]),
+    ("Wrap/Roll", ["wrap", "roll"]),
+]]
+NON_VEG_NAME_RE = _keywords_re(["chicken", "egg", "b.m.t", "tuna", "meatball", "keema", "turkey", "steak", "lamb", "mutton", "fish", "prawn", "pepperoni"])
+VEG_NAME_RE = _keywords_re(["paneer", "aloo", "veg", "corn", "peas", "bean", "shammi", "chilli", "hara bhara", "mushroom", "gobhi", "subz", "patty"])
+
+
+def _parse_price_string(text):
+    match = PRICE_RE.search(text)
+    if match:
+        try: return float(match.group(1).replace(',', ''))
+        except ValueError: return None
+    return None
+
+
+def _map_unique(values, fn):
+    """fn applied once per distinct value of a str column, broadcast back to every row."""
+    results = {}
+    for value in values:
+        if value not in results: results[value] = fn(value)
+    return [results[value] for value in values]
+
+
+def clean_prices(raw_prices):
+    """Column version of create_kb.clean_price: numbers pass through as float, each distinct string is parsed once."""
+    out = [None] * len(raw_prices)
+    string_rows = []
+    for i, raw in enumerate(raw_prices):
+        if isinstance(raw, (int, float)): out[i] = float(raw)
+        elif isinstance(raw, str): string_rows.append(i)
+    for i, price in zip(string_rows, _map_unique([raw_prices[i] for i in string_rows], _parse_price_string)): out[i] = price
+    return out
+
+
+def category_tag(lower_category):
+    for tag, pattern in CATEGORY_RULES:
+        if pattern.search(lower_category): return tag
+    return None
+
+
+def _tags_for(source_tags, is_vegetarian, filter_mode, cat_tag, item_name_lower):
+    """standardize_tags for one item, from the fields it reads (_ABSENT marks a missing key)."""
+    tags = []
+    if isinstance(source_tags, list):
+        tags.extend(t for t in source_tags if not (isinstance(t, str) and t in DROPPED_SOURCE_TAGS))
+    if is_vegetarian is True and "Vegetarian" not in tags: tags.append("Vegetarian")
+    elif is_vegetarian is False and "Non-Vegetarian" not in tags: tags.append("Non-Vegetarian")
+    is_food_tagged = not FOOD_TAGS.isdisjoint(t for t in tags if isinstance(t, str))
+    if not is_food_tagged and isinstance(filter_mode, str) and filter_mode in FILTER_MODE_TAGS:
+        tags.append(FILTER_MODE_TAGS[filter_mode]); is_food_tagged = True
+    if not is_food_tagged:
+        if cat_tag: tags.append(cat_tag)
+        if OTHER_TAGS.isdisjoint(t for t in tags if isinstance(t, str)):
+            if NON_VEG_NAME_RE.search(item_name_lower): tags.append("Non-Vegetarian (Inferred)")
+            elif VEG_NAME_RE.search(item_name_lower): tags.append("Vegetarian (Inferred)")
+    return list(set(tags))
+
+
+_ABSENT = object()
+
+
+def standardize_tags_batch(items, categories):
+    """Column version of create_kb.standardize_tags: one tag list per item, in the same (set) order.
+
+    `categories` holds the category name per item, as passed to standardize_tags. Items with the same
+    tag-relevant fields (source tags, veg flag, filter mode, category rule, lowercased name) share one
+    computation; each gets its own copy of the list.
+    """
+    category_tags = _map_unique([str(c).lower() for c in categories], category_tag)
+    memo, results = {}, []
+    for item, cat_tag in zip(items, category_tags):
+        source_tags = item.get("special_tags", _ABSENT)
+        fields = (source_tags, item.get("is_vegetarian", _ABSENT), item.get("filter_mode", _ABSENT), cat_tag, str(item.get("item_name", "")).lower())
+        try:
+            # Types are part of the key so that e.g. 1 and True (equal, same hash) don't share an entry
+            key = (tuple((type(t), t) for t in source_tags) if isinstance(source_tags, list) else (type(source_tags), source_tags),
+                   type(fields[1]), fields[1], type(fields[2]), fields[2]) + fields[3:]
+            tags = memo.get(key)
+            if tags is None: tags = memo[key] = _tags_for(*fields)
+        except TypeError: tags = _tags_for(*fields) # Unhashable field values: no memoization
+        results.append(list(tags))
+    return results
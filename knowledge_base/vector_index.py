@@ -0,0 +1,177 @@
+import json
+import time
+from pathlib import Path
+import numpy as np
+
+# --- Exact brute-force vector search over a memory-mapped NumPy embedding matrix ---
+# A drop-in for the parts of the Chroma collection API that chatbot_app uses (query / get / count), so the
+# small menu corpus can be searched with one matrix-vector product instead of a round trip through Chroma.
+# Next to the float matrix an int8 copy with one scale per vector is written (~4x smaller); the quantized search
+# scans only that copy and reranks a shortlist with the exact float rows, read on demand from the memory map.
+KB_DIR = Path(__file__).resolve().parent
+VECTOR_INDEX_PATH = KB_DIR / 'vector_menu'
+INDEX_DTYPES = {"float32": np.float32, "float16": np.float16}
+SCAN_BLOCK_ROWS = 65536 # Rows scored per block, bounding the float32 temporaries when scanning int8/float16 matrices
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(matrix):
+    """Symmetric per-vector int8 quantization: returns (codes, scales) with matrix[i] ~= codes[i] * scales[i]."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.maximum(np.abs(matrix).max(axis=-1), 1e-12) / 127.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def build_vector_index(ids, embeddings, documents, metadatas, path=VECTOR_INDEX_PATH, dtype="float32", embedding_model=None):
+    """Writes L2-normalized embeddings (`embeddings.npy`), their int8 codes and scales (`codes_int8.npy`,
+    `scales.npy`) plus ids/documents/metadatas (`items.json`) to `path`."""
+    start = time.perf_counter()
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    normalized = _normalize(embeddings).reshape(len(ids), -1)
+    matrix = normalized.astype(INDEX_DTYPES[dtype])
+    codes, scales = quantize_int8(normalized)
+    np.save(path / 'embeddings.npy', matrix)
+    np.save(path / 'codes_int8.npy', codes)
+    np.save(path / 'scales.npy', scales)
+    with open(path / 'items.json', 'w', encoding='utf-8') as f:
+        json.dump({"ids": list(ids), "documents": list(documents), "metadatas": list(metadatas)}, f, ensure_ascii=False)
+    with open(path / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump({"count": len(ids), "dim": int(matrix.shape[1]), "dtype": dtype, "quantization": "int8", "embedding_model": embedding_model}, f, indent=1)
+    print(f"Built NumPy vector index: {len(ids)} x {matrix.shape[1]} {dtype} ({matrix.nbytes / 1024:.0f} KB), "
+          f"int8 codes {(codes.nbytes + scales.nbytes) / 1024:.0f} KB, in {time.perf_counter() - start:.2f}s")
+
+
+class NumpyVectorIndex:
+    """Cosine search with Chroma-shaped results; distances are squared L2 between unit vectors (2 - 2*cos),
+    matching Chroma's default "l2" space so thresholds and logs read the same with either backend.
+
+    With `quantized=True` the int8 codes are scanned first and the best `rerank_factor * n_results` candidates
+    are rescored with the float rows, so the returned order and distances are exact within that shortlist.
+    """
+
+    def __init__(self, path=VECTOR_INDEX_PATH, quantized=False, rerank_factor=4):
+        path = Path(path)
+        self.rerank_factor = rerank_factor
+        self.codes = self.scales = None
+        if quantized:
+            if (path / 'codes_int8.npy').is_file():
+                self.codes = np.load(path / 'codes_int8.npy', mmap_mode='r')
+                self.scales = np.load(path / 'scales.npy')
+            else: print(f"Warning: No int8 codes in {path}; re-run 'create_kb.py'. Using the float matrix.")
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f: self.meta = json.load(f)
+        with open(path / 'items.json', 'r', encoding='utf-8') as f: items = json.load(f)
+        self.ids, self.documents, self.metadatas = items["ids"], items["documents"], items["metadatas"]
+        self.embeddings = np.load(path / 'embeddings.npy', mmap_mode='r')
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._columns = {} # Metadata field -> array, built on first use by a filter
+
+    def count(self):
+        return len(self.ids)
+
+    def stats(self):
+        """Sizes of the matrices the search scans, for logs and the benchmark."""
+        return {"count": len(self.ids), "dim": int(self.embeddings.shape[1]) if self.embeddings.ndim == 2 else 0,
+                "dtype": str(self.embeddings.dtype), "quantized": self.codes is not None, "float_mb": self.embeddings.nbytes / 2**20,
+                "int8_mb": (self.codes.nbytes + self.scales.nbytes) / 2**20 if self.codes is not None else None}
+
+    # --- Metadata filters (the Chroma `where` subset built by chatbot_app._build_where, plus $or/$in/$ne) ---
+    def _column(self, field):
+        if field not in self._columns:
+            values = [m.get(field) if m else None for m in self.metadatas]
+            if all(v is None or isinstance(v, (bool, int, float)) for v in values):
+                column = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64) # bools -> 0/1
+            else:
+                column = np.array(values, dtype=object)
+            self._columns[field] = column
+        return self._columns[field]
+
+    def _mask(self, where):
+        if not where: return None
+        masks = []
+        for field, cond in where.items():
+            if field == "$and": masks.append(np.logical_and.reduce([self._mask(c) for c in cond])); continue
+            if field == "$or": masks.append(np.logical_or.reduce([self._mask(c) for c in cond])); continue
+            column = self._column(field)
+            numeric = column.dtype != object
+            cast = (lambda v: float(v)) if numeric else (lambda v: v)
+            for op, value in (cond.items() if isinstance(cond, dict) else [("$eq", cond)]):
+                if op == "$eq": masks.append(column == cast(value))
+                elif op == "$ne": masks.append(column != cast(value))
+                elif op == "$gt": masks.append(column > cast(value))
+                elif op == "$gte": masks.append(column >= cast(value))
+                elif op == "$lt": masks.append(column < cast(value))
+                elif op == "$lte": masks.append(column <= cast(value))
+                elif op == "$in": masks.append(np.isin(column, [cast(v) for v in value]))
+                elif op == "$nin": masks.append(~np.isin(column, [cast(v) for v in value]))
+                else: raise ValueError(f"Unsupported filter operator {op!r}")
+        return np.logical_and.reduce(masks) if len(masks) > 1 else masks[0]
+
+    def _rows(self, positions, include):
+        rows = {"ids": [self.ids[p] for p in positions]}
+        if "documents" in include: rows["documents"] = [self.documents[p] for p in positions]
+        if "metadatas" in include: rows["metadatas"] = [self.metadatas[p] for p in positions]
+        return rows
+
+    @staticmethod
+    def _scan(queries, matrix, scales=None):
+        """Similarities of each (normalized) query against every row of `matrix`: (n_queries, n_items)."""
+        if matrix.dtype == np.float32: scores = queries @ matrix.T
+        else:
+            scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+            for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+                block = np.asarray(matrix[start : start + SCAN_BLOCK_ROWS], dtype=np.float32)
+                scores[:, start : start + len(block)] = queries @ block.T
+        if scales is not None: scores *= scales
+        return scores
+
+    @staticmethod
+    def _top(scores, k):
+        """Positions of the k highest scores, best first."""
+        if k <= 0: return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        queries = _normalize(np.atleast_2d(query_embeddings))
+        mask = self._mask(where)
+        quantized = self.codes is not None
+        scores = self._scan(queries, self.codes, self.scales) if quantized else self._scan(queries, self.embeddings)
+        if mask is not None: scores[:, ~mask] = -np.inf
+        available = len(self.ids) if mask is None else int(mask.sum())
+        k = min(n_results, available)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query, row in zip(queries, scores):
+            if quantized: # Exact rescoring of the quantized shortlist (rows read in file order)
+                shortlist = np.sort(self._top(row, min(available, k * self.rerank_factor)))
+                exact = np.asarray(self.embeddings[shortlist], dtype=np.float32) @ query
+                order = self._top(exact, k)
+                top, similarities = shortlist[order], exact[order]
+            else:
+                top = self._top(row, k)
+                similarities = row[top]
+            rows = self._rows(top, include)
+            for key in out:
+                if key in rows: out[key].append(rows[key])
+            if "distances" in include: out["distances"].append((2.0 - 2.0 * similarities).tolist())
+        return {key: value for key, value in out.items() if key == "ids" or key in include}
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        positions = [self._positions[i] for i in ids if i in self._positions] if ids is not None else list(range(len(self.ids)))
+        mask = self._mask(where)
+        if mask is not None: positions = [p for p in positions if mask[p]]
+        rows = self._rows(positions, include)
+        if "embeddings" in include: rows["embeddings"] = np.asarray(self.embeddings[positions], dtype=np.float32)
+        return rows
+
+
+def load_vector_index(path=VECTOR_INDEX_PATH, quantized=False, rerank_factor=4):
+    """Returns a NumpyVectorIndex, or None if create_kb.py has not written one yet."""
+    if not (Path(path) / 'meta.json').is_file(): return None
+    return NumpyVectorIndex(path, quantized=quantized, rerank_factor=rerank_factor)
@@ -0,0 +1,356 @@
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import deque
+from rag_tracing import tracer
+
+# --- Request scheduling in front of the (non-thread-safe) llama.cpp model ---
+# Both gates expose complete(prompt, stream=False, timeout=None, stats=None, **generation_kwargs) with the
+# llama_cpp.Llama return shapes (a completion dict, or an iterator of chunk dicts when stream=True). A `stats` dict
+# receives prefix_restore_s, prefix_tokens_reused (prompt tokens already in the KV cache) and prompt_eval_s (time
+# from calling the model to its first token, i.e. evaluating the rest of the prompt).
+#   LocalLLMGate  - one in-process Llama, requests serialized by a lock (LLM_WORKERS = 0)
+#   LLMScheduler  - N worker processes, each with its own Llama, fed from one shared queue (LLM_WORKERS = N)
+# When more than `max_queue` requests are already waiting, new ones are rejected at once with LLMBusyError
+# instead of piling up; a request that is not finished within its timeout raises LLMTimeoutError.
+WORKER_STARTUP_TIMEOUT_S = 600 # Loading a 7B GGUF from a cold disk can take minutes
+RECENT_WAITS = 500             # Queue-wait samples kept for stats()
+WORKER_CHECK_INTERVAL_S = 1.0  # How often the router checks that every worker process is still alive
+
+
+class LLMBusyError(RuntimeError):
+    """The request queue is full; the caller should tell the user to retry shortly."""
+
+
+class LLMTimeoutError(TimeoutError):
+    """The request did not get a model or did not finish within its timeout."""
+
+
+class _GateStats:
+    """Counters shared by both gates; queue wait / depth also go to the tracer's metrics when tracing is on."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = 0   # Admitted, not yet running
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.waits = deque(maxlen=RECENT_WAITS)
+
+    def record_wait(self, seconds):
+        self.waits.append(seconds)
+        if tracer.enabled:
+            tracer.metrics.observe("llm_queue_wait_seconds", seconds, help="Time a generation request waited for a model.")
+
+    def count(self, outcome):
+        if tracer.enabled: tracer.metrics.inc("llm_requests_total", help="Generation requests by scheduler outcome.", outcome=outcome)
+
+    def snapshot(self, **extra):
+        with self.lock:
+            waits = sorted(self.waits)
+            snap = {"queue_depth": self.waiting, "running": self.running, "completed": self.completed,
+                    "rejected": self.rejected, "timeouts": self.timeouts, "errors": self.errors}
+        snap["wait_p50_s"] = waits[len(waits) // 2] if waits else None
+        snap["wait_p95_s"] = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None
+        snap.update(extra)
+        return snap
+
+
+def _chunk(piece):
+    return {"choices": [{"text": piece, "index": 0, "finish_reason": None}]}
+
+
+def _timed_generation(llm, prompt, kwargs, before_generate, stats):
+    """Streams `llm`'s chunks for `prompt` after `before_generate(prompt)`, timing the prefix restore and prompt eval."""
+    start = time.perf_counter()
+    reused = before_generate(prompt) if before_generate else None
+    called = time.perf_counter()
+    stats.update(prefix_restore_s=called - start, prefix_tokens_reused=reused)
+    for chunk in llm(prompt, stream=True, **kwargs):
+        if "prompt_eval_s" not in stats: stats["prompt_eval_s"] = time.perf_counter() - called
+        yield chunk
+
+
+class LocalLLMGate:
+    """Serializes access to one in-process Llama, with the same admission limit and timeouts as LLMScheduler."""
+
+    def __init__(self, llm, max_queue=8, timeout_s=120, before_generate=None):
+        self.llm = llm
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.before_generate = before_generate # (prompt) -> prompt tokens reused, e.g. ModelRegistry.restore_prompt_prefix
+        self._model_lock = threading.Lock()
+        self.stats_ = _GateStats()
+
+    def _admit(self):
+        s = self.stats_
+        with s.lock:
+            if s.waiting >= self.max_queue:
+                s.rejected += 1; s.count("rejected")
+                raise LLMBusyError(f"{s.waiting} requests already waiting for the model")
+            s.waiting += 1
+
+    def _acquire(self, deadline, submitted):
+        s = self.stats_
+        acquired = self._model_lock.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        with s.lock:
+            s.waiting -= 1
+            if acquired: s.running += 1
+            else: s.timeouts += 1
+        if not acquired:
+            s.count("timeout")
+            raise LLMTimeoutError(f"No model became free within {deadline - submitted:.0f}s")
+        s.record_wait(time.monotonic() - submitted)
+
+    def _release(self, outcome):
+        s = self.stats_
+        with s.lock:
+            s.running -= 1
+            if outcome == "ok": s.completed += 1
+            elif outcome == "timeout": s.timeouts += 1
+            else: s.errors += 1
+        s.count(outcome)
+        self._model_lock.release()
+
+    def complete(self, prompt, stream=False, timeout=None, stats=None, **kwargs):
+        stats = stats if stats is not None else {}
+        if stream: return self._stream(prompt, timeout, kwargs, stats)
+        self._admit()
+        submitted = time.monotonic()
+        deadline = submitted + (timeout or self.timeout_s)
+        self._acquire(deadline, submitted)
+        outcome = "error"
+        try:
+            # Streamed internally (like the worker processes) so the prompt eval can be timed and the deadline applies
+            parts, n_tokens, finish_reason = [], 0, None
+            for chunk in _timed_generation(self.llm, prompt, kwargs, self.before_generate, stats):
+                choice = chunk['choices'][0] if chunk.get('choices') else {}
+                parts.append(choice.get('text', '')); n_tokens += 1
+                finish_reason = choice.get('finish_reason') or finish_reason
+                if time.monotonic() > deadline:
+                    outcome = "timeout"
+                    raise LLMTimeoutError("Generation exceeded the request timeout")
+            outcome = "ok"
+            tokenize = getattr(self.llm, "tokenize", None)
+            return {"choices": [{"text": "".join(parts), "index": 0, "finish_reason": finish_reason or "stop"}],
+                    "usage": {"prompt_tokens": len(tokenize(prompt.encode("utf-8"), special=True)) if tokenize else None, "completion_tokens": n_tokens}}
+        finally:
+            self._release(outcome)
+
+    def _stream(self, prompt, timeout, kwargs, stats):
+        self._admit() # On first iteration, so a stream that is never consumed holds no queue slot
+        submitted = time.monotonic()
+        deadline = submitted + (timeout or self.timeout_s)
+        self._acquire(deadline, submitted)
+        outcome = "error"
+        try:
+            for chunk in _timed_generation(self.llm, prompt, kwargs, self.before_generate, stats):
+                yield chunk
+                if time.monotonic() > deadline:
+                    outcome = "timeout"
+                    raise LLMTimeoutError("Generation exceeded the request timeout")
+            outcome = "ok"
+        finally:
+            self._release(outcome) # Also runs when the consumer stops iterating early
+
+    def stats(self):
+        return self.stats_.snapshot(workers=1, mode="in-process")
+
+    def close(self): pass
+
+
+def _worker_main(worker_id, model_path, tasks, results):
+    """Entry point of one model worker process: loads its own Llama, then serves jobs from `tasks` until None."""
+    import chatbot_app # Cheap: chatbot_app loads models lazily, and only the GGUF model is loaded here
+    chatbot_app.MODEL_PATH = model_path
+    registry = chatbot_app.ModelRegistry().load_llm()
+    if registry.llm is None:
+        results.put(("failed", worker_id, None, registry.error)); return
+    results.put(("ready", worker_id, None, None))
+    while True:
+        job = tasks.get()
+        if job is None: break
+        job_id, prompt, kwargs, stream, deadline = job
+        if time.time() > deadline:
+            results.put(("expired", worker_id, job_id, None)); continue # Its caller has already given up
+        results.put(("started", worker_id, job_id, time.time()))
+        try:
+            parts, n_tokens, expired, stats = [], 0, False, {}
+            # Always streamed internally so a request can be cut off at its deadline between tokens
+            for chunk in _timed_generation(registry.llm, prompt, kwargs, registry.restore_prompt_prefix, stats):
+                piece = chunk['choices'][0].get('text', '') if chunk.get('choices') else ''
+                n_tokens += 1
+                if stream: results.put(("chunk", worker_id, job_id, piece))
+                else: parts.append(piece)
+                if time.time() > deadline: expired = True; break
+            if expired: results.put(("expired", worker_id, job_id, None))
+            else: results.put(("done", worker_id, job_id, {"text": "".join(parts), "completion_tokens": n_tokens, "stats": stats,
+                                                           "prompt_tokens": len(registry.llm.tokenize(prompt.encode("utf-8"), special=True))}))
+        except Exception as e:
+            results.put(("error", worker_id, job_id, repr(e)))
+
+
+class LLMScheduler:
+    """Bounded request queue in front of `num_workers` model processes (each with its own Llama).
+
+    Idle workers pull jobs from one shared queue, so work goes to whichever model is free. A router thread in
+    this process reads worker messages and hands them to the waiting callers. Workers that die are restarted
+    and their in-flight request fails instead of hanging.
+    """
+
+    def __init__(self, num_workers, model_path, max_queue=8, timeout_s=120, worker_main=_worker_main):
+        self.num_workers = num_workers
+        self.model_path = model_path
+        self.worker_main = worker_main # Entry point of the worker processes (a module-level function, for spawn)
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.error = None
+        self._ctx = mp.get_context("spawn") # Fork would copy this process's threads and loaded libraries
+        self._tasks = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._workers = {}    # worker_id -> Process
+        self._ready = set()
+        self._current = {}    # worker_id -> job_id being generated
+        self._started = set() # job_ids a worker has picked up (moved from `waiting` to `running` in the stats)
+        self._jobs = {}       # job_id -> queue.Queue of worker messages for the waiting caller
+        self._submitted = {}  # job_id -> submit time (wall clock, comparable with the workers' timestamps)
+        self._ids = itertools.count()
+        self._closed = False
+        self._ready_event = threading.Event()
+        self.stats_ = _GateStats()
+
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(target=self.worker_main, args=(worker_id, self.model_path, self._tasks, self._results),
+                                    name=f"llm-worker-{worker_id}", daemon=True)
+        process.start()
+        self._workers[worker_id] = process
+
+    def start(self, startup_timeout=WORKER_STARTUP_TIMEOUT_S):
+        """Starts the workers and waits until at least one has loaded its model; returns True on success."""
+        print(f"Starting {self.num_workers} LLM worker processes...")
+        for worker_id in range(self.num_workers): self._spawn(worker_id)
+        threading.Thread(target=self._route, name="llm-scheduler-router", daemon=True).start()
+        if not self._ready_event.wait(startup_timeout):
+            self.error = self.error or f"No LLM worker became ready within {startup_timeout}s"
+        if not self._ready:
+            print(self.error); self.close(); return False
+        print(f"LLM scheduler ready with {len(self._ready)}/{self.num_workers} workers.")
+        return True
+
+    def _route(self):
+        failed = set()
+        next_check = time.monotonic() + WORKER_CHECK_INTERVAL_S
+        while not self._closed:
+            # Liveness is checked on a timer, not only when the results queue goes quiet: under steady traffic
+            # it never does, and requests on a crashed worker would otherwise wait out their full timeout
+            if time.monotonic() >= next_check:
+                self._check_workers(); next_check = time.monotonic() + WORKER_CHECK_INTERVAL_S
+            try: kind, worker_id, job_id, payload = self._results.get(timeout=max(0.0, next_check - time.monotonic()))
+            except queue.Empty: continue
+            if kind == "ready":
+                self._ready.add(worker_id); self._ready_event.set(); continue
+            if kind == "failed":
+                failed.add(worker_id); self.error = payload
+                if len(failed) == self.num_workers: self._ready_event.set() # Nothing will come up; stop waiting
+                continue
+            if kind == "started":
+                self._current[worker_id] = job_id
+                s = self.stats_
+                with s.lock:
+                    submitted = self._submitted.get(job_id)
+                    if job_id in self._jobs: s.waiting -= 1; s.running += 1; self._started.add(job_id)
+                if submitted is not None: s.record_wait(max(0.0, payload - submitted))
+            elif kind in ("done", "error", "expired"):
+                self._current.pop(worker_id, None)
+            waiter = self._jobs.get(job_id)
+            if waiter is not None: waiter.put((kind, payload))
+
+    def _check_workers(self):
+        """Restarts dead workers; the request a dead worker was running fails instead of waiting for its timeout."""
+        for worker_id, process in list(self._workers.items()):
+            if process.is_alive() or self._closed or worker_id not in self._ready: continue
+            print(f"LLM worker {worker_id} exited with code {process.exitcode}; restarting it.")
+            self._ready.discard(worker_id)
+            job_id = self._current.pop(worker_id, None)
+            if job_id is not None and job_id in self._jobs: self._jobs[job_id].put(("error", f"LLM worker {worker_id} crashed"))
+            self._spawn(worker_id)
+
+    def _submit(self, prompt, stream, kwargs, timeout):
+        s = self.stats_
+        with s.lock:
+            # Jobs count as waiting until a worker reports them started, so capacity is judged on waiting + running
+            if s.waiting + s.running >= self.max_queue + self.num_workers:
+                s.rejected += 1; s.count("rejected")
+                raise LLMBusyError(f"{s.waiting + s.running} requests already queued or running")
+            s.waiting += 1
+            job_id = next(self._ids)
+            self._jobs[job_id] = queue.Queue()
+            self._submitted[job_id] = time.time()
+        deadline = time.time() + (timeout or self.timeout_s)
+        self._tasks.put((job_id, prompt, kwargs, stream, deadline))
+        if tracer.enabled: tracer.metrics.set_gauge("llm_queue_depth", s.waiting, help="Generation requests waiting for a model.")
+        return job_id, deadline
+
+    def _next_message(self, job_id, deadline):
+        try: return self._jobs[job_id].get(timeout=max(0.0, deadline - time.time()) + 1.0) # +1s for the worker's own cut-off to arrive
+        except queue.Empty: return ("expired", None)
+
+    def _finish(self, job_id, outcome):
+        s = self.stats_
+        with s.lock:
+            self._jobs.pop(job_id, None); self._submitted.pop(job_id, None)
+            if job_id in self._started: self._started.discard(job_id); s.running -= 1
+            else: s.waiting -= 1 # Expired in (or never left) the queue
+            if outcome == "ok": s.completed += 1
+            elif outcome == "timeout": s.timeouts += 1
+            elif outcome == "error": s.errors += 1
+        s.count(outcome)
+
+    def complete(self, prompt, stream=False, timeout=None, stats=None, **kwargs):
+        kwargs.pop("echo", None) # Chunks are forwarded as-is; echoing the prompt is never wanted here
+        stats = stats if stats is not None else {}
+        if stream: return self._stream(prompt, kwargs, timeout, stats)
+        job_id, deadline = self._submit(prompt, False, kwargs, timeout)
+        outcome = "error"
+        try:
+            while True:
+                kind, payload = self._next_message(job_id, deadline)
+                if kind == "started": continue
+                if kind == "done":
+                    outcome = "ok"; stats.update(payload["stats"])
+                    return {"choices": [{"text": payload["text"], "index": 0, "finish_reason": "stop"}],
+                            "usage": {"prompt_tokens": payload["prompt_tokens"], "completion_tokens": payload["completion_tokens"]}}
+                if kind == "expired": outcome = "timeout"; raise LLMTimeoutError("Generation request timed out")
+                if kind == "error": raise RuntimeError(f"LLM worker error: {payload}")
+        finally:
+            self._finish(job_id, outcome)
+
+    def _stream(self, prompt, kwargs, timeout, stats):
+        job_id, deadline = self._submit(prompt, True, kwargs, timeout) # On first iteration, like LocalLLMGate
+        outcome = "abandoned"
+        try:
+            while True:
+                kind, payload = self._next_message(job_id, deadline)
+                if kind == "started": continue
+                if kind == "chunk": yield _chunk(payload); continue
+                if kind == "done": outcome = "ok"; stats.update(payload["stats"]); return
+                if kind == "expired": outcome = "timeout"; raise LLMTimeoutError("Generation request timed out")
+                if kind == "error": outcome = "error"; raise RuntimeError(f"LLM worker error: {payload}")
+        finally:
+            # An abandoned stream keeps its worker busy until max_tokens or the deadline; the router's
+            # "done"/"expired" message then finds no waiter and is dropped.
+            self._finish(job_id, outcome)
+
+    def stats(self):
+        return self.stats_.snapshot(workers=len(self._ready), mode="processes")
+
+    def close(self):
+        self._closed = True
+        for _ in self._workers: self._tasks.put(None)
+        for process in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive(): process.terminate()
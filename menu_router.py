@@ -0,0 +1,239 @@
+import json
+import re
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from knowledge_base.menu_store import load_menu_store, MenuStore, MENU_STORE_PATH
+
+# --- Configuration ---
+CURRENT_DIR = Path(__file__).resolve().parent # Assumes menu_router.py is in project root
+CONSOLIDATED_JSON_PATH = CURRENT_DIR / 'data' / 'consolidated_menu_items.json'
+LIST_LIMIT = 15 # Max items spelled out in a list answer
+
+# Query words -> canonical restaurant_name used by create_kb.py
+RESTAURANT_ALIASES = {
+    "McDonalds": ["mcdonalds", "mcdonald's", "mcdonald", "mc donalds", "mcd", "macd", "mcdelivery"],
+    "Dominos": ["dominos", "domino's", "domino"],
+    "Subway": ["subway"],
+    "Punjab Grill": ["punjab grill"],
+    "Oakaz": ["oakaz"],
+}
+VEG_TAGS = ("Vegetarian", "Vegetarian (Inferred)")
+NON_VEG_TAGS = ("Non-Vegetarian", "Non-Vegetarian (Inferred)")
+
+# Item-type words in a query -> (tag from standardize_tags, substrings matched against category / item name).
+# Only the item name decides an item's type: scraped categories are mixed (McDonalds' "Burgers With Millet Bun" holds
+# ketchup sachets and drinks) and the tag is inferred from the category. Items whose category or tag says the type but
+# whose name doesn't are ambiguous; a question that would have to include or exclude any of them is left to RAG.
+ITEM_TYPES = {
+    "dessert": (r"desserts?|sweets?", "Dessert", ("dessert", "cake", "cookie", "brownie", "ice cream", "sundae")),
+    "beverage": (r"beverages?|drinks?|coffees?|shakes?", "Beverage", ("beverage", "drink", "coffee", "shake", "tea")),
+    "side": (r"sides?|fries", "Side", ("side", "fries")),
+    "pizza": (r"pizzas?", None, ("pizza",)),
+    "burger": (r"burgers?", None, ("burger",)),
+    "wrap": (r"wraps?|rolls?", "Wrap/Roll", ("wrap", "roll")),
+    "combo": (r"combos?|meals?", "Combo/Meal", ("combo", "meal")),
+    "sandwich": (r"sandwich(?:es)?|subs\b", None, ("sandwich", "sub")),
+}
+
+# Price bounds: a comparison word followed by an amount. The amount may not be followed by a unit ("under 2 toppings",
+# "over 10 pieces"), and the bare max/min words need an explicit price context ("max ₹300", "max price 300"), so that
+# "max 2 toppings" is not read as a price. When several bounds of one kind appear, the last one wins.
+_CURRENCY = r"(?:rs\.?|inr|₹)"
+_NOT_UNIT = (r"(?!\s*(?:toppings?|pieces?|pcs?\b|items?|people|persons?|servings?|slices?|inch(?:es)?|cm\b|g\b|gms?\b|grams?|kg\b|"
+             r"ml\b|l\b|lit(?:er|re)s?|kcal|cal(?:orie)?s?\b|min(?:ute)?s?\b|hours?|hrs?\b|%))")
+_NUM = rf"{_CURRENCY}?\s*(\d+(?:\.\d+)?)\s*(?:rs\b|rupees?\b|/-)?{_NOT_UNIT}"
+_PRICE_NUM = rf"(?:price\s*(?:of\s*)?{_CURRENCY}?|{_CURRENCY})\s*(\d+(?:\.\d+)?)" # Amount with an explicit price/currency marker
+PRICE_BETWEEN_RE = re.compile(rf"between\s+{_NUM}\s*(?:and|-|to)\s+{_NUM}")
+PRICE_MAX_RES = [re.compile(rf"\b(?:under|below|less than|cheaper than|within|upto|up to|at most)\s*{_NUM}|<=?\s*{_NUM}"),
+                 re.compile(rf"\bmax(?:imum)?\s*{_PRICE_NUM}")]
+PRICE_MIN_RES = [re.compile(rf"\b(?:above|over|more than|greater than|costlier than|at least)\s*{_NUM}|>=?\s*{_NUM}"),
+                 re.compile(rf"\bmin(?:imum)?\s*{_PRICE_NUM}")]
+CHEAPEST_RE = re.compile(r"\b(?:cheapest|least expensive|lowest[- ]priced?|lowest price|most affordable)\b")
+PRICIEST_RE = re.compile(r"\b(?:most expensive|costliest|priciest|highest[- ]priced?|highest price)\b")
+COUNT_RE = re.compile(r"\bhow many\b|\bnumber of\b|\bcount\b")
+# Words a structured question may use besides its filters and the cheapest / priciest / count phrase. Anything else
+# left in the question ("calories", "phone", "people", an item name like "mcaloo tikki") means it asks about something
+# the column index can't answer (a specific item, an attribute, a situation), so it is left to RAG.
+FILLER_WORDS = frozenset("""a an the of in at on from for with to by and or but any all only just also
+    are is there do does have has had get can i we you they it its what whats s which total different
+    show me list give find tell please
+    menu menus item items dish dishes option options choice choices thing things food foods product products
+    available offered sold served offer offers sell sells serve serves priced cost costs costing
+    price prices rs inr rupee rupees""".split())
+NON_VEG_RE = re.compile(r"\bnon[\s-]?veg(?:etarian)?\b")
+VEG_RE = re.compile(r"\bveg(?:etarian|gie|gies)?\b")
+
+
+def parse_constraints(query):
+    """Extracts restaurant, veg/non-veg, price range and item type constraints from a free-text question."""
+    q = query.lower()
+    constraints = {"restaurant": None, "veg": None, "min_price": None, "max_price": None, "item_type": None}
+    for restaurant, aliases in RESTAURANT_ALIASES.items():
+        if any(re.search(rf"(?<![a-z]){re.escape(alias)}(?![a-z])", q) for alias in aliases):
+            constraints["restaurant"] = restaurant; break
+    if NON_VEG_RE.search(q): constraints["veg"] = False
+    elif VEG_RE.search(q): constraints["veg"] = True
+    between = PRICE_BETWEEN_RE.search(q)
+    if between:
+        low, high = sorted((float(between.group(1)), float(between.group(2))))
+        constraints["min_price"], constraints["max_price"] = low, high
+    else:
+        constraints["max_price"], constraints["min_price"] = _last_amount(PRICE_MAX_RES, q), _last_amount(PRICE_MIN_RES, q)
+    for item_type, (pattern, _, _) in ITEM_TYPES.items():
+        if re.search(rf"\b(?:{pattern})\b", q): constraints["item_type"] = item_type; break
+    return constraints
+
+
+def _last_amount(patterns, q):
+    """Amount of the right-most match of any of `patterns` in `q`, or None."""
+    matches = [m for pattern in patterns for m in pattern.finditer(q)]
+    if not matches: return None
+    last = max(matches, key=lambda m: m.start())
+    return float(next(g for g in last.groups() if g is not None))
+
+
+def _leftover_words(q):
+    """Words of a lowercased query not accounted for by a parsed filter, a cheapest / priciest / count phrase or FILLER_WORDS."""
+    patterns = [COUNT_RE, CHEAPEST_RE, PRICIEST_RE, NON_VEG_RE, VEG_RE, PRICE_BETWEEN_RE, *PRICE_MAX_RES, *PRICE_MIN_RES]
+    patterns += [re.compile(rf"(?<![a-z]){re.escape(alias)}(?![a-z])") for aliases in RESTAURANT_ALIASES.values() for alias in aliases]
+    patterns += [re.compile(rf"\b(?:{pattern})\b") for pattern, _, _ in ITEM_TYPES.values()]
+    for pattern in patterns: q = pattern.sub(" ", q)
+    return [w for w in re.findall(r"[a-z]+", q) if w not in FILLER_WORDS]
+
+
+class MenuColumnIndex:
+    """Columnar index over the consolidated menu: a MenuStore (dictionary-encoded restaurant/category codes, a
+    float price column with a price-sorted permutation, one tag bitset per item) plus item-type masks. The store is
+    the memory-mapped one create_kb.py writes, or built in memory from the JSON items (`from_json`)."""
+
+    def __init__(self, store):
+        """Wraps the store's columns without copying them; only item names are decoded."""
+        self.store = store
+        self.item_names = store.text_column("item_name")
+        self.restaurants, self.categories, self.tags = store.restaurants, store.categories, store.tags
+        self.restaurant_codes, self.category_codes, self.prices = store.restaurant_codes, store.category_codes, store.prices
+        self.tag_bits = store.tag_bits
+        self._build_type_masks()
+
+    def _build_type_masks(self):
+        tag_bit = {tag: np.uint32(1 << i) for i, tag in enumerate(self.tags)}
+        lower_categories = [c.lower() for c in self.categories]
+        lower_names = [n.lower() for n in self.item_names]
+        self._type_masks, self._ambiguous_type_masks = {}, {}
+        for item_type, (_, tag, substrings) in ITEM_TYPES.items():
+            name_hits = np.array([any(s in n for s in substrings) for n in lower_names], dtype=bool)
+            cat_hits = np.array([any(s in c for s in substrings) for c in lower_categories], dtype=bool)
+            hinted = cat_hits[self.category_codes]
+            if tag in tag_bit: hinted |= (self.tag_bits & tag_bit[tag]) != 0
+            self._type_masks[item_type] = name_hits
+            self._ambiguous_type_masks[item_type] = hinted & ~name_hits
+
+    @classmethod
+    def from_json(cls, path=CONSOLIDATED_JSON_PATH):
+        with open(path, 'r', encoding='utf-8') as f: return cls(MenuStore.from_items(json.load(f)))
+
+    def select(self, constraints, require_price=False):
+        """Returns row indices matching the constraints, ordered by ascending price (unpriced rows last).
+
+        Returns None when an item type was asked for and some otherwise matching rows are ambiguous for it.
+        """
+        rows = self.store.price_range(constraints.get("min_price"), constraints.get("max_price"))
+        if constraints.get("min_price") is None and constraints.get("max_price") is None and not require_price:
+            rows = np.concatenate([rows, np.flatnonzero(np.isnan(self.prices))])
+        mask = np.ones(len(rows), dtype=bool)
+        if constraints.get("restaurant") is not None:
+            if constraints["restaurant"] not in self.restaurants: return rows[:0]
+            mask &= self.restaurant_codes[rows] == self.restaurants.index(constraints["restaurant"])
+        if constraints.get("veg") is True: mask &= self.store.tag_mask(VEG_TAGS)[rows]
+        elif constraints.get("veg") is False: mask &= self.store.tag_mask(NON_VEG_TAGS)[rows]
+        if constraints.get("item_type") is not None:
+            if (mask & self._ambiguous_type_masks[constraints["item_type"]][rows]).any(): return None
+            mask &= self._type_masks[constraints["item_type"]][rows]
+        return self._dedupe(rows[mask])
+
+    def _dedupe(self, rows):
+        # The same item is often listed under several categories (esp. Dominos); keep its first (cheapest-ordered) row
+        seen = set(); keep = []
+        for row in rows.tolist():
+            key = (int(self.restaurant_codes[row]), self.item_names[row].strip().lower(), None if np.isnan(self.prices[row]) else float(self.prices[row]))
+            if key not in seen: seen.add(key); keep.append(row)
+        return np.array(keep, dtype=np.int64)
+
+    def describe(self, row):
+        price = self.prices[row]
+        price_str = f"₹{price:g}" if not np.isnan(price) else "price N/A"
+        return f"{self.item_names[row]} ({self.restaurants[self.restaurant_codes[row]]}, {self.categories[self.category_codes[row]]}) - {price_str}"
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Builds the column index on first use and shares it across threads."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                start = time.perf_counter()
+                store = None
+                try: store = load_menu_store(MENU_STORE_PATH, source_path=CONSOLIDATED_JSON_PATH)
+                except Exception as e: print(f"Warning: Could not open the menu store, parsing the JSON instead: {e}")
+                _index = MenuColumnIndex(store) if store is not None else MenuColumnIndex.from_json()
+                print(f"Built menu column index ({'menu store' if store is not None else 'JSON'}) over {len(_index.item_names)} items in {(time.perf_counter() - start) * 1000:.1f} ms.")
+    return _index
+
+
+def _describe_filters(c):
+    parts = []
+    if c["veg"] is True: parts.append("veg")
+    elif c["veg"] is False: parts.append("non-veg")
+    parts.append(f"{c['item_type']} items" if c["item_type"] else "items")
+    if c["min_price"] is not None and c["max_price"] is not None: parts.append(f"between ₹{c['min_price']:g} and ₹{c['max_price']:g}")
+    elif c["max_price"] is not None: parts.append(f"under ₹{c['max_price']:g}")
+    elif c["min_price"] is not None: parts.append(f"above ₹{c['min_price']:g}")
+    parts.append(f"at {c['restaurant']}" if c["restaurant"] else "across all restaurants")
+    return " ".join(parts)
+
+
+def route_query(query):
+    """Answers structured price/filter/count questions straight from the column index.
+
+    Returns the answer string, or None when the question is not a structured lookup (it should then go to RAG).
+    """
+    q = query.lower()
+    cheapest, priciest, count = CHEAPEST_RE.search(q), PRICIEST_RE.search(q), COUNT_RE.search(q)
+    c = parse_constraints(query)
+    has_price_range = c["min_price"] is not None or c["max_price"] is not None
+    if not (cheapest or priciest or count or has_price_range): return None
+    # Only pure filter questions are answered here: "is the McAloo Tikki under 100", "how many calories..." or
+    # "something for 2 people under 500" name something the index doesn't hold
+    if _leftover_words(q): return None
+    if count and not (cheapest or priciest):
+        has_filter = any(c[key] is not None for key in ("restaurant", "veg", "item_type")) or has_price_range
+        if not has_filter: return None
+
+    start = time.perf_counter()
+    index = get_index()
+    what = _describe_filters(c)
+    rows = index.select(c, require_price=bool(cheapest or priciest))
+    if rows is None:
+        print(f"  Item type '{c['item_type']}' is ambiguous for some matching items; leaving the question to RAG.")
+        return None
+    if cheapest or priciest:
+        if len(rows) == 0: answer = f"I couldn't find any priced {what} in the menus."
+        else:
+            pick = rows[0] if cheapest else rows[-1] # rows are sorted by ascending price
+            answer = f"The {'cheapest' if cheapest else 'most expensive'} of the {what} is {index.describe(pick)}."
+    elif count:
+        answer = f"There are {len(rows)} {what} in the menus."
+    else:
+        if len(rows) == 0: answer = f"I couldn't find any {what} in the menus."
+        else:
+            listed = "\n".join(f"- {index.describe(r)}" for r in rows[:LIST_LIMIT])
+            more = f"\n...and {len(rows) - LIST_LIMIT} more." if len(rows) > LIST_LIMIT else ""
+            answer = f"I found {len(rows)} {what} (cheapest first):\n{listed}{more}"
+    print(f"  Routed structured query ({(time.perf_counter() - start) * 1000:.1f} ms): {c}")
+    return answer
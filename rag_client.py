@@ -0,0 +1,29 @@
+import json
+import os
+import httpx
+
+# --- Client for serve_api.py, so a UI can use a remote, already-warm RAG backend ---
+RAG_BACKEND_URL = os.environ.get("RAG_BACKEND_URL") # e.g. http://127.0.0.1:8000; unset = run the engine in-process
+CONNECT_TIMEOUT_S = 10
+READ_TIMEOUT_S = 180 # Longest gap between streamed events (covers waiting in the backend's LLM queue)
+
+
+def stream_remote(query, top_k=5, stats=None, base_url=RAG_BACKEND_URL):
+    """Same contract as chatbot_app.stream_rag_response, but over the backend's /query/stream SSE endpoint."""
+    timeout = httpx.Timeout(CONNECT_TIMEOUT_S, read=READ_TIMEOUT_S)
+    try:
+        with httpx.stream("POST", f"{base_url.rstrip('/')}/query/stream", json={"query": query, "top_k": top_k}, timeout=timeout) as response:
+            if response.status_code != 200:
+                response.read()
+                yield f"Sorry, the chatbot backend is unavailable ({response.status_code}: {response.text[:200]})."; return
+            event = None
+            for line in response.iter_lines():
+                if line.startswith("event:"): event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "token": yield data["text"]
+                    elif event == "done" and stats is not None: stats.update(data)
+                    elif event == "error": yield f"Sorry, the chatbot backend reported an error: {data.get('detail')}"
+    except httpx.HTTPError as e:
+        print(f"Error contacting RAG backend at {base_url}: {e}")
+        yield "Sorry, I couldn't reach the chatbot backend. Please try again later."
@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --- Per-stage tracing and metrics for the RAG request path ---
+# Off by default. Enable with RAG_TRACING=1; optionally
+#   RAG_TRACE_LOG=traces.jsonl   -> one JSON line per request (stage timings, token counts, retrieved IDs, cache hits)
+#   RAG_METRICS_PORT=9464        -> Prometheus text endpoint at http://127.0.0.1:9464/metrics
+TRACING_ENABLED = os.environ.get("RAG_TRACING") == "1"
+TRACE_LOG_PATH = os.environ.get("RAG_TRACE_LOG")
+METRICS_PORT = int(os.environ["RAG_METRICS_PORT"]) if os.environ.get("RAG_METRICS_PORT") else None
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]: i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled histograms and counters, rendered as Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {} # (name, labels) -> Histogram
+        self._counters = {}   # (name, labels) -> float
+        self._gauges = {}     # (name, labels) -> last value set
+        self._help = {}
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None: histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+            if help: self._help.setdefault(name, help)
+
+    def inc(self, name, amount=1, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            if help: self._help.setdefault(name, help)
+
+    def set_gauge(self, name, value, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+            if help: self._help.setdefault(name, help)
+
+    def render_prometheus(self):
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+        lines, seen = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help: lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{fmt_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help: lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name}{fmt_labels(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help: lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{fmt_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{fmt_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class _NoopSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+
+class _NoopTrace:
+    """Returned when tracing is off: every call is an empty method, so instrumented code pays next to nothing."""
+    _span = _NoopSpan()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def span(self, stage): return self._span
+    def record(self, stage, seconds): pass
+    def set(self, **attrs): pass
+
+
+NOOP_TRACE = _NoopTrace()
+
+
+class _Span:
+    def __init__(self, trace, stage):
+        self.trace, self.stage = trace, stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        self.trace.spans[self.stage] = self.trace.spans.get(self.stage, 0.0) + duration
+        return False
+
+
+class Trace:
+    """One request: named stage spans plus free-form attributes, published when the `with` block exits."""
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer, self.name = tracer, name
+        self.attrs = dict(attrs)
+        self.spans = {}
+
+    def __enter__(self):
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None: self.attrs.setdefault("outcome", "error"); self.attrs["error"] = repr(exc)
+        self.tracer._publish(self)
+        return False
+
+    def span(self, stage):
+        return _Span(self, stage)
+
+    def record(self, stage, seconds):
+        """Adds a stage duration measured elsewhere (e.g. inside an LLM worker process)."""
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    def __init__(self, enabled=TRACING_ENABLED, log_path=TRACE_LOG_PATH):
+        self.enabled = enabled
+        self.metrics = MetricsRegistry()
+        self._log_path = log_path
+        self._log_file = None
+        self._log_lock = threading.Lock()
+
+    def trace(self, name, **attrs):
+        """Context manager for one request; a shared no-op object when tracing is disabled."""
+        if not self.enabled: return NOOP_TRACE
+        return Trace(self, name, attrs)
+
+    def _publish(self, trace):
+        outcome = trace.attrs.get("outcome", "ok")
+        m = self.metrics
+        m.inc("rag_requests_total", help="RAG requests by entry point and outcome.", entrypoint=trace.name, outcome=outcome)
+        m.observe("rag_request_duration_seconds", trace.duration, help="End-to-end request latency.", entrypoint=trace.name, outcome=outcome)
+        for stage, seconds in trace.spans.items():
+            m.observe("rag_stage_duration_seconds", seconds, help="Latency of each RAG stage.", stage=stage)
+        for key in ("prompt_tokens", "completion_tokens"):
+            if trace.attrs.get(key) is not None:
+                m.observe(f"rag_{key}", trace.attrs[key], buckets=TOKEN_BUCKETS, help=f"{key.replace('_', ' ').capitalize()} per generation.")
+        if "cache_hit" in trace.attrs:
+            m.inc("rag_answer_cache_total", help="Semantic answer cache lookups.", result="hit" if trace.attrs["cache_hit"] else "miss")
+        if self._log_path: self._write_jsonl(trace, outcome)
+
+    def _write_jsonl(self, trace, outcome):
+        record = {"ts": trace.start_wall, "entrypoint": trace.name, "outcome": outcome, "duration_s": round(trace.duration, 6),
+                  "spans": {stage: round(s, 6) for stage, s in trace.spans.items()},
+                  "attrs": {k: v for k, v in trace.attrs.items() if k != "outcome"}}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._log_lock:
+            try:
+                if self._log_file is None: self._log_file = open(self._log_path, 'a', encoding='utf-8')
+                self._log_file.write(line + "\n"); self._log_file.flush()
+            except Exception as e: print(f"Warning: Could not write trace log {self._log_path}: {e}")
+
+
+tracer = Tracer() # Shared by every request in this process
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host='127.0.0.1'):
+    """Serves tracer.metrics as Prometheus text at /metrics in a daemon thread (once per process).
+
+    Returns the server, or None when no port is configured or tracing is off.
+    """
+    global _metrics_server
+    if port is None or not tracer.enabled: return None
+    with _metrics_server_lock:
+        if _metrics_server is not None: return _metrics_server
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics': self.send_error(404); return
+                body = tracer.metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): pass
+
+        try: _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e: print(f"Warning: Could not start metrics endpoint on {host}:{port}: {e}"); return None
+        threading.Thread(target=_metrics_server.serve_forever, name="rag-metrics", daemon=True).start()
+        print(f"Serving RAG metrics at http://{host}:{port}/metrics")
+    return _metrics_server
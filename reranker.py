@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+# --- Cross-encoder reranking of retrieved candidates under a latency budget ---
+# The model is loaded on first use. Scoring cost per (query, document) pair is tracked as an exponential moving
+# average, so each request predicts its cost up front: only as many candidates as fit the budget are scored,
+# and the stage is skipped when not even `top_n` fit. After PROBE_AFTER_SKIPS consecutive skips one request is
+# reranked anyway, so the estimate recovers once a load spike is over.
+PROBE_AFTER_SKIPS = 20
+EMA_ALPHA = 0.2
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name, budget_s=0.3, max_cache_entries=20000, batch_size=32):
+        self.model_name = model_name
+        self.budget_s = budget_s
+        self.batch_size = batch_size
+        self.max_cache_entries = max_cache_entries
+        self.error = None
+        self._model = None
+        self._pair_cost_s = None # EMA of seconds per scored pair; None until the first batch
+        self._skips = 0
+        self._scores = OrderedDict() # (normalized query, doc id) -> score, LRU order
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        if self._model is not None or self.error: return self._model
+        with self._load_lock:
+            if self._model is None and not self.error:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    start = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                    print(f"Loaded cross-encoder '{self.model_name}' in {time.perf_counter() - start:.2f}s")
+                except Exception as e:
+                    self.error = f"Could not load cross-encoder '{self.model_name}': {e}"
+                    print(f"Warning: {self.error}; reranking disabled.")
+        return self._model
+
+    @staticmethod
+    def _query_key(query):
+        return " ".join(query.lower().split())
+
+    def rerank(self, query, ids, documents, metadatas, top_n, stats=None):
+        """Reorders the candidates by cross-encoder score and returns the best `top_n` (ids, documents, metadatas).
+
+        Candidates beyond what the budget allows keep their retrieval order after the scored ones. If a
+        `stats` dict is passed, the outcome ("reranked", "skipped" or "unavailable") and counts are stored in it.
+        """
+        stats = stats if stats is not None else {}
+        fallback = (ids[:top_n], documents[:top_n], metadatas[:top_n])
+        if len(ids) <= 1: stats["outcome"] = "skipped"; return fallback
+        if self._load() is None: stats["outcome"] = "unavailable"; return fallback
+
+        key = self._query_key(query)
+        with self._lock:
+            scores = {doc_id: self._scores[(key, doc_id)] for doc_id in ids if (key, doc_id) in self._scores}
+            for doc_id in scores: self._scores.move_to_end((key, doc_id))
+            affordable = len(ids) if self._pair_cost_s is None else int(self.budget_s / self._pair_cost_s)
+            probe = self._skips >= PROBE_AFTER_SKIPS
+        # Score the best-ranked uncached candidates that fit the budget; cached ones are free
+        uncached = [n for n, doc_id in enumerate(ids) if doc_id not in scores][:max(affordable, 0) if not probe else top_n]
+        if len(scores) + len(uncached) < min(top_n, len(ids)) and not probe:
+            with self._lock: self._skips += 1
+            stats.update(outcome="skipped", reason="budget", estimated_pair_ms=round(self._pair_cost_s * 1000, 3))
+            return fallback
+
+        if uncached:
+            start = time.perf_counter()
+            predicted = self._model.predict([(query, documents[n]) for n in uncached], batch_size=self.batch_size, show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                cost = elapsed / len(uncached)
+                self._pair_cost_s = cost if self._pair_cost_s is None else (1 - EMA_ALPHA) * self._pair_cost_s + EMA_ALPHA * cost
+                for n, score in zip(uncached, predicted):
+                    scores[ids[n]] = float(score)
+                    self._scores[(key, ids[n])] = float(score)
+                while len(self._scores) > self.max_cache_entries: self._scores.popitem(last=False)
+            stats["score_s"] = elapsed
+        with self._lock: self._skips = 0
+
+        scored = sorted((n for n, doc_id in enumerate(ids) if doc_id in scores), key=lambda n: scores[ids[n]], reverse=True) # Stable on ties
+        order = (scored + [n for n, doc_id in enumerate(ids) if doc_id not in scores])[:top_n]
+        stats.update(outcome="reranked", candidates=len(ids), scored=len(uncached), cached=len(scores) - len(uncached))
+        return [ids[n] for n in order], [documents[n] for n in order], [metadatas[n] for n in order]
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+import httpx
+
+# --- Shared async fetch layer for the static-HTML (requests/BeautifulSoup) scrapers ---
+script_location = Path(__file__).resolve().parent
+project_root = script_location.parent
+CACHE_DIR = project_root / 'data' / '.http_cache' # ETag / Last-Modified validators + cached bodies
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+MAX_CONNECTIONS = 20      # Pooled connections across all hosts
+PER_HOST_LIMIT = 4        # Concurrent requests per host (be polite to small restaurant sites)
+RETRIES = 3               # Retries after the first attempt, on network errors and retryable statuses
+BACKOFF_BASE = 0.5        # Seconds; doubled per retry, plus jitter
+TIMEOUT = 20              # Seconds per request
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# When set (e.g. http://127.0.0.1:8765), https://host/path is fetched from <base>/host/path instead,
+# i.e. from scraper/fixture_server.py serving recorded pages. Used for offline runs and checks.
+FIXTURE_BASE_URL = os.environ.get("SCRAPER_FIXTURE_BASE_URL")
+# When set to 1, every freshly fetched page is also saved under scraper/fixtures for the stand-in to serve.
+RECORD_FIXTURES = os.environ.get("SCRAPER_RECORD_FIXTURES") == "1"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    content: bytes
+    not_modified: bool = False # True when the server answered 304: the cached body is returned and need not be reparsed
+    attempts: int = 1
+    elapsed: float = 0.0
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+
+class ValidatorCache:
+    """On-disk cache of ETag/Last-Modified validators and the last body seen for each URL."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.index_path = self.cache_dir / 'index.json'
+        self.index = {}
+        if self.index_path.is_file():
+            try: self.index = json.loads(self.index_path.read_text(encoding='utf-8'))
+            except Exception as e: print(f"Warning: Ignoring unreadable HTTP cache index {self.index_path}: {e}")
+
+    def _body_path(self, url):
+        return self.cache_dir / (hashlib.sha1(url.encode('utf-8')).hexdigest() + '.body')
+
+    def conditional_headers(self, url):
+        entry = self.index.get(url)
+        if not entry or not self._body_path(url).is_file(): return {}
+        headers = {}
+        if entry.get('etag'): headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'): headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def cached_body(self, url):
+        return self._body_path(url).read_bytes()
+
+    def store(self, url, response):
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if not etag and not last_modified: return # Nothing to revalidate with next time
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._body_path(url).write_bytes(response.content)
+        self.index[url] = {'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time()}
+
+    def save(self):
+        if not self.index: return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path.write_text(json.dumps(self.index, indent=2), encoding='utf-8')
+
+
+class AsyncFetcher:
+    """Pooled asyncio HTTP client with per-host concurrency limits, retries with backoff and conditional GETs."""
+
+    def __init__(self, headers=None, max_connections=MAX_CONNECTIONS, per_host_limit=PER_HOST_LIMIT, retries=RETRIES,
+                 backoff_base=BACKOFF_BASE, timeout=TIMEOUT, cache_dir=CACHE_DIR, use_cache=True, fixture_base_url=FIXTURE_BASE_URL):
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.cache = ValidatorCache(cache_dir) if use_cache else None
+        self.fixture_base_url = fixture_base_url.rstrip('/') if fixture_base_url else None
+        self._host_semaphores = {}
+        self._client = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(headers=self.headers, limits=self.limits, timeout=self.timeout, follow_redirects=True)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+        if self.cache is not None: self.cache.save()
+
+    def _request_url(self, url):
+        if not self.fixture_base_url: return url
+        parts = urlsplit(url)
+        return f"{self.fixture_base_url}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+
+    def _semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_semaphores: self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit(): return float(retry_after)
+        return self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+
+    async def fetch(self, url):
+        """GETs `url`; returns a FetchResult or raises the last error once retries are exhausted."""
+        headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+        start = time.perf_counter()
+        async with self._semaphore(url):
+            for attempt in range(self.retries + 1):
+                response = None
+                try:
+                    response = await self._client.get(self._request_url(url), headers=headers)
+                    if response.status_code == 304 and self.cache is not None:
+                        return FetchResult(url, 304, self.cache.cached_body(url), not_modified=True, attempts=attempt + 1, elapsed=time.perf_counter() - start)
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        if self.cache is not None: self.cache.store(url, response)
+                        if RECORD_FIXTURES and not self.fixture_base_url:
+                            from fixture_server import record_fixture
+                            print(f"  Recorded fixture {record_fixture(url, response.content)}")
+                        return FetchResult(url, response.status_code, response.content, attempts=attempt + 1, elapsed=time.perf_counter() - start)
+                    error = httpx.HTTPStatusError(f"Retryable status {response.status_code} for {url}", request=response.request, response=response)
+                except httpx.TransportError as e:
+                    error = e
+                if attempt == self.retries: raise error
+                delay = self._backoff(attempt, response)
+                print(f"  Fetch attempt {attempt + 1} for {url} failed ({error}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def fetch_all(self, urls):
+        """Fetches all URLs concurrently; failed URLs map to their exception instead of a FetchResult."""
+        results = await asyncio.gather(*(self.fetch(url) for url in urls), return_exceptions=True)
+        return dict(zip(urls, results))
+
+
+def fetch_pages(urls, **fetcher_kwargs):
+    """Synchronous entry point for the scraper scripts: {url: FetchResult | Exception}."""
+    async def run():
+        async with AsyncFetcher(**fetcher_kwargs) as fetcher: return await fetcher.fetch_all(list(urls))
+    return asyncio.run(run())
+
+
+def fetch_page(url, **fetcher_kwargs):
+    """Fetches one page; raises on failure like requests' raise_for_status()."""
+    result = fetch_pages([url], **fetcher_kwargs)[url]
+    if isinstance(result, Exception): raise result
+    return result
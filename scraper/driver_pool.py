@@ -0,0 +1,202 @@
+from selenium import webdriver
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import queue
+import threading
+import time
+
+# --- Shared scraping runtime for the Selenium scrapers (McDonalds, Dominos, Oakaz) ---
+MAX_DRIVERS = 4       # Upper bound on concurrent headless Chrome instances
+WAIT_TIMEOUT = 15     # Seconds for explicit waits before giving up
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path():
+    """Runs ChromeDriverManager().install() once per process and reuses the resolved path."""
+    global _driver_path
+    if _driver_path is None:
+        with _driver_path_lock:
+            if _driver_path is None:
+                _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
+
+def new_driver():
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    return webdriver.Chrome(service=Service(get_driver_path()), options=chrome_options)
+
+
+def wait_for_page_ready(driver, timeout=WAIT_TIMEOUT):
+    """Waits until the document has finished loading."""
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script("return document.readyState") == "complete")
+
+
+def wait_for_text_stable(driver, timeout=WAIT_TIMEOUT, stable_for=0.75, poll=0.25):
+    """Waits until document.body.innerText stops changing (client-side rendering has settled).
+
+    Replaces the fixed time.sleep(3) calls: returns as soon as the page is stable instead of always waiting.
+    Returns the final innerText (also on timeout, so callers can still parse what rendered).
+    """
+    deadline = time.monotonic() + timeout
+    last_text, last_change = None, time.monotonic()
+    while True:
+        text = driver.execute_script("return document.body ? document.body.innerText : '';")
+        now = time.monotonic()
+        if text != last_text: last_text, last_change = text, now
+        elif text and now - last_change >= stable_for: return text
+        if now >= deadline: return text
+        time.sleep(poll)
+
+
+def load_full_page_text(driver, max_scrolls=60, timeout=WAIT_TIMEOUT):
+    """Scrolls to the bottom in viewport steps so lazily rendered sections mount, then returns the settled innerText."""
+    last_height = -1
+    for _ in range(max_scrolls):
+        height = driver.execute_script("window.scrollBy(0, window.innerHeight); return document.body.scrollHeight;")
+        at_bottom = driver.execute_script("return window.innerHeight + window.scrollY >= document.body.scrollHeight - 2;")
+        if at_bottom and height == last_height: break
+        last_height = height
+        time.sleep(0.1) # Give intersection observers a tick to fire
+    driver.execute_script("window.scrollTo(0, 0);")
+    return wait_for_text_stable(driver, timeout=timeout)
+
+
+def partition_sections(lines, section_names, is_item_line):
+    """Splits one innerText capture into per-section line slices.
+
+    Section names usually appear twice: once in the category nav bar and once as the section heading.
+    Every exact-match line is treated as a potential boundary, and for each name the span holding the
+    most item lines (per `is_item_line`) wins, which skips the item-less nav entries.
+    Returns {section_name: lines}; names with no item-bearing span are omitted.
+    """
+    wanted = {name.strip(): name for name in section_names}
+    boundaries = [(i, wanted[line.strip()]) for i, line in enumerate(lines) if line.strip() in wanted]
+    best = {}
+    for n, (start, name) in enumerate(boundaries):
+        end = boundaries[n + 1][0] if n + 1 < len(boundaries) else len(lines)
+        item_count = sum(1 for line in lines[start:end] if is_item_line(line))
+        if item_count and item_count > best.get(name, (0, None))[0]: best[name] = (item_count, lines[start:end])
+    return {name: span for name, (_, span) in best.items()}
+
+
+def safe_click(driver, by, value, timeout=10):
+    """Safely scroll to and click an element, waiting for it to become clickable."""
+    try:
+        element = WebDriverWait(driver, timeout).until(EC.element_to_be_clickable((by, value)))
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+        try: element.click()
+        except Exception: driver.execute_script("arguments[0].click();", element) # Fallback when an overlay intercepts the click
+        return True
+    except TimeoutException:
+        return False
+    except Exception:
+        return False
+
+
+def reset_driver(driver):
+    """Returns a used driver to a clean state: extra windows closed, web storage and cookies cleared, blank page."""
+    for handle in driver.window_handles[1:]:
+        driver.switch_to.window(handle); driver.close()
+    driver.switch_to.window(driver.window_handles[0])
+    driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}") # Current origin only
+    driver.delete_all_cookies()
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {}) # delete_all_cookies only reaches the current domain
+    driver.get("about:blank")
+
+
+class DriverPool:
+    """A bounded pool of long-lived headless Chrome drivers shared by scraping jobs.
+
+    Drivers are reset (reset_driver) before going back to the pool, so no job sees another's cookies or storage.
+    """
+
+    def __init__(self, size=MAX_DRIVERS):
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _acquire(self):
+        while True:
+            try: return self._idle.get_nowait()
+            except queue.Empty: pass
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create: self._created += 1
+            if can_create:
+                try: driver = new_driver()
+                except Exception:
+                    with self._lock: self._created -= 1
+                    raise
+                with self._lock: self._all.append(driver)
+                return driver
+            # Pool is full: wait for a free driver, re-checking now and then in case one was discarded
+            try: return self._idle.get(timeout=1)
+            except queue.Empty: pass
+
+    @contextmanager
+    def driver(self):
+        """Borrows a driver (creating one if the pool is not full yet, else waiting for a free one)."""
+        driver = self._acquire()
+        healthy = True
+        try:
+            yield driver
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            if healthy:
+                try: reset_driver(driver)
+                except Exception: healthy = False
+            if healthy: self._idle.put(driver)
+            else: self._discard(driver) # A job failed mid-page or the reset failed; don't hand a possibly wedged browser to the next job
+
+    def _discard(self, driver):
+        with self._lock:
+            self._created -= 1
+            if driver in self._all: self._all.remove(driver)
+        try: driver.quit()
+        except Exception: pass
+
+    def close(self):
+        with self._lock: drivers, self._all = self._all, []
+        for driver in drivers:
+            try: driver.quit()
+            except Exception: pass
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+def run_jobs(jobs, pool_size=MAX_DRIVERS):
+    """Runs scraping jobs across a shared driver pool.
+
+    `jobs` maps a key to (func, args); each func is called as func(*args, driver=driver).
+    Returns (results, failures): results maps key -> return value, failures maps key -> exception.
+    """
+    results, failures = {}, {}
+    get_driver_path() # Resolve the driver once up front instead of racing in every worker
+    start = time.perf_counter()
+    with DriverPool(size=min(pool_size, len(jobs)) or 1) as pool:
+        def run(key, func, args):
+            with pool.driver() as driver: return func(*args, driver=driver)
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = {executor.submit(run, key, func, args): key for key, (func, args) in jobs.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try: results[key] = future.result()
+                except Exception as e: failures[key] = e
+    print(f"Finished {len(jobs)} scraping jobs on {pool.size} drivers in {time.perf_counter() - start:.1f}s ({len(failures)} failed).")
+    return results, failures
@@ -0,0 +1,100 @@
+import argparse
+import hashlib
+import tempfile
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# --- Local HTTP stand-in serving recorded pages for the static-HTML scrapers ---
+# A page recorded from https://host/some/path lives at <fixture_dir>/host/some/path/index.html.
+# Point the fetch layer at it with SCRAPER_FIXTURE_BASE_URL=http://127.0.0.1:<port>.
+script_location = Path(__file__).resolve().parent
+FIXTURE_DIR = script_location / 'fixtures'
+
+
+def fixture_path(fixture_dir, url_or_path):
+    """Maps https://host/path (or /host/path as requested from this server) to its fixture file."""
+    parts = urlsplit(url_or_path)
+    rel = (parts.netloc + parts.path) if parts.netloc else parts.path.lstrip('/')
+    return Path(fixture_dir) / rel.strip('/') / 'index.html'
+
+
+def record_fixture(url, content, fixture_dir=FIXTURE_DIR):
+    """Saves a fetched page so the stand-in can serve it later."""
+    path = fixture_path(fixture_dir, url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content if isinstance(content, bytes) else content.encode('utf-8'))
+    return path
+
+
+def make_handler(fixture_dir):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = fixture_path(fixture_dir, self.path)
+            if not path.is_file():
+                self.send_error(404, f"No fixture recorded for {self.path}"); return
+            body = path.read_bytes()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            mtime = int(path.stat().st_mtime)
+            # Conditional GET support, so the fetch layer's ETag / Last-Modified caching can be exercised
+            not_modified = self.headers.get('If-None-Match') == etag
+            since = self.headers.get('If-Modified-Since')
+            if not not_modified and since and not self.headers.get('If-None-Match'):
+                try: not_modified = int(parsedate_to_datetime(since).timestamp()) >= mtime
+                except (TypeError, ValueError): pass
+            self.send_response(304 if not_modified else 200)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+            if not_modified: self.end_headers(); return
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args): pass # Keep scraper output readable
+    return FixtureHandler
+
+
+def serve_fixtures(fixture_dir=FIXTURE_DIR, host='127.0.0.1', port=0):
+    """Starts the stand-in in a daemon thread; returns (server, base_url). Call server.shutdown() to stop."""
+    server = ThreadingHTTPServer((host, port), make_handler(fixture_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def self_check():
+    """Exercises the fetch layer end to end against the stand-in: first GET returns 200, the repeat is a 304."""
+    from async_fetch import fetch_pages
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        url = "https://example.test/menu/"
+        record_fixture(url, "<html><body><h2>Subs</h2><h4>Veggie Delite</h4><p>₹150</p></body></html>", tmp / 'fixtures')
+        server, base_url = serve_fixtures(tmp / 'fixtures')
+        try:
+            kwargs = dict(cache_dir=tmp / 'cache', fixture_base_url=base_url)
+            first = fetch_pages([url], **kwargs)[url]
+            second = fetch_pages([url], **kwargs)[url]
+            missing = fetch_pages(["https://example.test/missing/"], retries=0, **kwargs)["https://example.test/missing/"]
+        finally:
+            server.shutdown()
+    assert not isinstance(first, Exception) and first.status == 200 and not first.not_modified, first
+    assert not isinstance(second, Exception) and second.not_modified and second.content == first.content, second
+    assert isinstance(missing, Exception), missing
+    print("Fixture self-check passed: 200 on first fetch, 304 (cached body) on repeat, 404 surfaced as an error.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded scraper fixtures over HTTP.")
+    parser.add_argument("--dir", default=str(FIXTURE_DIR), help="Fixture directory (default: scraper/fixtures)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--self-check", action="store_true", help="Run the fetch-layer check against a temporary fixture and exit.")
+    args = parser.parse_args()
+    if args.self_check:
+        self_check()
+    else:
+        server, base_url = serve_fixtures(args.dir, port=args.port)
+        print(f"Serving fixtures from {args.dir} at {base_url} (set SCRAPER_FIXTURE_BASE_URL={base_url}). Ctrl+C to stop.")
+        try: threading.Event().wait()
+        except KeyboardInterrupt: server.shutdown()
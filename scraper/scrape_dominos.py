@@ -1,103 +1,100 @@
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException # Added import
-from selenium.webdriver.chrome.service import Service # Added import
-import time
 import json
 from pathlib import Path # Added import
+from driver_pool import new_driver, safe_click, wait_for_page_ready, wait_for_text_stable, load_full_page_text, partition_sections, run_jobs
 
 # Define Restaurant Constant
 RESTAURANT_NAME = "Dominos Pizza"
 LOCATION_INFO = "Store ID 6585R (from URL)"
 NOTES = "Extracted using innerText parsing with category/filter clicks. Data fragility expected. Veg/Non-Veg based on filter only."
 URL = 'https://pizzaonline.dominos.co.in/jfl-discovery-ui/en/web/menu-v1/6585R?&showSearchModal=false&scrollTo=2'
+# 'per_mode': load each Veg/Non-Veg view once and split its text into categories locally (2 page loads).
+# 'per_category': original behaviour, one page load + category click per category x mode.
+SCRAPE_STRATEGY = 'per_mode'
 
 
-def safe_click(driver, by, value):
-    """Safely scroll and click an element."""
-    # Original safe_click code
-    try:
-        wait = WebDriverWait(driver, 10)
-        element = wait.until(EC.element_to_be_clickable((by, value)))
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
-        time.sleep(0.5)
-        element.click()
-        return True
-    except TimeoutException: # Explicitly catch TimeoutException
-        return False
-    except Exception: # Catch other exceptions
-        return False
-
-
-def get_items(category_name, mode='Veg Only', debug = False):
-    # Original get_items code exactly as provided by user
-    url = 'https://pizzaonline.dominos.co.in/jfl-discovery-ui/en/web/menu-v1/6585R?&showSearchModal=false&scrollTo=2'
+def parse_page_text(page_text, category_name):
+    """Original innerText parsing logic, applied to a full page or to one category's slice of it."""
     data = []
-    # Use Service object
-    service = Service(ChromeDriverManager().install())
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    driver = None # Initialize driver
+    i = 0
+    while i < len(page_text):
+        # Original parsing logic
+        if page_text[i].startswith("Rs."):
+            if category_name == '5 Course Lunch Feast':
+                name = page_text[i-3] if (i-3) >= 0 else "Unknown"
+                description = page_text[i-2] if (i-2) >= 0 else "Unknown"
+                price = page_text[i]
+            else:
+                name = page_text[i-2] if (i-2) >= 0 else "Unknown"
+                description = page_text[i-1] if (i-1) >= 0 else "Unknown"
+                price = page_text[i]
+
+            temp_data = {"name": name, "description": description, "price": price}
+            data.append(temp_data)
+
+            # Original skip logic
+            if (i + 3 < len(page_text)) and (page_text[i+2].startswith('Save Rs.') or page_text[i+2] == 'Add +'):
+                i += 3
+            else:
+                i += 1
+        else:
+            i += 1
+    return data
+
+
+def get_items(category_name, mode='Veg Only', debug = False, driver=None):
+    # Original get_items parsing code; the driver now comes from the shared pool (or is created if not given)
+    url = URL
+    data = []
+    owns_driver = driver is None
     try:
-        # Pass service object
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        if owns_driver: driver = new_driver()
 
         driver.get(url)
-        wait = WebDriverWait(driver, 10)
+        wait_for_page_ready(driver)
 
         # Select mode (Veg/Non-Veg)
         safe_click(driver, By.XPATH, f"//*[contains(text(), '{mode}')]")
-        time.sleep(3)
+        wait_for_text_stable(driver) # Explicit wait for the filtered menu to render (was time.sleep(3))
 
         # Select category
         success = safe_click(driver, By.XPATH, f"//*[contains(text(), '{category_name}')]")
         if not success:
             print(f"⚠️ Category button '{category_name}' not found in mode '{mode}'.") if debug == True else None
-            if driver: driver.quit() # Quit driver if category click fails
             return []
-        time.sleep(3)
+        wait_for_text_stable(driver) # Explicit wait for the category section to render (was time.sleep(3))
 
         # Get page text
         page_text = driver.execute_script("return document.body.innerText;").split('\n')
-        i = 0
-        while i < len(page_text):
-            # Original parsing logic
-            if page_text[i].startswith("Rs."):
-                if category_name == '5 Course Lunch Feast':
-                    name = page_text[i-3] if (i-3) >= 0 else "Unknown"
-                    description = page_text[i-2] if (i-2) >= 0 else "Unknown"
-                    price = page_text[i]
-                else:
-                    name = page_text[i-2] if (i-2) >= 0 else "Unknown"
-                    description = page_text[i-1] if (i-1) >= 0 else "Unknown"
-                    price = page_text[i]
-
-                temp_data = {"name": name, "description": description, "price": price}
-                data.append(temp_data)
-
-                # Original skip logic
-                if (i + 3 < len(page_text)) and (page_text[i+2].startswith('Save Rs.') or page_text[i+2] == 'Add +'):
-                    i += 3
-                else:
-                    i += 1
-            else:
-                i += 1
+        data = parse_page_text(page_text, category_name)
 
     # Added broad exception catch as in original
     except Exception as e:
         print(f"  Error during scraping for {category_name} ({mode}): {e}")
     finally:
-        if driver: # Check if driver was initialized
+        if owns_driver and driver: # Pooled drivers are returned to the pool, not quit
             driver.quit()
 
     return data
 
+
+def get_items_by_mode(category_names, mode='Veg Only', driver=None):
+    """Loads the menu once for a Veg/Non-Veg mode, scrolls every category section into view and
+    partitions that single innerText capture into {category: items}. Categories without a
+    section in the capture are left out so the caller can fall back to get_items."""
+    owns_driver = driver is None
+    try:
+        if owns_driver: driver = new_driver()
+        driver.get(URL)
+        wait_for_page_ready(driver)
+        safe_click(driver, By.XPATH, f"//*[contains(text(), '{mode}')]")
+        wait_for_text_stable(driver)
+        page_text = load_full_page_text(driver).split('\n')
+        sections = partition_sections(page_text, category_names, is_item_line=lambda line: line.startswith("Rs."))
+        return {cat: parse_page_text(lines, cat) for cat, lines in sections.items()}
+    finally:
+        if owns_driver and driver: driver.quit()
+
 # ===========================================================
 # Main Script (Original structure and variable names kept)
 # ===========================================================
@@ -112,40 +109,41 @@ all_cats = [
 ]
 special_cats = ['Desserts', 'Beverages']
 
-# Original loops
+# Category x mode jobs (output key -> (func, args)); run in parallel on a shared pool of long-lived drivers
+jobs = {}
 for cat in all_cats:
-    print(f'Processing {cat} in Veg...')
-    try:
-        veg_items = get_items(cat) # Default mode is 'Veg Only'
-        if cat not in dominos_data:
-            dominos_data[cat] = {}
-        dominos_data[cat]['Veg Only'] = veg_items
-    except Exception as e:
-        print(f'Failed {cat} in Veg with error: {e}')
-        failed_categories.append(f'VEG - {cat}')
-    time.sleep(1)
-
-    print(f'Processing {cat} in Non-Veg...')
-    try:
-        non_veg_items = get_items(cat, mode='Non Veg Only') # Explicitly pass mode
+    jobs[(cat, 'Veg Only')] = (get_items, (cat,)) # Default mode is 'Veg Only'
+    jobs[(cat, 'Non Veg Only')] = (get_items, (cat, 'Non Veg Only'))
+for special_cat in special_cats:
+    jobs[(special_cat, 'Veg Only')] = (get_items, (special_cat,)) # Original key used for special categories
+
+results, failures = {}, {}
+if SCRAPE_STRATEGY == 'per_mode':
+    # One page load per mode; the special categories are read from the default 'Veg Only' view, as in the original script
+    mode_jobs = {'Veg Only': (get_items_by_mode, (all_cats + special_cats, 'Veg Only')), 'Non Veg Only': (get_items_by_mode, (all_cats, 'Non Veg Only'))}
+    print(f'Processing {len(mode_jobs)} mode pages...')
+    mode_results, mode_failures = run_jobs(mode_jobs)
+    for mode, error in mode_failures.items(): print(f'Failed to load {mode} page with error: {error}')
+    for (cat, key) in list(jobs):
+        sections = mode_results.get(key, {})
+        if cat in sections: results[(cat, key)] = sections[cat]; del jobs[(cat, key)]
+    if jobs: print(f'{len(jobs)} category/mode combinations not found in the mode pages; falling back to per-category scraping.')
+
+if jobs:
+    print(f'Processing {len(jobs)} category/mode jobs...')
+    job_results, failures = run_jobs(jobs)
+    results.update(job_results)
+
+# Rebuilding the output in the original category order
+for cat in all_cats + special_cats:
+    for key in (['Veg Only'] if cat in special_cats else ['Veg Only', 'Non Veg Only']):
+        if (cat, key) in failures:
+            print(f'Failed {cat} in {key} with error: {failures[(cat, key)]}')
+            failed_categories.append(f"{'NON-VEG' if key == 'Non Veg Only' else 'VEG'} - {cat}")
+            continue
         if cat not in dominos_data:
             dominos_data[cat] = {}
-        dominos_data[cat]['Non Veg Only'] = non_veg_items
-    except Exception as e:
-        print(f'Failed {cat} in Non-Veg with error: {e}')
-        failed_categories.append(f'NON-VEG - {cat}')
-    time.sleep(1)
-
-for special_cat in special_cats:
-    print(f'Processing {special_cat}...')
-    try:
-        items = get_items(special_cat) # Default mode 'Veg Only'
-        # Original key used for special categories
-        dominos_data[special_cat] = {'Veg Only': items}
-    except Exception as e:
-        print(f'Failed {special_cat} with error: {e}')
-        failed_categories.append(f'VEG - {special_cat}')
-    time.sleep(1)
+        dominos_data[cat][key] = results[(cat, key)]
 
 print("\n--- Saving Data to JSON ---")
 script_location = Path(__file__).resolve().parent
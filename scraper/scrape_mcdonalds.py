@@ -1,59 +1,54 @@
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException # Added for potential safe_click errors
-from selenium.webdriver.chrome.service import Service # Added for best practice with webdriver-manager
-import time
 import json
 from pathlib import Path # Added for path handling
+from driver_pool import new_driver, safe_click, wait_for_page_ready, wait_for_text_stable, load_full_page_text, partition_sections, run_jobs
 
 # Define Restaurant Constant
 RESTAURANT_NAME = "McDonald's (McDelivery)" # Restaurant name added
+URL = 'https://mcdelivery.co.in/menu'
+# 'per_mode': load each Veg/Non-Veg view once and split its text into categories locally (2 page loads).
+# 'per_category': original behaviour, one page load + category click per category x mode.
+SCRAPE_STRATEGY = 'per_mode'
 
-def safe_click(driver, by, value):
-    """Safely scroll and click an element."""
-    # Original safe_click logic kept as provided
-    try:
-        wait = WebDriverWait(driver, 10)
-        element = wait.until(EC.element_to_be_clickable((by, value)))
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
-        time.sleep(0.5)  # Small sleep to stabilize after scroll
-        element.click()
-        return True
-    except TimeoutException: # Catch specific exception
-        # Optional: Print warning only if debug is True if function signature supported it
-        # print(f"  - Element not clickable: {value} (Timeout)")
-        return False
-    except Exception as e: # Catch broader exceptions
-        # print(f"  - Error clicking {value}: {e}")
-        return False
-
-
-def get_items(category_name, mode='Veg', debug = False):
-    # Original get_items logic kept exactly as provided
-    url = 'https://mcdelivery.co.in/menu'
+
+def parse_page_text(page_text):
+    """Original innerText parsing logic, applied to a full page or to one category's slice of it."""
+    data = []
+    i = 0
+    while i < len(page_text):
+        # Original parsing logic kept exactly
+        if page_text[i] == 'Add':
+            if (i-1 >= 0) and '%' in page_text[i-1]: # Check previous line first
+                name = page_text[i-5] if (i-5) >= 0 else "Unknown"
+                description = page_text[i-4] if (i-4) >= 0 else "Unknown"
+                price = page_text[i-3] if (i-3) >= 0 else "Unknown"
+                temp_data = {"name": name, "description": description, "price": price}
+                data.append(temp_data)
+            elif (i-1 >= 0) and '₹' in page_text[i-1]: # Check previous line first
+                name = page_text[i-3] if (i-3) >= 0 else "Unknown"
+                description = page_text[i-2] if (i-2) >= 0 else "Unknown"
+                price = page_text[i-1] if (i-1) >= 0 else "Unknown"
+                temp_data = {"name": name, "description": description, "price": price}
+                data.append(temp_data)
+        i += 1
+    return data
+
+
+def get_items(category_name, mode='Veg', debug = False, driver=None):
+    # Original get_items parsing logic kept; the driver now comes from the shared pool (or is created if not given)
+    url = URL
     data = []
-    # Using Service object is recommended best practice
-    service = Service(ChromeDriverManager().install())
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    driver = None # Initialize driver
+    owns_driver = driver is None
     try:
-        # Pass service object when creating driver
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        if owns_driver: driver = new_driver()
 
         driver.get(url)
-        wait = WebDriverWait(driver, 10)
+        wait_for_page_ready(driver)
 
         # Select mode (Veg/Non-Veg)
         # Using original text-based XPath - relies on exact text matching
         safe_click(driver, By.XPATH, f"//*[contains(text(), '{mode}')]")
-        time.sleep(3)
+        wait_for_text_stable(driver) # Explicit wait for the filtered menu to render (was time.sleep(3))
 
         # Select category
         # Using original text-based XPath
@@ -61,45 +56,40 @@ def get_items(category_name, mode='Veg', debug = False):
         if not success:
             # Original debug print logic
             print(f"⚠️ Category button '{category_name}' not found in mode '{mode}'.") if debug == True else None
-            if driver: driver.quit() # Quit driver if category fails
             return []
-        time.sleep(3)
+        wait_for_text_stable(driver) # Explicit wait for the category section to render (was time.sleep(3))
 
         # Get page text
         page_text = driver.execute_script("return document.body.innerText;").split('\n')
-        i = 0
-        while i < len(page_text):
-            # Original parsing logic kept exactly
-            if page_text[i] == 'Add':
-                if (i-1 >= 0) and '%' in page_text[i-1]: # Check previous line first
-                    name = page_text[i-5] if (i-5) >= 0 else "Unknown"
-                    description = page_text[i-4] if (i-4) >= 0 else "Unknown"
-                    price = page_text[i-3] if (i-3) >= 0 else "Unknown"
-                    temp_data = {"name": name, "description": description, "price": price}
-                    data.append(temp_data)
-                elif (i-1 >= 0) and '₹' in page_text[i-1]: # Check previous line first
-                    name = page_text[i-3] if (i-3) >= 0 else "Unknown"
-                    description = page_text[i-2] if (i-2) >= 0 else "Unknown"
-                    price = page_text[i-1] if (i-1) >= 0 else "Unknown"
-                    temp_data = {"name": name, "description": description, "price": price}
-                    data.append(temp_data)
-                # else: # Original code didn't have an else here for the inner if
-                #     i+=1 # If conditions not met, need to increment i? Added for safety.
-                #     continue
-            i += 1
-
-    # Removed original 'else' block for the outer 'if', keeping original logic flow
-    # The original loop structure implies incrementing 'i' regardless of 'Add' condition unless inner condition matched
+        data = parse_page_text(page_text)
 
     # Keep original broad exception handling
     except Exception as e:
          print(f"  Error during scraping for {category_name} ({mode}): {e}")
     finally:
-        if driver: # Ensure driver was initialized before quitting
+        if owns_driver and driver: # Pooled drivers are returned to the pool, not quit
             driver.quit()
 
     return data
 
+
+def get_items_by_mode(category_names, mode='Veg', driver=None):
+    """Loads the menu once for a Veg/Non-Veg mode, scrolls every category section into view and
+    partitions that single innerText capture into {category: items}. Categories without a
+    section in the capture are left out so the caller can fall back to get_items."""
+    owns_driver = driver is None
+    try:
+        if owns_driver: driver = new_driver()
+        driver.get(URL)
+        wait_for_page_ready(driver)
+        safe_click(driver, By.XPATH, f"//*[contains(text(), '{mode}')]")
+        wait_for_text_stable(driver)
+        page_text = load_full_page_text(driver).split('\n')
+        sections = partition_sections(page_text, category_names, is_item_line=lambda line: line == 'Add')
+        return {cat: parse_page_text(lines) for cat, lines in sections.items()}
+    finally:
+        if owns_driver and driver: driver.quit()
+
 # ===========================================================
 # Main Script (Keeping original structure and variables)
 # ===========================================================
@@ -122,47 +112,43 @@ special_cats = [
     'Desserts',
 ]
 
-# Original loops kept
+# Category x mode jobs (output key -> (func, args)); run in parallel on a shared pool of long-lived drivers
+jobs = {}
 for cat in all_cats:
-    print(f'Processing {cat} in Veg...')
-    try:
-        veg_items = get_items(cat) # Default mode is 'Veg'
-        if cat not in macd_data:
-            macd_data[cat] = {}
-        # Store under 'Veg Only' key as in original script
-        macd_data[cat]['Veg Only'] = veg_items
-    except Exception as e:
-        print(f'Failed {cat} in Veg with error: {e}')
-        failed_categories.append(f'VEG - {cat}')
-    time.sleep(1)
-
-    print(f'Processing {cat} in Non-Veg...')
-    try:
-        # Explicitly pass mode='Non-Veg'
-        non_veg_items = get_items(cat, mode='Non-Veg')
-        if cat not in macd_data:
-            macd_data[cat] = {}
-         # Store under 'Non Veg Only' key as in original script
-        macd_data[cat]['Non Veg Only'] = non_veg_items
-    except Exception as e:
-        print(f'Failed {cat} in Non-Veg with error: {e}')
-        failed_categories.append(f'NON-VEG - {cat}')
-    time.sleep(1)
-
-
+    jobs[(cat, 'Veg Only')] = (get_items, (cat,)) # Default mode is 'Veg'; stored under 'Veg Only' as in original script
+    jobs[(cat, 'Non Veg Only')] = (get_items, (cat, 'Non-Veg')) # Stored under 'Non Veg Only' as in original script
 for cat in special_cats:
-    # Original logic for special categories kept
-    print(f'Processing {cat} in special...')
-    try:
-        special_items = get_items(cat) # Default 'Veg' mode
+    jobs[(cat, 'desserts and bevrages')] = (get_items, (cat,)) # Original key 'desserts and bevrages', default 'Veg' mode
+
+results, failures = {}, {}
+if SCRAPE_STRATEGY == 'per_mode':
+    # One page load per mode; the special categories are read from the default 'Veg' view, as in the original script
+    mode_jobs = {'Veg': (get_items_by_mode, (all_cats + special_cats, 'Veg')), 'Non-Veg': (get_items_by_mode, (all_cats, 'Non-Veg'))}
+    print(f'Processing {len(mode_jobs)} mode pages...')
+    mode_results, mode_failures = run_jobs(mode_jobs)
+    for mode, error in mode_failures.items(): print(f'Failed to load {mode} page with error: {error}')
+    veg_sections, non_veg_sections = mode_results.get('Veg', {}), mode_results.get('Non-Veg', {})
+    for (cat, key) in list(jobs):
+        sections = non_veg_sections if key == 'Non Veg Only' else veg_sections
+        if cat in sections: results[(cat, key)] = sections[cat]; del jobs[(cat, key)]
+    if jobs: print(f'{len(jobs)} category/mode combinations not found in the mode pages; falling back to per-category scraping.')
+
+if jobs:
+    print(f'Processing {len(jobs)} category/mode jobs...')
+    job_results, failures = run_jobs(jobs)
+    results.update(job_results)
+
+# Rebuilding the output in the original category order
+failure_labels = {'Veg Only': 'VEG', 'Non Veg Only': 'NON-VEG', 'desserts and bevrages': 'special'}
+for cat in all_cats + special_cats:
+    for key in (['desserts and bevrages'] if cat in special_cats else ['Veg Only', 'Non Veg Only']):
+        if (cat, key) in failures:
+            print(f'Failed {cat} in {key} with error: {failures[(cat, key)]}')
+            failed_categories.append(f'{failure_labels[key]} - {cat}')
+            continue
         if cat not in macd_data:
             macd_data[cat] = {}
-        # Store under original key 'desserts and bevrages'
-        macd_data[cat]['desserts and bevrages'] = special_items
-    except Exception as e:
-        print(f'Failed {cat} in desserts and bevrages with error: {e}')
-        failed_categories.append(f'special - {cat}')
-    time.sleep(1)
+        macd_data[cat][key] = results[(cat, key)]
 
 # ===========================================================
 # MODIFIED JSON SAVING LOGIC (Only change requested)
@@ -1,10 +1,4 @@
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By # Not used in get_items, but good practice
-from selenium.webdriver.support.ui import WebDriverWait # Not used in get_items, but good practice
-from selenium.webdriver.support import expected_conditions as EC # Not used in get_items
-from selenium.webdriver.chrome.service import Service 
+from driver_pool import new_driver, wait_for_page_ready, wait_for_text_stable, run_jobs
 from pathlib import Path # To handle file paths
 import json # To save JSON
 import re # For potential future cleaning (though not used in current get_items)
@@ -24,7 +18,7 @@ menu_data = {
 # --- End Data Structure ---
 
 
-def get_items(url, category_name): # Added category_name parameter
+def get_items(url, category_name, driver=None): # Added category_name parameter
     """
     Gets items from a specific URL using innerText parsing.
     WARNING: Fragile method, may miss data or misinterpret layout.
@@ -32,21 +26,14 @@ def get_items(url, category_name): # Added category_name parameter
     """
     data = []
     print(f"  Fetching items for '{category_name}' from {url}")
-    # Setup WebDriver within the function (as in original code)
-    # Note: Creating a new driver for each URL is less efficient than reusing one.
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    # Using Service object is recommended even with webdriver-manager
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # The driver comes from the shared pool; one is only created here when called standalone
+    owns_driver = driver is None
+    if owns_driver: driver = new_driver()
     try:
         driver.get(url)
-        # No explicit wait in original, relying on page load speed
-        # Adding a small implicit wait or short sleep might sometimes help, but isn't robust
-        # time.sleep(2) # Example of a small fixed wait
-        page_text = driver.execute_script("return document.body.innerText;").split('\n')
+        wait_for_page_ready(driver)
+        # Explicit wait until the client-rendered menu text stops changing (original relied on page load speed)
+        page_text = wait_for_text_stable(driver).split('\n')
         
         # Parsing logic from original code
         for i in range(len(page_text)):
@@ -73,7 +60,7 @@ def get_items(url, category_name): # Added category_name parameter
     except Exception as e:
         print(f"    Error processing URL {url}: {e}")
     finally:
-        driver.quit()
+        if owns_driver: driver.quit() # Pooled drivers are returned to the pool, not quit
     print(f"  Found {len(data)} potential items for '{category_name}'.")
     return data
 
@@ -97,12 +84,16 @@ print(f"Starting scrape for {RESTAURANT_NAME}...")
 all_items = []
 scraped_url_list = []
 
-for cat, url in categories.items():
-    print(f"Processing category: {cat}")
-    items_in_category = get_items(url, cat) # Pass category name to function
-    all_items.extend(items_in_category) # Add found items to the main list
+# Categories are scraped in parallel on a shared pool of long-lived drivers (was one fresh Chrome per URL, in sequence)
+jobs = {cat: (get_items, (url, cat)) for cat, url in categories.items()} # Pass category name to function
+results, failures = run_jobs(jobs)
+
+for cat, url in categories.items(): # Original category order kept
+    if cat in failures:
+        print(f"Failed category '{cat}' with error: {failures[cat]}")
+        continue
+    all_items.extend(results[cat]) # Add found items to the main list
     scraped_url_list.append(url) # Keep track of scraped URLs
-    print("-" * 20)
 
 # --- Populate final data structure ---
 menu_data["menu"] = all_items
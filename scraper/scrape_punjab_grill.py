@@ -1,14 +1,20 @@
-import requests
+import httpx
 from bs4 import BeautifulSoup
 from pathlib import Path
 import json
 import re
-import time # Added import
+import sys
+import argparse
 import traceback # Added import
+from async_fetch import fetch_page # Pooled fetch with timeout, retries and ETag/Last-Modified caching
 
 URL = "https://www.punjabgrill.in/punjab-grill-menu/"
 HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
 
+parser = argparse.ArgumentParser(description="Scrape the Punjab Grill menu.")
+parser.add_argument("--force", action="store_true", help="Reparse even if the page is unchanged since the last scrape.")
+args = parser.parse_args()
+
 # --- Define output paths ---
 script_location = Path(__file__).resolve().parent
 project_root = script_location.parent
@@ -76,10 +82,11 @@ processed_pane_ids = set() # Avoid reprocessing duplicate panes
 
 try:
     print(f"Fetching URL: {URL}")
-    response = requests.get(URL, headers=HEADERS, timeout=20)
-    response.raise_for_status()
-    print(f"Status Code: {response.status_code}")
-    time.sleep(1)
+    response = fetch_page(URL, headers=HEADERS, timeout=20)
+    print(f"Status Code: {response.status}")
+    if response.not_modified and json_output_path.is_file() and not args.force:
+        print(f"Page unchanged since the last scrape; keeping {json_output_path}.")
+        sys.exit(0)
 
     soup = BeautifulSoup(response.content, 'lxml')
     print("Successfully parsed HTML. Starting extraction...")
@@ -136,7 +143,7 @@ try:
     print(f"\n--- Extraction Complete ---")
     print(f"Total items extracted: {total_items_extracted}")
 
-except requests.exceptions.RequestException as e:
+except httpx.HTTPError as e:
     print(f"Error fetching URL {URL}: {e}")
 except Exception as e:
     print(f"An unexpected error occurred during script execution: {e}")
@@ -1,18 +1,27 @@
-import requests
 from bs4 import BeautifulSoup
 import json
 import os
+import sys
+import argparse
 from pathlib import Path # Added for path handling
+from async_fetch import fetch_page # Pooled fetch with timeout, retries and ETag/Last-Modified caching
 
 # Define Restaurant Name
 RESTAURANT_NAME = "Subway (India - Unofficial Source)"
 
+parser = argparse.ArgumentParser(description="Scrape the (unofficial) Subway India menu.")
+parser.add_argument("--force", action="store_true", help="Reparse even if the page is unchanged since the last scrape.")
+args = parser.parse_args()
+
 # Step 1: Fetch the page
 url = "https://subwaymenupedia.com/subway-menu-prices-india/"
 print(f"Fetching URL: {url}")
-response = requests.get(url)
-response.raise_for_status()  # Raise error if request failed
-print("Successfully fetched page.")
+response = fetch_page(url)  # Raises if the request failed after retries
+print(f"Successfully fetched page ({'not modified' if response.not_modified else response.status}).")
+cleaned_output_path = Path(__file__).resolve().parent.parent / 'data' / 'subway_menu_unofficial_cleaned.json'
+if response.not_modified and cleaned_output_path.is_file() and not args.force:
+    print(f"Page unchanged since the last scrape; keeping {cleaned_output_path}.")
+    sys.exit(0)
 
 # Step 2: Parse the page
 soup = BeautifulSoup(response.text, "html.parser")
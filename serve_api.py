@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import chatbot_app
+from chatbot_app import get_rag_response, stream_rag_response, models
+from rag_tracing import tracer
+
+# --- Standalone HTTP service over the RAG engine ---
+# Run with:  uvicorn serve_api:app --host 0.0.0.0 --port 8000
+# One warmed process serves any number of UI instances (set RAG_BACKEND_URL=http://host:8000 for app.py).
+# All model work runs in worker threads (asyncio.to_thread / Starlette's threadpool), never on the event loop;
+# generation itself is serialized or spread over processes by the LLM gate in chatbot_app.
+MAX_BATCH_SIZE = 32
+
+
+class QueryRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    top_k: int = Field(5, ge=1, le=50)
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    top_k: int = Field(5, ge=1, le=50)
+
+
+class QueryResponse(BaseModel):
+    query: str
+    answer: str
+    latency_s: float
+
+
+class SearchHit(BaseModel):
+    id: str
+    document: str
+    metadata: Optional[dict] = None
+
+
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHit]
+    latency_s: float
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
+    queries_per_sec: float
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.to_thread(models.load) # Warm up before accepting traffic, so the first request doesn't pay for loading
+    if not models.is_ready(): print(f"Warning: RAG engine not ready: {models.error}")
+    yield
+    if models.gate is not None: models.gate.close()
+
+
+app = FastAPI(title="Restaurant Menu RAG API", lifespan=lifespan)
+
+
+def _require_ready():
+    if not models.is_ready():
+        raise HTTPException(status_code=503, detail=models.error or f"RAG engine is {models.status}")
+
+
+async def _answer(query, top_k):
+    start = time.perf_counter()
+    answer = await asyncio.to_thread(get_rag_response, query, top_k)
+    return QueryResponse(query=query, answer=answer, latency_s=time.perf_counter() - start)
+
+
+@app.get("/health")
+async def health():
+    return {"status": models.status, "error": models.error,
+            "llm": models.gate.stats() if models.gate is not None else None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracer.metrics.render_prometheus() # Empty unless RAG_TRACING=1
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query(request: QueryRequest):
+    _require_ready()
+    return await _answer(request.query, request.top_k)
+
+
+@app.post("/query/batch", response_model=List[QueryResponse])
+async def query_batch(request: BatchQueryRequest):
+    """Answers several questions concurrently; retrieval overlaps while generation queues at the LLM gate."""
+    _require_ready()
+    limit = asyncio.Semaphore(max(1, chatbot_app.LLM_QUEUE_SIZE)) # One batch alone shouldn't overflow the LLM queue
+    async def answer_one(q):
+        async with limit: return await _answer(q, request.top_k)
+    return await asyncio.gather(*(answer_one(q) for q in request.queries))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_stream(query, top_k):
+    """Server-sent events: one `token` event per streamed piece, then `done` with the generation stats.
+
+    A plain generator: StreamingResponse iterates it in a worker thread, so blocking generation stays off the loop.
+    """
+    stats = {}
+    try:
+        for piece in stream_rag_response(query, top_k=top_k, stats=stats):
+            yield _sse("token", {"text": piece})
+        yield _sse("done", stats)
+    except Exception as e:
+        yield _sse("error", {"detail": str(e)})
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    _require_ready()
+    return StreamingResponse(_sse_stream(request.query, request.top_k), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search(request: QueryRequest):
+    """Retrieval only (metadata filters + hybrid BM25/vector fusion), no generation."""
+    _require_ready()
+    start = time.perf_counter()
+    retrieval, error = await asyncio.to_thread(chatbot_app._retrieve_context, request.query, request.top_k)
+    hits = []
+    if retrieval:
+        hits = [SearchHit(id=i, document=d, metadata=m) for i, d, m in zip(retrieval["ids"], retrieval["documents"], retrieval["metadatas"])]
+    return SearchResponse(query=request.query, hits=hits, latency_s=time.perf_counter() - start)
+
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchQueryRequest):
+    """Retrieval for many queries in one embedding batch and one Chroma call per distinct filter (search_many)."""
+    _require_ready()
+    timings = {}
+    start = time.perf_counter()
+    retrievals = await asyncio.to_thread(chatbot_app.search_many, request.queries, request.top_k, None, timings)
+    latency = time.perf_counter() - start
+    results = [SearchResponse(query=q, latency_s=latency, hits=[SearchHit(id=i, document=d, metadata=m) for i, d, m in zip(r["ids"], r["documents"], r["metadatas"])] if r else [])
+               for q, r in zip(request.queries, retrievals)]
+    return BatchSearchResponse(results=results, queries_per_sec=timings.get("queries_per_sec", 0.0))
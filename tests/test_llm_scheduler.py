@@ -0,0 +1,68 @@
+import sys
+import threading
+import time
+from pathlib import Path
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+from llm_scheduler import LLMScheduler
+
+REQUEST_TIMEOUT_S = 30
+
+
+def fake_worker(worker_id, model_path, tasks, results):
+    """Stands in for llm_scheduler._worker_main without a model: echoes the prompt, or hangs on "slow"."""
+    results.put(("ready", worker_id, None, None))
+    while True:
+        job = tasks.get()
+        if job is None: break
+        job_id, prompt, kwargs, stream, deadline = job
+        results.put(("started", worker_id, job_id, time.time()))
+        time.sleep(60 if prompt == "slow" else 0.02)
+        results.put(("done", worker_id, job_id, {"text": prompt, "completion_tokens": 1, "prompt_tokens": 1, "stats": {}}))
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = LLMScheduler(2, None, max_queue=50, timeout_s=REQUEST_TIMEOUT_S, worker_main=fake_worker)
+    assert scheduler.start(startup_timeout=60)
+    yield scheduler
+    scheduler.close()
+
+
+def test_crashed_worker_is_detected_under_steady_traffic(scheduler):
+    stop, failures, completed = threading.Event(), [], []
+    def traffic():
+        while not stop.is_set():
+            try: completed.append(scheduler.complete("ping")["choices"][0]["text"])
+            except Exception as e: failures.append(e)
+    senders = [threading.Thread(target=traffic, daemon=True) for _ in range(3)]
+    for sender in senders: sender.start()
+
+    slow_result = {}
+    def slow_request():
+        start = time.monotonic()
+        try: scheduler.complete("slow")
+        except Exception as e: slow_result["error"] = e
+        slow_result["seconds"] = time.monotonic() - start
+    slow = threading.Thread(target=slow_request, daemon=True); slow.start()
+
+    # The worker still on the same job after half a second is the one serving "slow"
+    slow_worker, deadline = None, time.monotonic() + 10
+    while slow_worker is None and time.monotonic() < deadline:
+        before = dict(scheduler._current); time.sleep(0.5)
+        slow_worker = next((w for w, job_id in scheduler._current.items() if job_id is not None and before.get(w) == job_id), None)
+    assert slow_worker is not None
+    slow_process = scheduler._workers[slow_worker]
+    slow_process.kill()
+
+    slow.join(timeout=REQUEST_TIMEOUT_S / 2)
+    served_before = len(completed)
+    time.sleep(1.5)
+    stop.set()
+    for sender in senders: sender.join(timeout=5)
+
+    assert isinstance(slow_result.get("error"), RuntimeError) and "crashed" in str(slow_result["error"])
+    assert slow_result["seconds"] < REQUEST_TIMEOUT_S / 2 # Failed on detection, not after waiting out its timeout
+    assert len(completed) > served_before and not failures # Traffic kept flowing to the remaining and restarted workers
@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+import menu_router
+
+# Questions that name a specific item, an attribute or a situation, or an item type the categories can't settle:
+# the index must not answer them (None = go to RAG)
+RAG_QUESTIONS = [
+    "How many calories are in the McAloo Tikki?",
+    "what is the phone number of dominos",
+    "how many pieces in the chicken nuggets meal at mcdonalds",
+    "Is the McAloo Tikki under 100 at McDonalds?",
+    "does the paneer pizza at dominos cost more than 300?",
+    "I want something for 2 people under 500",
+    "which burger under 150 has cheese at mcd?",
+    "cheapest burger at McDonalds",
+    "most expensive dessert at mcdonalds",
+]
+
+
+@pytest.mark.parametrize("question", RAG_QUESTIONS)
+def test_non_structured_questions_go_to_rag(question):
+    assert menu_router.route_query(question) is None
+
+
+@pytest.mark.parametrize("question, expected_start", [
+    ("how many non-veg items at mcd", "There are "),
+    ("cheapest veg item at dominos", "The cheapest of the veg items at Dominos is "),
+    ("veg items under ₹100 at subway", "I found "),
+])
+def test_filter_questions_are_routed(question, expected_start):
+    assert menu_router.route_query(question).startswith(expected_start)
+
+
+def test_price_bounds_ignore_counts_and_prefer_the_last_bound():
+    c = menu_router.parse_constraints("max 2 toppings pizza under 300")
+    assert (c["max_price"], c["min_price"], c["item_type"]) == (300.0, None, "pizza")
+    assert menu_router.parse_constraints("pizzas under 400, actually under 250")["max_price"] == 250.0